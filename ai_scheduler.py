@@ -0,0 +1,332 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import re
+import time
+
+# ✅ Outbound AI Scheduler Settings
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "16"))  # Completions in flight per worker
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "30"))  # Per attempt (until response headers)
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+AI_BACKOFF_BASE_SECONDS = float(os.getenv("AI_BACKOFF_BASE_SECONDS", "0.5"))
+AI_BACKOFF_MAX_SECONDS = float(os.getenv("AI_BACKOFF_MAX_SECONDS", "8"))
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive failures to open
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))  # Open time before a trial call
+
+# ✅ Priority lanes (lower runs first)
+PRIORITY_ADMIN = 0
+PRIORITY_USER = 1
+PRIORITY_BATCH = 2  # Bulk jobs (/rag/query/batch) wait behind interactive requests for a free slot
+
+_RETRYABLE_ERRORS = None  # Filled on first call (keeps the heavy openai import off the startup path)
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def retryable_errors() -> tuple:
+    """Exceptions worth retrying with backoff (openai is imported on first use)"""
+    global _RETRYABLE_ERRORS
+    if _RETRYABLE_ERRORS is None:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+        _RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError, asyncio.TimeoutError)
+    return _RETRYABLE_ERRORS
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling OpenAI while the circuit breaker is open"""
+
+
+def parse_reset_duration(value) -> float:
+    """Parses OpenAI reset headers ("1s", "6m0s", "20ms") into seconds"""
+    if not value:
+        return 0.0
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return 0.0
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """
+    🔹 Token bucket whose capacity, level and refill rate come from response headers.
+    - Unlimited until the first observation
+    """
+
+    def __init__(self):
+        self.capacity = None
+        self.level = 0.0
+        self.rate = 0.0  # units per second
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def observe(self, limit, remaining, reset_seconds: float):
+        """Re-syncs the bucket with the server's view (x-ratelimit-* headers)"""
+        if limit is None or remaining is None:
+            return
+        self._refill()
+        self.capacity = float(limit)
+        self.level = float(remaining)
+        missing = self.capacity - self.level
+        self.rate = missing / reset_seconds if missing > 0 and reset_seconds > 0 else self.capacity / 60.0
+
+    def wait_time(self, amount: float) -> float:
+        if self.capacity is None:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else 1.0
+
+    def consume(self, amount: float):
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    🔹 Request + token budgets fed by x-ratelimit-* headers.
+    - acquire() waits until both buckets can cover the call
+    - 429 Retry-After pauses all callers until it expires
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.blocked_until = 0.0
+        self.waits = 0
+
+    async def acquire(self, estimated_tokens: int):
+        while True:
+            wait = max(
+                self.blocked_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(estimated_tokens),
+            )
+            if wait <= 0:
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+                return
+            self.waits += 1
+            await asyncio.sleep(wait)
+
+    def observe(self, headers):
+        def _int(name):
+            value = headers.get(name)
+            return int(value) if value is not None and str(value).isdigit() else None
+
+        self.requests.observe(
+            _int("x-ratelimit-limit-requests"), _int("x-ratelimit-remaining-requests"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+        )
+        self.tokens.observe(
+            _int("x-ratelimit-limit-tokens"), _int("x-ratelimit-remaining-tokens"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+        )
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    🔹 Closed -> open after N consecutive failures -> half-open trial after reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int = AI_BREAKER_FAILURE_THRESHOLD, reset_timeout: float = AI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True  # ✅ Let exactly one trial call through
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def abandon_trial(self):
+        """The trial call ended without telling us anything (cancelled / non-availability error)"""
+        self._trial_running = False
+
+
+class PrioritySemaphore:
+    """Semaphore that hands free slots to the lowest priority number first (FIFO within a lane)"""
+
+    def __init__(self, slots: int):
+        self.available = slots
+        self._waiters = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int):
+        if self.available > 0 and not self._waiters:
+            self.available -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # ✅ Slot was handed over just before cancellation
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # ✅ Slot passes straight to the next waiter
+                return
+        self.available += 1
+
+
+class AIScheduler:
+    """
+    🔹 Governs every outbound OpenAI call.
+    - Bounded concurrency with priority lanes (admins ahead of users, batch jobs last)
+    - Rate limiting from x-ratelimit-* response headers
+    - Per-attempt timeout, retries with full-jitter exponential backoff
+    - Circuit breaker; CircuitOpenError while it is open
+    - call_factory must return an openai raw response (`.with_raw_response`)
+    - Retries happen before any output is produced; a stream that breaks midway is not retried
+    """
+
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, timeout: float = AI_TIMEOUT_SECONDS,
+                 max_retries: int = AI_MAX_RETRIES, backoff_base: float = AI_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = AI_BACKOFF_MAX_SECONDS, breaker: CircuitBreaker = None):
+        self.slots = PrioritySemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = RateLimiter()
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _call_with_retries(self, call_factory, estimated_tokens: int):
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimated_tokens)
+            self.calls += 1
+            try:
+                raw = await asyncio.wait_for(call_factory(), self.timeout)
+            except retryable_errors() as e:
+                self.failures += 1
+                self.breaker.record_failure()
+                retry_after = _retry_after(e)
+                if retry_after:
+                    self.limiter.block_for(retry_after)
+                if attempt == self.max_retries or self.breaker.state == "open":
+                    raise
+                self.retries += 1
+                await asyncio.sleep(max(retry_after, self.backoff(attempt)))
+                continue
+            except BaseException:
+                self.breaker.abandon_trial()
+                raise
+
+            self.limiter.observe(raw.headers)
+            self.breaker.record_success()
+            return raw
+
+    async def _enter(self, priority: int):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        try:
+            await self.slots.acquire(priority)
+        except BaseException:
+            self.breaker.abandon_trial()
+            raise
+        self.in_flight += 1
+
+    def _exit(self):
+        self.in_flight -= 1
+        self.slots.release()
+
+    async def run(self, call_factory, priority: int = PRIORITY_USER, estimated_tokens: int = 1000):
+        """Runs one call under the governor; returns the parsed response"""
+        await self._enter(priority)
+        try:
+            raw = await self._call_with_retries(call_factory, estimated_tokens)
+            return raw.parse()
+        finally:
+            self._exit()
+
+    async def stream(self, call_factory, priority: int = PRIORITY_USER, estimated_tokens: int = 1000):
+        """Like run() for stream=True calls; the slot is held until the stream is exhausted"""
+        await self._enter(priority)
+        try:
+            raw = await self._call_with_retries(call_factory, estimated_tokens)
+            async for chunk in raw.parse():
+                yield chunk
+        finally:
+            self._exit()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.slots.queued,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "rate_limit_waits": self.limiter.waits,
+            "breaker_state": self.breaker.state,
+            "remaining_requests": self.limiter.requests.level if self.limiter.requests.capacity is not None else None,
+            "remaining_tokens": self.limiter.tokens.level if self.limiter.tokens.capacity is not None else None,
+        }
+
+
+def _retry_after(error) -> float:
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    if response.headers.get("retry-after-ms"):
+        return float(response.headers["retry-after-ms"]) / 1000.0
+    return parse_reset_duration(response.headers.get("retry-after"))
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import numpy as np
+from cache import create_cache
+from retrievers import document_listeners
+
+# ✅ Answer Cache Settings
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ANSWER_CACHE_RECORD_BYTES = int(os.getenv("ANSWER_CACHE_RECORD_BYTES", "8192"))  # Shared backend: largest cached answer entry
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))  # Cosine threshold for near-duplicates
+
+# ✅ Cache status values (sent back in the X-Cache header)
+CACHE_HIT = "HIT"
+CACHE_SEMANTIC_HIT = "HIT-SEMANTIC"
+CACHE_MISS = "MISS"
+CACHE_BYPASS = "BYPASS"
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Case/whitespace-insensitive form of a question ("What is AI?" == "what is  ai")"""
+    return _TRAILING_PUNCTUATION.sub("", " ".join(query.lower().split()))
+
+
+def context_signature(documents) -> str:
+    """Ids and content versions of the retrieved chunks, in prompt order"""
+    return ",".join(
+        f"{doc['id']}:{hashlib.sha1(doc['content'].encode('utf-8')).hexdigest()[:12]}" for doc in documents
+    )
+
+
+class AnswerCache:
+    """
+    🔹 Cache of RAG answers in front of the OpenAI completion.
+    - Exact key: normalized query + ids/versions of the retrieved chunks
+    - Optional near-duplicate lookup: cosine similarity of query embeddings,
+      restricted to entries built from the same retrieved chunks
+    - LRU/TTL eviction with entry-count and byte bounds
+    - Entries are dropped when any of their source documents change
+    - With the shared cache backend the entries are shared by all workers; the
+      near-duplicate and per-document indexes stay per process (every worker's
+      document feed invalidates the answers it indexed)
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, max_bytes: int = ANSWER_CACHE_MAX_BYTES,
+                 ttl: float = ANSWER_CACHE_TTL_SECONDS, enabled: bool = ANSWER_CACHE_ENABLED,
+                 embedder=None, similarity_threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.entries = create_cache(
+            "answers", maxsize=max_entries, ttl=ttl, enabled=enabled, record_size=ANSWER_CACHE_RECORD_BYTES,
+            max_bytes=max_bytes, sizeof=self._sizeof, on_evict=self._forget,
+        )
+        self.embedder = embedder  # ✅ None disables the near-duplicate lookup
+        self.similarity_threshold = similarity_threshold
+        self.semantic_hits = 0
+        self._by_signature = {}  # context signature -> {key: query vector}
+        self._by_document = {}  # document id -> {keys}
+        self._indexed = {}  # key -> entry metadata, for keys in the two maps above
+        document_listeners.append(self.apply_changes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.entries.enabled
+
+    @staticmethod
+    def _sizeof(key, entry) -> int:
+        vector_bytes = entry["vector"].nbytes if entry["vector"] is not None else 0
+        return len(key) + len(entry["answer"].encode("utf-8")) + len(entry["signature"]) + vector_bytes + 200
+
+    @staticmethod
+    def make_key(query: str, signature: str) -> str:
+        return hashlib.sha1(f"{normalize_query(query)}|{signature}".encode("utf-8")).hexdigest()
+
+    def _forget(self, key, entry):
+        """on_evict hook: keeps the secondary maps in step with the entry store"""
+        self._indexed.pop(key, None)
+        vectors = self._by_signature.get(entry["signature"])
+        if vectors is not None:
+            vectors.pop(key, None)
+            if not vectors:
+                del self._by_signature[entry["signature"]]
+        for doc_id in entry["document_ids"]:
+            keys = self._by_document.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_document[doc_id]
+
+    async def _embed(self, query: str):
+        vectors = await self.embedder.embed([normalize_query(query)])
+        return vectors[0]
+
+    async def get(self, query: str, documents) -> tuple:
+        """Returns (answer or None, cache status)"""
+        if not self.enabled:
+            return None, CACHE_BYPASS
+
+        signature = context_signature(documents)
+        entry = self.entries.get(self.make_key(query, signature))
+        if entry is not None:
+            return entry["answer"], CACHE_HIT
+
+        candidates = self._by_signature.get(signature)
+        if self.embedder is not None and candidates:
+            query_vector = await self._embed(query)
+            keys = list(candidates)
+            similarities = np.vstack([candidates[key] for key in keys]) @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                entry = self.entries.get(keys[best])
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry["answer"], CACHE_SEMANTIC_HIT
+
+        return None, CACHE_MISS
+
+    async def set(self, query: str, documents, answer: str):
+        if not self.enabled:
+            return
+        signature = context_signature(documents)
+        key = self.make_key(query, signature)
+        vector = await self._embed(query) if self.embedder is not None else None
+        document_ids = tuple(doc["id"] for doc in documents)
+
+        self.entries.set(key, {"answer": answer, "signature": signature, "vector": vector, "document_ids": document_ids})
+        if key not in self.entries:
+            return  # ✅ Rejected (larger than the byte budget)
+        if len(self._indexed) >= 2 * self.entries.maxsize:
+            self._prune_index()
+        self._indexed[key] = {"signature": signature, "document_ids": document_ids}
+        if vector is not None:
+            self._by_signature.setdefault(signature, {})[key] = vector
+        for doc_id in document_ids:
+            self._by_document.setdefault(doc_id, set()).add(key)
+
+    def _prune_index(self):
+        """Forgets indexed keys whose entries are gone (evicted by another worker on the shared backend)"""
+        for key, entry in list(self._indexed.items()):
+            if key not in self.entries:
+                self._forget(key, entry)
+
+    def invalidate_documents(self, doc_ids):
+        """Drops every answer that was built from any of doc_ids"""
+        for doc_id in doc_ids:
+            for key in list(self._by_document.get(doc_id, ())):
+                self.entries.invalidate(key)
+
+    def apply_changes(self, upserts: dict, deleted_ids=()):
+        """Document listener: changed or deleted chunks invalidate dependent answers"""
+        self.invalidate_documents(set(upserts) | set(deleted_ids))
+
+    def close(self):
+        """Stops listening for document changes (instances other than the module's own answer_cache)"""
+        if self.apply_changes in document_listeners:
+            document_listeners.remove(self.apply_changes)
+
+    def clear(self):
+        self.entries.clear()
+        self._by_signature.clear()
+        self._by_document.clear()
+        self._indexed.clear()
+        self.semantic_hits = 0
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), "semantic_hits": self.semantic_hits}
@@ -1,25 +1,74 @@
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import uuid
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import OperationalError, ProgrammingError, SQLAlchemyError
 from sqlalchemy.sql import or_
+from sqlalchemy import event, func, inspect, update
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
-from models import User
-from database import get_db
+from models import RefreshToken, User
+import database
+from database import get_db, get_read_db
+from cache import create_cache, invalidation_bus
+from hashing import password_hasher
+from revocation import RevocationList
+from singleflight import SingleFlight
+from metrics import span, timed
+
+logger = logging.getLogger(__name__)
 
 # ✅ Secret Key & JWT Settings (Ensure to use environment variables in production)
 SECRET_KEY = "supersecretkey"  # 🔹 Change this for production (Use `.env`)
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30  # 🔹 Token expiration time
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))  # 🔹 Token expiration time
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))  # 🔹 Session lifetime without a password
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))  # 🔹 Re-read other workers' logouts (0: only at start)
+REVOCATION_SYNC_OVERLAP_SECONDS = 60  # Re-read window before the last sync (commit delays, replica lag)
 
 # ✅ Initialize Security Modules
 http_bearer = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# ✅ Authenticated-Principal Cache (lets warm tokens skip the users lookup)
+PRINCIPAL_CACHE_ENABLED = os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAXSIZE = int(os.getenv("PRINCIPAL_CACHE_MAXSIZE", "10000"))
+PRINCIPAL_CACHE_RECORD_BYTES = int(os.getenv("PRINCIPAL_CACHE_RECORD_BYTES", "1024"))  # Shared backend: pickled user limit
+
+principal_cache = create_cache(
+    "principals",
+    maxsize=PRINCIPAL_CACHE_MAXSIZE,
+    ttl=PRINCIPAL_CACHE_TTL_SECONDS,
+    enabled=PRINCIPAL_CACHE_ENABLED,
+    record_size=PRINCIPAL_CACHE_RECORD_BYTES,
+)
+
+# ✅ Revoked sessions (refresh-token families), checked for every access token that carries a `sid`
+revoked_sessions = RevocationList()
+revocation_loads = SingleFlight()
+
+
+def _apply_revocation(message):
+    family_id, ttl = message
+    revoked_sessions.add(family_id, ttl)
+
+
+def _reload_revocations():
+    revoked_sessions.loaded = False  # ✅ Messages were missed: re-read revocations on the next request
+
+
+# ✅ Revocations made by any worker reach every worker's in-memory list (see cache.invalidation_bus)
+invalidation_bus.subscribe("session_revoked", _apply_revocation, _reload_revocations)
+
 # ✅ FastAPI Router
 router = APIRouter()
 
@@ -37,7 +86,7 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalars().first()
 
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    if not user or not await password_hasher.verify(password, user.hashed_password):
         return False  # Invalid credentials
     return user
 
@@ -55,7 +104,7 @@ class UserRegister(BaseModel):
 async def register_user(user: UserRegister, db: AsyncSession = Depends(get_db)):
     """Registers a new user with unique username & email"""
     try:
-        print(f"🔹 Checking for existing user: {user.username}, {user.email}")  # ✅ Debugging
+        logger.debug("🔹 Checking for existing user", extra={"username": user.username, "email": user.email})
 
         # ✅ Check if username or email already exists
         result = await db.execute(
@@ -64,28 +113,31 @@ async def register_user(user: UserRegister, db: AsyncSession = Depends(get_db)):
         existing_user = result.scalars().first()
 
         if existing_user:
-            print(f"❌ User already exists: {existing_user.username}")  # ✅ Debugging
+            logger.info("❌ User already exists", extra={"username": existing_user.username})
             raise HTTPException(status_code=400, detail="Username or Email already registered")
 
-        print("🔹 Creating new user...")  # ✅ Debugging
+        logger.debug("🔹 Creating new user", extra={"username": user.username})
 
-        # ✅ Hash password and create user
-        hashed_password = pwd_context.hash(user.password)
+        # ✅ Hash password (off the event loop) and create user
+        hashed_password = await password_hasher.hash(user.password)
         new_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
         db.add(new_user)
         await db.commit()
         await db.refresh(new_user)  # ✅ Ensure user is fully saved
 
-        print(f"✅ User Created: {new_user.username}")  # ✅ Debugging
+        logger.info("✅ User Created", extra={"username": new_user.username, "user_id": new_user.id})
         return {"id": new_user.id, "username": new_user.username, "email": new_user.email}
-    
+
+    except HTTPException:
+        raise  # ✅ Preserve 400 / 503 responses
+
     except SQLAlchemyError as e:
         await db.rollback()  # ✅ Rollback on error
-        print(f"❌ Database Error: {str(e)}")  # ✅ Debugging
+        logger.error("❌ Database Error during registration", exc_info=e)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
     except Exception as e:
-        print(f"❌ Unexpected Error: {str(e)}")  # ✅ Debugging
+        logger.exception("❌ Unexpected Error during registration")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 # --------------------------------------------
@@ -96,6 +148,12 @@ class Token(BaseModel):
     """Schema for JWT Token response"""
     access_token: str
     token_type: str
+    refresh_token: str = None  # ✅ Exchange at /token/refresh instead of logging in again
+    expires_in: int = None  # ✅ Access token lifetime in seconds
+
+class RefreshRequest(BaseModel):
+    """Schema for refresh token exchange"""
+    refresh_token: str
 
 class LoginRequest(BaseModel):  
     """Schema for user login"""
@@ -116,12 +174,14 @@ async def login_user(user: LoginRequest, db: AsyncSession = Depends(get_db)):
         result = await db.execute(select(User).where(User.username == user.username))
         user_obj = result.scalars().first()
 
-        if not user_obj or not pwd_context.verify(user.password, user_obj.hashed_password):
+        if not user_obj or not await password_hasher.verify(user.password, user_obj.hashed_password):
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
-        access_token = await create_access_token(data={"sub": user_obj.username})
+        # ✅ New session: the refresh token lets the client skip bcrypt until it expires
+        return await issue_session_tokens(db, user_obj)
 
-        return {"access_token": access_token, "token_type": "bearer"}
+    except HTTPException:
+        raise  # ✅ Preserve 401 / 503 responses
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -129,26 +189,211 @@ async def login_user(user: LoginRequest, db: AsyncSession = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+# --------------------------------------------
+# 🔹 Refresh Tokens (rotation, reuse detection, revocation)
+# --------------------------------------------
+
+def hash_refresh_token(token: str) -> str:
+    """Refresh tokens are random, so a keyed HMAC (not bcrypt) is enough to store them safely"""
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+async def issue_session_tokens(db: AsyncSession, user: User, family_id: str = None) -> dict:
+    """
+    🔹 Issues an access token + a fresh refresh token for a session and commits.
+    - family_id: Session being rotated (None starts a new session at login)
+    """
+    family_id = family_id or uuid.uuid4().hex
+    refresh_token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user.id,
+        family_id=family_id,
+        token_hash=hash_refresh_token(refresh_token),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    try:
+        await db.commit()
+    except (OperationalError, ProgrammingError) as e:
+        if "refresh_tokens" not in str(e.orig):
+            raise
+        # ✅ Database not migrated yet: say so instead of failing every login with a bare 500
+        await db.rollback()
+        logger.error("❌ refresh_tokens table is missing; create it (see the README migration notes)")
+        raise HTTPException(status_code=503, detail="Sessions unavailable: the refresh_tokens table has not been created")
+
+    access_token = await create_access_token(data={"sub": user.username, "sid": family_id})
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+async def revoke_session(db: AsyncSession, family_id: str):
+    """Revokes every refresh token of a session and rejects its outstanding access tokens"""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    await db.commit()
+    invalidation_bus.publish("session_revoked", (family_id, ACCESS_TOKEN_EXPIRE_MINUTES * 60))
+
+async def load_revoked_sessions():
+    """
+    🔹 Reads sessions revoked (by any process) within the last access-token lifetime.
+    - Concurrent requests share one load, on its own read session: it must outlive
+      whichever request started it
+    - First request carrying a session id: everything since the horizon
+    - Then every REVOCATION_REFRESH_SECONDS: only revocations since the last sync (with an
+      overlap), so a logout handled by another worker is enforced here within that interval
+    """
+    async def _load():
+        started = datetime.utcnow()
+        horizon = started - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        since = horizon
+        if revoked_sessions.loaded and revoked_sessions.synced_at is not None:
+            since = max(horizon, revoked_sessions.synced_at - timedelta(seconds=REVOCATION_SYNC_OVERLAP_SECONDS))
+        async with database.ReadSessionLocal() as db:
+            result = await db.execute(
+                select(RefreshToken.family_id, func.max(RefreshToken.revoked_at))
+                .where(RefreshToken.revoked_at > since)
+                .group_by(RefreshToken.family_id)
+            )
+            rows = result.all()
+        for family_id, revoked_at in rows:
+            remaining = (revoked_at - horizon).total_seconds()
+            revoked_sessions.add(family_id, remaining)
+        revoked_sessions.mark_synced(started, REVOCATION_REFRESH_SECONDS)
+
+    await revocation_loads.do("revocations", _load)
+
+@router.post("/token/refresh", response_model=Token)
+async def refresh_session(request: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """
+    🔹 Exchanges a refresh token for a new access token + refresh token (rotation).
+    - Costs an HMAC and two indexed queries instead of a bcrypt verify
+    - Each refresh token works once: presenting a rotated (or revoked) token again
+      is treated as theft and revokes the whole session
+    """
+    try:
+        result = await db.execute(
+            select(RefreshToken, User)
+            .join(User, User.id == RefreshToken.user_id)
+            .where(RefreshToken.token_hash == hash_refresh_token(request.refresh_token))
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        token, user = row
+
+        if token.revoked_at is None and token.rotated_at is None:
+            if token.expires_at < datetime.utcnow():
+                raise HTTPException(status_code=401, detail="Refresh token expired")
+
+            # ✅ Conditional claim: of two concurrent exchanges of the same token only one wins
+            claimed = await db.execute(
+                update(RefreshToken)
+                .where(RefreshToken.id == token.id, RefreshToken.rotated_at.is_(None), RefreshToken.revoked_at.is_(None))
+                .values(rotated_at=datetime.utcnow())
+            )
+            if claimed.rowcount == 1:
+                return await issue_session_tokens(db, user, token.family_id)
+
+        logger.warning("🚨 Refresh token reuse detected, revoking session", extra={"user_id": user.id, "family_id": token.family_id})
+        await revoke_session(db, token.family_id)
+        raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+
+    except HTTPException:
+        raise
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+# --------------------------------------------
+# 🔹 Principal Cache Invalidation
+# --------------------------------------------
+
+def invalidate_principal(username: str):
+    """Evicts a cached principal (call after out-of-band changes to a user row)"""
+    principal_cache.invalidate(username)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal_on_change(mapper, connection, target):
+    """
+    🔹 Keeps cached principals in sync with ORM writes to `users`.
+    - Fires on role / is_admin changes (and any other column update or delete)
+    - Also evicts the previous username if it was renamed
+    - Core-level bulk UPDATEs bypass this hook; use invalidate_principal() there
+    """
+    principal_cache.invalidate(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted or ():
+        principal_cache.invalidate(old_username)
+
 # --------------------------------------------
 # 🔹 Get Current User from JWT Token
 # --------------------------------------------
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(http_bearer), db: AsyncSession = Depends(get_db)):
+@timed("get_current_user")
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(http_bearer), db: AsyncSession = Depends(get_read_db)):
     """Extracts user info from JWT and fetches full user details from DB"""
     token = credentials.credentials  # Extract token from Authorization header
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    # ✅ Fetch full user object from the database
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalars().first()
+    # ✅ Logged-out / compromised sessions: an in-memory lookup, no database round trip
+    invalidation_bus.poll()  # ✅ Picks up revocations made by other workers
+    session_id = payload.get("sid")
+    if session_id is not None:
+        if revoked_sessions.needs_refresh(REVOCATION_REFRESH_SECONDS):
+            await load_revoked_sessions()
+        if revoked_sessions.is_revoked(session_id):
+            raise HTTPException(status_code=401, detail="Session revoked")
+
+    # ✅ Serve warm principals from cache (no database round trip)
+    user = principal_cache.get(username)
+    if user is not None:
+        return user
+
+    # ✅ Fetch full user object from the database (replica first)
+    with span("user_lookup"):
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
+
+        if not user and database.has_replica():
+            # ✅ Just registered and not replicated yet: read it from the primary
+            async with database.SessionLocal() as primary:
+                result = await primary.execute(select(User).where(User.username == username))
+                user = result.scalars().first()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    principal_cache.set(username, user)
     return user
+
+# --------------------------------------------
+# 🔹 Logout (Revoke the Current Session)
+# --------------------------------------------
+
+@router.post("/logout")
+async def logout_user(
+    user: User = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(http_bearer),
+    db: AsyncSession = Depends(get_db),
+):
+    """Revokes the session of the presented access token (its refresh tokens stop working too)"""
+    payload = jwt.get_unverified_claims(credentials.credentials)  # ✅ Already verified by get_current_user
+    if payload.get("sid") is None:
+        raise HTTPException(status_code=400, detail="Token is not bound to a session")
+    await revoke_session(db, payload["sid"])
+    logger.info("✅ Session revoked", extra={"username": user.username})
+    return {"message": "Logged out"}
@@ -0,0 +1,77 @@
+"""
+🔹 Authorization micro-benchmark: oso_rbac.authorize through the Polar VM,
+the decision cache and the compiled Python fast-path.
+
+    python benchmarks/bench_authz.py --checks 20000 --users 100
+
+Prints a JSON report (microseconds per check) to stdout.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)  # ✅ policies.polar is loaded relative to the working directory
+
+from fastapi import HTTPException
+import oso_rbac
+from models import Profile, User
+
+
+def build_checks(num_checks: int, num_users: int, seed: int):
+    """Returns (user, action, resource) triples: profile reads (own/other), admin-only actions"""
+    rng = random.Random(seed)
+    users = [User(id=i, username=f"user{i}", is_admin=(i % 10 == 0)) for i in range(1, num_users + 1)]
+    profiles = [Profile(id=i, user_id=i) for i in range(1, num_users + 1)]
+    checks = []
+    for _ in range(num_checks):
+        user = rng.choice(users)
+        kind = rng.random()
+        if kind < 0.6:
+            checks.append((user, "read", profiles[user.id - 1]))
+        elif kind < 0.8:
+            checks.append((user, "read", rng.choice(profiles)))
+        else:
+            checks.append((user, "manage", rng.choice(["documents", "admin-dashboard"])))
+    return checks
+
+
+def run(checks) -> float:
+    started = time.perf_counter()
+    for user, action, resource in checks:
+        try:
+            oso_rbac.authorize(user, action, resource)
+        except HTTPException:
+            pass
+    return (time.perf_counter() - started) / len(checks) * 1_000_000
+
+
+def main(args):
+    checks = build_checks(args.checks, args.users, args.seed)
+    report = {"checks": args.checks, "users": args.users, "us_per_check": {}}
+
+    oso_rbac.AUTHZ_COMPILED = False
+    oso_rbac.decision_cache.enabled = False
+    report["us_per_check"]["polar_vm"] = round(run(checks), 2)
+
+    oso_rbac.decision_cache.enabled = True
+    oso_rbac.decision_cache.clear()
+    report["us_per_check"]["decision_cache"] = round(run(checks), 2)
+    report["decision_cache"] = oso_rbac.decision_cache.stats()
+
+    oso_rbac.AUTHZ_COMPILED = True
+    report["us_per_check"]["compiled"] = round(run(checks), 2)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+"""
+🔹 Multi-worker cache benchmark: N processes look up the same hot principals through
+per-process TTLCaches (CACHE_BACKEND=local) or one SharedMemoryCache (CACHE_BACKEND=shared).
+Every miss stands for a database lookup.
+
+    python benchmarks/bench_cache.py --workers 4 --lookups 20000 --users 2000
+
+Prints a JSON report (misses = database lookups, hit rate, microseconds per lookup) to stdout.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from cache import SharedMemoryCache, TTLCache
+from models import User
+
+
+def worker(backend: str, path: str, args, seed: int, results):
+    rng = random.Random(seed)
+    if backend == "shared":
+        principals = SharedMemoryCache(path, maxsize=args.users * 2, ttl=300, record_size=1024)
+    else:
+        principals = TTLCache(maxsize=args.users * 2, ttl=300)
+    # ✅ Skewed traffic: a few users make most of the requests
+    usernames = [f"user{int(rng.paretovariate(1.2)) % args.users}" for _ in range(args.lookups)]
+
+    started = time.perf_counter()
+    misses = 0
+    for username in usernames:
+        if principals.get(username) is None:
+            misses += 1
+            principals.set(username, User(id=1, username=username, email=f"{username}@example.com",
+                                          hashed_password="$2b$12$" + "x" * 53, role="user", is_admin=False))
+    results.put((misses, time.perf_counter() - started))
+
+
+def run(backend: str, args) -> dict:
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "principals.cache")
+        processes = [context.Process(target=worker, args=(backend, path, args, seed, results)) for seed in range(args.workers)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    lookups = args.workers * args.lookups
+    misses = sum(outcome[0] for outcome in outcomes)
+    return {
+        "db_lookups": misses,
+        "hit_rate": round(1 - misses / lookups, 4),
+        "us_per_lookup": round(sum(outcome[1] for outcome in outcomes) / lookups * 1_000_000, 2),
+    }
+
+
+def main(args):
+    report = {"workers": args.workers, "lookups_per_worker": args.lookups, "users": args.users, "backends": {}}
+    for backend in ("local", "shared"):
+        report["backends"][backend] = run(backend, args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=20000, help="Lookups per worker")
+    parser.add_argument("--users", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,134 @@
+"""
+🔹 Profile endpoint benchmark: legacy SELECT/INSERT/commit/refresh handlers vs the upsert path.
+
+Runs GET /profile (first visit creates the profile) and PUT /profile through the
+full ASGI stack (auth, RBAC, serialization) with concurrent clients, against a
+temporary SQLite file or any database URL.
+
+    python benchmarks/bench_profiles.py --users 200 --requests 2000 --concurrency 20
+    python benchmarks/bench_profiles.py --database-url mysql+asyncmy://root@localhost/bench_db
+
+Prints a JSON report (requests per second, legacy vs upsert) to stdout.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx
+from fastapi import APIRouter, Depends
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from auth import create_access_token, get_current_user
+from database import Base, get_db
+from main import ProfileUpdate, app
+from models import Profile, User
+from oso_rbac import authorize
+
+# ✅ The handlers as they were before the upsert path (for the "before" numbers)
+legacy = APIRouter()
+
+
+@legacy.get("/legacy/profile")
+async def legacy_get_profile(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Profile).where(Profile.user_id == user.id))
+    profile = result.scalars().first()
+    if profile is None:
+        profile = Profile(user_id=user.id, bio="This is a new profile.")
+        db.add(profile)
+        await db.commit()
+        await db.refresh(profile)
+    authorize(user, "read", profile)
+    return profile
+
+
+@legacy.put("/legacy/profile")
+async def legacy_update_profile(request: ProfileUpdate, user: User = Depends(get_current_user),
+                                db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Profile).where(Profile.user_id == user.id))
+    profile = result.scalars().first()
+    if profile is None:
+        profile = Profile(user_id=user.id, bio=request.bio)
+        db.add(profile)
+    else:
+        profile.bio = request.bio
+    await db.commit()
+    await db.refresh(profile)
+    return {"message": "Profile updated successfully", "bio": profile.bio}
+
+
+async def drive(client, method, path, tokens, total, concurrency) -> float:
+    """Fires `total` requests over `concurrency` workers, cycling through users; returns requests/second"""
+    counter = iter(range(total))
+
+    async def _worker():
+        for index in counter:
+            headers = {"Authorization": f"Bearer {tokens[index % len(tokens)]}"}
+            kwargs = {"json": {"bio": f"bio {index}"}} if method == "PUT" else {}
+            response = await client.request(method, path, headers=headers, **kwargs)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+
+async def main(args):
+    logging.getLogger().setLevel(logging.WARNING)  # ✅ app.log DEBUG output would dominate the timings
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_profiles.db"
+    engine = create_async_engine(database_url)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_factory() as session:
+        users = [User(username=f"bench{i}", email=f"bench{i}@example.com", hashed_password="x") for i in range(args.users)]
+        session.add_all(users)
+        await session.commit()
+    tokens = [await create_access_token({"sub": user.username}) for user in users]
+
+    async def _get_bench_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = _get_bench_db
+    app.include_router(legacy)
+
+    async def _reset_profiles():
+        async with session_factory() as session:
+            await session.execute(delete(Profile))
+            await session.commit()
+
+    report = {"database": engine.dialect.name, "users": args.users, "requests": args.requests,
+              "concurrency": args.concurrency, "rps": {}}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for label, prefix in (("legacy", "/legacy"), ("upsert", "")):
+            await _reset_profiles()
+            report["rps"][label] = {
+                "get_first_visit": round(await drive(client, "GET", f"{prefix}/profile", tokens, args.users, args.concurrency), 1),
+                "get": round(await drive(client, "GET", f"{prefix}/profile", tokens, args.requests, args.concurrency), 1),
+                "put": round(await drive(client, "PUT", f"{prefix}/profile", tokens, args.requests, args.concurrency), 1),
+            }
+
+    await engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""
+🔹 Retrieval benchmark: full-text path vs FAISS, BM25 and hybrid (RRF) retrieval.
+
+Seeds a synthetic, topic-labelled corpus into a database, then measures
+recall@k (share of the top-k that belong to the query's topic) and
+per-query latency for each retriever.
+
+    python benchmarks/bench_retrieval.py --docs 5000 --queries 200
+    python benchmarks/bench_retrieval.py --database-url mysql+asyncmy://root@localhost/bench_db
+
+Prints a JSON report to stdout.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Document
+from retrievers import (
+    BM25Retriever, FaissRetriever, FullTextRetriever, HashingEmbedder, HybridRetriever, document_listeners,
+)
+
+FILLER_WORDS = ["system", "value", "result", "process", "method", "general", "common", "example", "report", "detail"]
+
+
+def build_corpus(num_docs: int, num_topics: int, seed: int):
+    """Returns (documents, topic vocabularies); each document is labelled with a topic"""
+    rng = random.Random(seed)
+    vocabularies = [[f"topic{t}term{w}" for w in range(20)] for t in range(num_topics)]
+    documents = []
+    for doc_index in range(num_docs):
+        topic = doc_index % num_topics
+        words = rng.choices(vocabularies[topic], k=18) + rng.choices(FILLER_WORDS, k=12)
+        rng.shuffle(words)
+        documents.append((topic, " ".join(words)))
+    return documents, vocabularies
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def measure(retriever, session, queries, topic_of, top_k):
+    latencies, recalls = [], []
+    for topic, query in queries:
+        started = time.perf_counter()
+        rows = await retriever.search(session, query, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(sum(1 for row in rows if topic_of[row["id"]] == topic) / top_k)
+    return {
+        "recall_at_k": round(statistics.mean(recalls), 4),
+        "latency_ms_p50": round(percentile(latencies, 50), 3),
+        "latency_ms_p95": round(percentile(latencies, 95), 3),
+        "latency_ms_mean": round(statistics.mean(latencies), 3),
+    }
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_async_engine(database_url)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+
+    documents, vocabularies = build_corpus(args.docs, args.topics, args.seed)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(Document.__table__.insert(), [
+            {"title": f"Doc {i}", "content": content} for i, (_, content) in enumerate(documents, start=1)
+        ])
+    topic_of = {i: topic for i, (topic, _) in enumerate(documents, start=1)}
+
+    rng = random.Random(args.seed + 1)
+    queries = []
+    for _ in range(args.queries):
+        topic = rng.randrange(args.topics)
+        queries.append((topic, " ".join(rng.sample(vocabularies[topic], 3))))
+
+    report = {"docs": args.docs, "queries": args.queries, "top_k": args.top_k, "database": engine.dialect.name}
+    async with session_factory() as session:
+        report["fulltext"] = await measure(FullTextRetriever(), session, queries, topic_of, args.top_k)
+
+        retriever = FaissRetriever(
+            HashingEmbedder(), index_path=os.path.join(workdir, "bench.index"), index_type=args.index_type,
+        )
+        started = time.perf_counter()
+        await retriever.build(session)
+        report[f"faiss_{args.index_type}"] = {
+            "build_seconds": round(time.perf_counter() - started, 3),
+            **await measure(retriever, session, queries, topic_of, args.top_k),
+        }
+
+        lexical = BM25Retriever()
+        started = time.perf_counter()
+        await lexical.index.build(session)
+        report["bm25"] = {
+            "build_seconds": round(time.perf_counter() - started, 3),
+            **await measure(lexical, session, queries, topic_of, args.top_k),
+        }
+        index_latencies = []
+        for _, query in queries:
+            started = time.perf_counter()
+            lexical.index.search(query, args.top_k)
+            index_latencies.append((time.perf_counter() - started) * 1000)
+        report["bm25"]["index_only_latency_ms_p50"] = round(percentile(index_latencies, 50), 3)
+
+        report["hybrid_rrf"] = await measure(HybridRetriever(lexical, retriever), session, queries, topic_of, args.top_k)
+        document_listeners.remove(lexical.index.apply_changes)
+
+    await engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index-type", choices=["hnsw", "ivf", "flat"], default="hnsw")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""
+🔹 Response serialization benchmark: the generic jsonable_encoder path (what returning
+ORM objects / plain dicts without a response model costs) vs the response models
+serialized by pydantic-core, plus ?fields= and RAG context shaping.
+
+    python benchmarks/bench_serialization.py --iterations 2000 --page-size 500 --context-chars 12000
+
+Prints a JSON report (microseconds per response and payload bytes, per route and mode) to stdout.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from fastapi.encoders import jsonable_encoder
+from models import Profile
+from rag_pipeline import ContextOptions, shape_context
+from schemas import ProfileOut, ProfilePage, RAGAnswer
+
+
+def legacy_json(content) -> bytes:
+    """FastAPI without a response model: jsonable_encoder walk, then json.dumps"""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(serialize, iterations: int) -> dict:
+    body = serialize()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        serialize()
+    return {"us": round((time.perf_counter() - started) / iterations * 1_000_000, 2), "bytes": len(body)}
+
+
+def main(args):
+    now = datetime.utcnow()
+    profile = Profile(id=1, user_id=1, bio="Backend engineer who likes fast APIs.", version=3, updated_at=now)
+    page = [Profile(id=i, user_id=i, bio=f"Bio of user {i}", version=1, updated_at=now) for i in range(1, args.page_size + 1)]
+    context = ("Retrieved passage about distributed systems and caching. " * (args.context_chars // 57 + 1))[:args.context_chars]
+    answer = "Caching keeps hot data close to the reader. " * 5
+
+    def rag(options: ContextOptions):
+        return RAGAnswer(query="What is caching?", **shape_context(context, options), answer=answer, prompt_tokens=3000)
+
+    report = {"iterations": args.iterations, "page_size": args.page_size, "context_chars": args.context_chars, "routes": {}}
+    report["routes"]["GET /profile"] = {
+        "legacy_orm": measure(lambda: legacy_json(profile), args.iterations),
+        "response_model": measure(lambda: ProfileOut.model_validate(profile).model_dump_json().encode(), args.iterations),
+        "fields=bio": measure(lambda: ProfileOut.model_validate(profile).model_dump_json(include={"bio"}).encode(), args.iterations),
+    }
+    report["routes"]["GET /profiles"] = {
+        "legacy_orm": measure(lambda: legacy_json({"items": page, "next_after": None}), max(1, args.iterations // 20)),
+        "response_model": measure(lambda: ProfilePage(items=page).model_dump_json().encode(), max(1, args.iterations // 20)),
+        "fields=id": measure(
+            lambda: ProfilePage(items=page).model_dump_json(include={"items": {"__all__": {"id"}}, "next_after": True}).encode(),
+            max(1, args.iterations // 20),
+        ),
+    }
+    full = {"query": "What is caching?", "context": context, "answer": answer, "prompt_tokens": 3000}
+    report["routes"]["POST /rag/query"] = {
+        "legacy_dict": measure(lambda: legacy_json(full), args.iterations),
+        "response_model": measure(lambda: rag(ContextOptions()).model_dump_json(exclude_none=True).encode(), args.iterations),
+        "context_chars=500": measure(lambda: rag(ContextOptions(context_chars=500)).model_dump_json(exclude_none=True).encode(), args.iterations),
+        "include_context=false": measure(lambda: rag(ContextOptions(include_context=False)).model_dump_json(exclude_none=True).encode(), args.iterations),
+    }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--context-chars", type=int, default=12000, help="About 3000 tokens, the default context budget")
+    main(parser.parse_args())
@@ -0,0 +1,300 @@
+"""
+🔹 Load test: scripted traffic mix against the full app, fully in-process.
+
+Runs the FastAPI app through httpx's ASGI transport against a temporary SQLite
+database (documents indexed with FTS5, so /rag/query exercises real retrieval)
+and a local fake OpenAI server with configurable latency. A fixed number of
+concurrent virtual users replay a weighted mix of login, profile CRUD, admin
+and RAG requests; latency percentiles and throughput are reported per route.
+
+    python benchmarks/loadtest.py --requests 3000 --concurrency 32
+    python benchmarks/loadtest.py --mix "rag_query=1" --openai-latency 0.2 --openai-token-delay 0.005
+    python benchmarks/loadtest.py --output before.json              # on the old commit
+    python benchmarks/loadtest.py --compare before.json             # on the new commit
+
+Prints a JSON report to stdout (and to --output): p50/p95/p99/mean/max latency
+in milliseconds, requests per second and error counts for every route, the
+commit it ran on, and with --compare the change against a previous report.
+The seed makes the request sequence reproducible across runs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "sk-loadtest")
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.gettempdir(), "fastapi-microservice-loadtest.log"))
+
+import httpx
+from openai import AsyncOpenAI
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+import rag_pipeline
+from auth import create_access_token
+from database import Base, get_db, get_read_db
+from fake_openai import create_fake_openai_app
+from hashing import _hash_password
+from main import app
+from models import Document, Profile, User
+from retrievers import FullTextRetriever, create_sqlite_fts
+
+PASSWORD = "loadtest-password"
+DEFAULT_MIX = "login=1,get_profile=4,update_profile=2,read_profile=2,list_profiles=1,admin=1,rag_query=3"
+FILLER_WORDS = ["system", "value", "result", "process", "method", "general", "common", "example", "report", "detail"]
+
+
+def parse_mix(spec: str) -> dict:
+    """"login=1,rag_query=3" -> {"login": 1.0, "rag_query": 3.0}"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip():
+            if name.strip() not in OPERATIONS:
+                raise SystemExit(f"❌ Unknown operation in --mix: {name.strip()} (known: {', '.join(OPERATIONS)})")
+            mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+# --------------------------------------------
+# 🔹 Operations (one HTTP request each, labelled by route template)
+# --------------------------------------------
+
+async def op_login(client, user, rng, queries):
+    return "POST /login", await client.post("/login", json={"username": user["username"], "password": PASSWORD})
+
+
+async def op_get_profile(client, user, rng, queries):
+    return "GET /profile", await client.get("/profile", headers=user["headers"])
+
+
+async def op_update_profile(client, user, rng, queries):
+    bio = f"Updated bio {rng.randrange(1_000_000)}"
+    return "PUT /profile", await client.put("/profile", json={"bio": bio}, headers=user["headers"])
+
+
+async def op_read_profile(client, user, rng, queries):
+    return "GET /profile/{user_id}", await client.get(f"/profile/{user['id']}", headers=user["headers"])
+
+
+async def op_list_profiles(client, user, rng, queries):
+    return "GET /profiles", await client.get("/profiles", params={"limit": 50}, headers=user["headers"])
+
+
+async def op_admin(client, user, rng, queries):
+    return "GET /admin", await client.get("/admin", headers=user["admin_headers"])
+
+
+async def op_rag_query(client, user, rng, queries):
+    return "POST /rag/query", await client.post("/rag/query", json={"query": rng.choice(queries)}, headers=user["headers"])
+
+
+OPERATIONS = {
+    "login": op_login,
+    "get_profile": op_get_profile,
+    "update_profile": op_update_profile,
+    "read_profile": op_read_profile,
+    "list_profiles": op_list_profiles,
+    "admin": op_admin,
+    "rag_query": op_rag_query,
+}
+
+# --------------------------------------------
+# 🔹 Fixtures: database, users, documents, fake OpenAI
+# --------------------------------------------
+
+async def seed(session_factory, num_users: int, num_docs: int, num_topics: int, rng) -> tuple:
+    """Returns (virtual users, RAG query pool)"""
+    hashed_password = _hash_password(PASSWORD)  # ✅ One bcrypt hash shared by every user (seeding stays fast)
+    vocabularies = [[f"topic{t}term{w}" for w in range(20)] for t in range(num_topics)]
+
+    async with session_factory() as session:
+        users = [User(username=f"load{i}", email=f"load{i}@example.com", hashed_password=hashed_password, is_admin=(i == 0))
+                 for i in range(num_users)]
+        session.add_all(users)
+        await session.flush()
+        session.add_all([Profile(user_id=user.id, bio="Seeded profile.") for user in users])
+        for doc_index in range(num_docs):
+            words = rng.choices(vocabularies[doc_index % num_topics], k=18) + rng.choices(FILLER_WORDS, k=12)
+            rng.shuffle(words)
+            session.add(Document(title=f"Document {doc_index}", content=" ".join(words)))
+        await session.commit()
+
+    admin_token = await create_access_token({"sub": users[0].username})
+    virtual_users = []
+    for user in users:
+        token = await create_access_token({"sub": user.username})
+        virtual_users.append({
+            "id": user.id,
+            "username": user.username,
+            "headers": {"Authorization": f"Bearer {token}"},
+            "admin_headers": {"Authorization": f"Bearer {admin_token}"},
+        })
+    queries = [" ".join(rng.sample(rng.choice(vocabularies), 2)) for _ in range(200)]
+    return virtual_users, queries
+
+
+def openai_client(args) -> AsyncOpenAI:
+    """Fake OpenAI served in-process (or any --openai-url, e.g. `uvicorn fake_openai:app --port 8001`)"""
+    if args.openai_url:
+        return AsyncOpenAI(api_key="sk-loadtest", base_url=args.openai_url, max_retries=0)
+    fake_app = create_fake_openai_app(latency=args.openai_latency, token_delay=args.openai_token_delay)
+    transport = httpx.ASGITransport(app=fake_app)
+    return AsyncOpenAI(api_key="sk-loadtest", base_url="http://fake-openai/v1",
+                       http_client=httpx.AsyncClient(transport=transport), max_retries=0)
+
+# --------------------------------------------
+# 🔹 Driver
+# --------------------------------------------
+
+async def run_load(client, users, queries, mix: dict, total: int, concurrency: int, duration: float, seed_value: int) -> tuple:
+    """Fires the mix over `concurrency` workers; returns ({route: [latency seconds]}, {route: errors}, elapsed)"""
+    names, weights = list(mix), list(mix.values())
+    latencies, errors = {}, {}
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def _worker(worker_index: int):
+        nonlocal issued
+        rng = random.Random(seed_value * 1000 + worker_index)  # ✅ Same per-worker sequence on every run
+        while (deadline is None and issued < total) or (deadline is not None and time.perf_counter() < deadline):
+            issued += 1
+            operation = OPERATIONS[rng.choices(names, weights)[0]]
+            user = users[rng.randrange(len(users))]
+            started = time.perf_counter()
+            try:
+                route, response = await operation(client, user, rng, queries)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                route, failed = operation.__name__, True
+            latencies.setdefault(route, []).append(time.perf_counter() - started)
+            if failed:
+                errors[route] = errors.get(route, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(i) for i in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarize(samples, error_count: int, elapsed: float) -> dict:
+    return {
+        "requests": len(samples),
+        "errors": error_count,
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+def compare(before: dict, after: dict) -> dict:
+    """Per-route change in p50/p95/p99 latency and throughput (negative latency change = faster)"""
+    comparison = {}
+    for route, stats in after["routes"].items():
+        previous = before.get("routes", {}).get(route)
+        if not previous:
+            continue
+        comparison[route] = {
+            field: {
+                "before": previous[field],
+                "after": stats[field],
+                "change_pct": round((stats[field] - previous[field]) / previous[field] * 100, 1) if previous[field] else None,
+            }
+            for field in ("p50_ms", "p95_ms", "p99_ms", "rps")
+        }
+    return {"baseline_commit": before.get("commit"), "routes": comparison}
+
+
+async def main(args):
+    logging.getLogger().setLevel(logging.WARNING)  # ✅ Keep app.log output out of the timings
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/loadtest.db"
+    engine = create_async_engine(database_url)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        if engine.dialect.name == "sqlite":
+            await conn.run_sync(create_sqlite_fts)
+    users, queries = await seed(session_factory, args.users, args.docs, args.topics, rng)
+
+    async def _get_loadtest_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = _get_loadtest_db
+    app.dependency_overrides[get_read_db] = _get_loadtest_db
+    rag_pipeline.client = openai_client(args)
+    rag_pipeline.retriever = FullTextRetriever()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None) as client:
+        if args.warmup:
+            await run_load(client, users, queries, mix, args.warmup, args.concurrency, 0, args.seed + 1)
+        latencies, errors, elapsed = await run_load(
+            client, users, queries, mix, args.requests, args.concurrency, args.duration, args.seed,
+        )
+
+    await engine.dispose()
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "database": engine.dialect.name, "users": args.users, "docs": args.docs, "requests": args.requests,
+            "duration": args.duration, "concurrency": args.concurrency, "mix": mix, "seed": args.seed,
+            "openai": args.openai_url or {"latency": args.openai_latency, "token_delay": args.openai_token_delay},
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": summarize(all_samples, sum(errors.values()), elapsed),
+        "routes": {route: summarize(samples, errors.get(route, 0), elapsed) for route, samples in sorted(latencies.items())},
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            report["comparison"] = compare(json.load(baseline), report)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead of --requests")
+    parser.add_argument("--warmup", type=int, default=200, help="Unmeasured requests before the run")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="Fake OpenAI seconds before the first token")
+    parser.add_argument("--openai-token-delay", type=float, default=0.0, help="Fake OpenAI seconds between tokens")
+    parser.add_argument("--openai-url", default=None, help="Use an external (fake) OpenAI base URL instead")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    parser.add_argument("--compare", default=None, help="Previous report to compare against")
+    asyncio.run(main(parser.parse_args()))
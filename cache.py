@@ -0,0 +1,597 @@
+import hashlib
+import hmac
+import mmap
+import os
+import pickle
+import stat
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl  # ✅ Optional: cross-process locking for the shared backend (POSIX only)
+except ImportError:
+    fcntl = None
+
+# ✅ Cache Backend Settings
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local").lower()  # "local" (per process) or "shared" (all workers on the host)
+CACHE_SHARED_DIR = os.getenv("CACHE_SHARED_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "fastapi-microservice")  # Private directory prefix; one per deployment
+CACHE_SECRET = os.getenv("CACHE_SECRET", "")  # HMAC key for shared records (the deployment secret); unset: random key file
+CACHE_BUS_CAPACITY = int(os.getenv("CACHE_BUS_CAPACITY", "4096"))  # Invalidation events kept for slow workers
+
+# ✅ Sentinel used to tell "missing" apart from a cached None
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    🔹 Bounded in-process cache with per-entry TTL and LRU eviction.
+    - maxsize: Maximum number of entries kept (least recently used is evicted first)
+    - ttl: Seconds an entry stays valid after it was stored
+    - enabled: When False, every lookup is a miss and nothing is stored
+    - max_bytes: Optional size bound; entries are weighed with sizeof(key, value)
+    - on_evict: Optional callback(key, value) run whenever an entry leaves the cache
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, enabled: bool = True,
+                 max_bytes: int = None, sizeof=None, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._lock = threading.Lock()
+
+    def _discard(self, key):
+        """Removes key (caller holds the lock); returns the evicted value or _MISSING"""
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        self.bytes -= entry[2]
+        return entry[1]
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if it is missing or expired"""
+        if not self.enabled:
+            self.misses += 1
+            return default
+
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value, _ = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)  # ✅ Mark as most recently used
+                self.hits += 1
+                return value
+
+            self._discard(key)  # ✅ Drop stale entry
+            self.misses += 1
+        self._notify([(key, value)])
+        return default
+
+    def set(self, key, value):
+        """Stores value under key, evicting the least recently used entries if full"""
+        if not self.enabled or self.maxsize <= 0:
+            return
+
+        size = self.sizeof(key, value) if self.sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # ✅ Never cache a single entry larger than the whole budget
+
+        evicted = []
+        with self._lock:
+            previous = self._discard(key)
+            if previous is not _MISSING:
+                evicted.append((key, previous))
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                old_key = next(iter(self._data))
+                evicted.append((old_key, self._discard(old_key)))
+                self.evictions += 1
+        self._notify(evicted)
+
+    def invalidate(self, key):
+        """Removes a single key (no-op if it is not cached)"""
+        with self._lock:
+            value = self._discard(key)
+        if value is not _MISSING:
+            self._notify([(key, value)])
+
+    def clear(self):
+        """Removes every entry and resets the counters"""
+        with self._lock:
+            evicted = [(key, entry[1]) for key, entry in self._data.items()]
+            self._data.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+        self._notify(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters for observability"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# --------------------------------------------
+# 🔹 Shared-Memory Backend (one table for every worker on the host)
+# --------------------------------------------
+
+_CACHE_MAGIC = b"FMCACHE2"
+_BUS_MAGIC = b"FMBUS002"
+_HEADER = struct.Struct("<8sIIQQ")  # magic, slots, record size, generation / write sequence, entry count
+_HEADER_SIZE = 64
+_RECORD = struct.Struct("<QQdI32s")  # key hash, generation, expires at (wall clock), payload length, HMAC
+_EVENT = struct.Struct("<QI32s")  # sequence, payload length, HMAC
+_SIGNED_RECORD = struct.Struct("<QQdI")  # The record fields covered by its HMAC (with the payload)
+_SIGNED_EVENT = struct.Struct("<QI")
+_COUNTER = struct.Struct("<Q")
+_GENERATION_OFFSET = 16
+_COUNT_OFFSET = 24
+_PROBES = 8
+_KEY_FILE = "hmac.key"
+_secrets = {}  # directory -> HMAC key
+
+
+def shared_path(name: str) -> str:
+    """Path of a shared file in this deployment's private directory (created with mode 0700)"""
+    directory = os.path.join(CACHE_SHARED_DIR, f"{CACHE_NAMESPACE}-{os.geteuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def _check_private(info, path: str, kind: str):
+    """Refuses files and directories other users could have planted or can write"""
+    if info.st_uid != os.geteuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"❌ Shared cache {kind} {path} must be owned by this user with no group/other access")
+
+
+def _private_dir(directory: str) -> str:
+    info = os.lstat(directory)  # ✅ lstat: a symlink planted in CACHE_SHARED_DIR is not followed
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f"❌ Shared cache directory {directory} is not a directory")
+    _check_private(info, directory, "directory")
+    return directory
+
+
+def _open_private(path: str) -> int:
+    """Opens (or creates, mode 0600) a regular file owned by this user in a private directory"""
+    _private_dir(os.path.dirname(os.path.abspath(path)))
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | getattr(os, "O_CLOEXEC", 0), 0o600)
+    try:
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode):
+            raise RuntimeError(f"❌ Shared cache file {path} is not a regular file")
+        _check_private(info, path, "file")
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _secret(directory: str) -> bytes:
+    """
+    🔹 HMAC key for the shared files in directory.
+    - CACHE_SECRET when set (use the deployment secret)
+    - Otherwise a random key created once in the private directory and read by every worker
+    """
+    if CACHE_SECRET:
+        return hashlib.sha256(b"shared-cache:" + CACHE_SECRET.encode("utf-8")).digest()
+    if directory not in _secrets:
+        fd = _open_private(os.path.join(directory, _KEY_FILE))
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            key = os.pread(fd, 32, 0)
+            if len(key) < 32:
+                key = os.urandom(32)
+                os.pwrite(fd, key, 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        _secrets[directory] = key
+    return _secrets[directory]
+
+
+def _open_shared(path: str, magic: bytes, slots: int, record_size: int):
+    """
+    🔹 Opens (or creates) a shared file; returns (fd, mmap).
+    - The file must be private (see _open_private): records hold pickles, so only
+      this user may write them
+    - Only ever grows the file: shrinking it under another worker's mapping would crash
+      that worker (SIGBUS), so layouts are kept apart by file name instead (see create_cache)
+    """
+    fd = _open_private(path)
+    size = _HEADER_SIZE + slots * record_size
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)  # ✅ New pages read as zeros: free slots
+        header = os.pread(fd, _HEADER.size, 0)
+        if _HEADER.unpack(header)[:3] != (magic, slots, record_size):
+            os.pwrite(fd, _HEADER.pack(magic, slots, record_size, 0, 0), 0)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    return fd, mmap.mmap(fd, size)
+
+
+class _SharedFile:
+    """Thread + cross-process exclusive lock around writes to a shared file"""
+
+    def __init__(self, path: str, magic: bytes, slots: int, record_size: int):
+        if fcntl is None:
+            raise RuntimeError("❌ The shared cache backend needs fcntl (POSIX)")
+        self.path = path
+        self.slots = slots
+        self.record_size = record_size
+        self._fd, self._map = _open_shared(path, magic, slots, record_size)
+        self._key = _secret(os.path.dirname(os.path.abspath(path)))
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _counter(self, offset: int) -> int:
+        return _COUNTER.unpack_from(self._map, offset)[0]
+
+    def _set_counter(self, offset: int, value: int):
+        _COUNTER.pack_into(self._map, offset, value)
+
+    def _offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self.record_size
+
+    def _sign(self, fields: bytes, payload: bytes) -> bytes:
+        return hmac.digest(self._key, fields + payload, "sha256")
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def _key_hash(key) -> int:
+    """Process-independent 64-bit hash (hash() is salted per process); never 0, which marks a free slot"""
+    digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | 1
+
+
+class SharedMemoryCache(_SharedFile):
+    """
+    🔹 TTLCache-compatible cache in an mmap'd file shared by every worker on the host.
+    - Fixed-size records (header + pickled (key, value)) in an open-addressed table;
+      a key lives in one of _PROBES slots after its hash, the entry closest to expiry
+      in that window is evicted when all are taken
+    - Values larger than a record are not cached (counted in `oversize`)
+    - Every record is signed (HMAC-SHA256, see _secret) and only unpickled once its
+      signature checks out; reads take no lock, so a record torn by a concurrent write
+      fails the check and is a miss
+    - clear() bumps a generation number, so every worker drops all entries at once;
+      invalidate() is seen by every worker on its next lookup
+    - on_evict only fires for entries this process replaces or invalidates
+    """
+
+    def __init__(self, path: str, maxsize: int = 1024, ttl: float = 60.0, enabled: bool = True,
+                 record_size: int = 1024, on_evict=None):
+        super().__init__(path, _CACHE_MAGIC, max(maxsize, 1), record_size)
+        self.maxsize = self.slots
+        self.ttl = ttl
+        self.enabled = enabled
+        self.on_evict = on_evict
+        self.capacity = record_size - _RECORD.size  # Payload bytes per record
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oversize = 0
+
+    def _window(self, key_hash: int):
+        start = key_hash % self.slots
+        return [(start + i) % self.slots for i in range(min(_PROBES, self.slots))]
+
+    def _read(self, slot: int, key_hash: int, generation: int, now: float):
+        """Returns (key, value) stored in slot for key_hash, or None"""
+        offset = self._offset(slot)
+        stored_hash, stored_generation, expires_at, length, signature = _RECORD.unpack_from(self._map, offset)
+        if stored_hash != key_hash or stored_generation != generation or expires_at <= now or length > self.capacity:
+            return None
+        payload = self._map[offset + _RECORD.size:offset + _RECORD.size + length]
+        fields = _SIGNED_RECORD.pack(stored_hash, stored_generation, expires_at, length)
+        if not hmac.compare_digest(self._sign(fields, payload), signature):
+            return None  # ✅ Being rewritten by another worker (or not written by this app)
+        try:
+            return pickle.loads(payload)
+        except Exception:
+            return None  # ✅ Written by an incompatible build of the app
+
+    def _lookup(self, key):
+        key_hash = _key_hash(key)
+        generation, now = self._counter(_GENERATION_OFFSET), time.time()
+        for slot in self._window(key_hash):
+            entry = self._read(slot, key_hash, generation, now)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+        return _MISSING
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if it is missing or expired"""
+        value = self._lookup(key) if self.enabled else _MISSING
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Stores value under key, evicting the entry closest to expiry in its probe window if full"""
+        if not self.enabled:
+            return
+        payload = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.capacity:
+            self.oversize += 1
+            return
+
+        key_hash = _key_hash(key)
+        evicted = []
+        with self._locked():
+            generation, now = self._counter(_GENERATION_OFFSET), time.time()
+            target = free = oldest = None
+            for slot in self._window(key_hash):
+                stored_hash, stored_generation, expires_at, _, _ = _RECORD.unpack_from(self._map, self._offset(slot))
+                if stored_hash == key_hash and stored_generation == generation:
+                    target = slot  # ✅ Overwrite the previous value
+                    break
+                if stored_hash == 0 or stored_generation != generation:
+                    free = slot if free is None else free
+                elif oldest is None or expires_at < oldest[1]:
+                    oldest = (slot, expires_at)
+
+            if target is None and free is not None:
+                target = free
+                self._set_counter(_COUNT_OFFSET, self._counter(_COUNT_OFFSET) + 1)
+            elif target is None:
+                target = oldest[0]
+                if oldest[1] > now:
+                    self.evictions += 1
+            if self.on_evict:
+                stored_hash = _RECORD.unpack_from(self._map, self._offset(target))[0]
+                previous = self._read(target, stored_hash, generation, float("-inf"))  # ✅ Expired ones too
+                if previous is not None:
+                    evicted.append(previous)
+
+            # ✅ Hash last: readers never match a half-written record
+            offset = self._offset(target)
+            expires_at = now + self.ttl
+            signature = self._sign(_SIGNED_RECORD.pack(key_hash, generation, expires_at, len(payload)), payload)
+            _RECORD.pack_into(self._map, offset, 0, generation, expires_at, len(payload), signature)
+            self._map[offset + _RECORD.size:offset + _RECORD.size + len(payload)] = payload
+            _COUNTER.pack_into(self._map, offset, key_hash)
+        self._notify(evicted)
+
+    def invalidate(self, key):
+        """Removes a single key for every worker (no-op if it is not cached)"""
+        key_hash = _key_hash(key)
+        evicted = []
+        with self._locked():
+            generation = self._counter(_GENERATION_OFFSET)
+            for slot in self._window(key_hash):
+                offset = self._offset(slot)
+                stored_hash, stored_generation = _RECORD.unpack_from(self._map, offset)[:2]
+                if stored_hash != key_hash or stored_generation != generation:
+                    continue
+                entry = self._read(slot, key_hash, generation, float("-inf"))
+                if entry is not None and entry[0] != key:
+                    continue  # ✅ Hash collision with another key
+                _COUNTER.pack_into(self._map, offset, 0)
+                self._set_counter(_COUNT_OFFSET, self._counter(_COUNT_OFFSET) - 1)
+                if entry is not None:
+                    evicted.append(entry)
+        self._notify(evicted)
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def clear(self):
+        """Drops every entry for every worker and resets this process's counters"""
+        with self._locked():
+            self._set_counter(_GENERATION_OFFSET, self._counter(_GENERATION_OFFSET) + 1)
+            self._set_counter(_COUNT_OFFSET, 0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oversize = 0
+
+    def __len__(self):
+        return self._counter(_COUNT_OFFSET)  # ✅ Occupied slots (expired entries count until reused)
+
+    def __contains__(self, key):
+        return self.enabled and self._lookup(key) is not _MISSING
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters (this process) and table occupancy (all workers)"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "bytes": len(self) * self.record_size,
+            "max_bytes": self.slots * self.record_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "oversize": self.oversize,
+        }
+
+
+# --------------------------------------------
+# 🔹 Invalidation Broadcast
+# --------------------------------------------
+
+class InvalidationBus:
+    """
+    🔹 Topic-based invalidation messages for state each process keeps for itself
+    (e.g. revoked sessions). This in-process bus delivers to local subscribers only.
+    - subscribe(topic, on_message, on_overflow): on_overflow() is called when messages
+      may have been missed, so the subscriber can reload its state from the database
+    - poll(): delivers messages published by other processes (no-op here)
+    """
+
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self.overflows = 0
+        self._subscribers = {}  # topic -> [on_message]
+        self._resyncs = []
+
+    def subscribe(self, topic: str, on_message, on_overflow=None):
+        self._subscribers.setdefault(topic, []).append(on_message)
+        if on_overflow is not None:
+            self._resyncs.append(on_overflow)
+
+    def _deliver(self, topic: str, message):
+        for on_message in self._subscribers.get(topic, ()):
+            on_message(message)
+
+    def publish(self, topic: str, message):
+        self.published += 1
+        self._deliver(topic, message)
+
+    def poll(self) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "overflows": self.overflows}
+
+
+class SharedInvalidationBus(_SharedFile, InvalidationBus):
+    """
+    🔹 Invalidation bus over a ring of fixed-size records in a file shared by every worker.
+    - publish(): appended under the file lock, delivered locally right away
+    - poll(): one 8-byte read when nothing is new; call it on the request path
+    - Messages are signed like SharedMemoryCache records; unsigned ones are never unpickled
+    - A process that falls more than `capacity` messages behind gets on_overflow()
+    - Starts at the current end: a new worker loads its state from the database anyway
+    """
+
+    def __init__(self, path: str, capacity: int = CACHE_BUS_CAPACITY, record_size: int = 256):
+        _SharedFile.__init__(self, path, _BUS_MAGIC, max(capacity, 1), record_size)
+        InvalidationBus.__init__(self)
+        self.capacity = self.slots
+        self.origin = uuid.uuid4().hex  # ✅ Skips this process's own messages when polling
+        self.position = self._counter(_GENERATION_OFFSET)
+
+    def publish(self, topic: str, message):
+        payload = pickle.dumps((self.origin, topic, message), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.record_size - _EVENT.size:
+            raise ValueError(f"❌ Invalidation message too large for topic {topic}")
+        with self._locked():
+            sequence = self._counter(_GENERATION_OFFSET) + 1
+            offset = self._offset(sequence % self.slots)
+            signature = self._sign(_SIGNED_EVENT.pack(sequence, len(payload)), payload)
+            _EVENT.pack_into(self._map, offset, sequence, len(payload), signature)
+            self._map[offset + _EVENT.size:offset + _EVENT.size + len(payload)] = payload
+            self._set_counter(_GENERATION_OFFSET, sequence)  # ✅ Published once the record is complete
+        super().publish(topic, message)
+
+    def poll(self) -> int:
+        """Delivers messages other processes published since the last poll; returns how many"""
+        if self._counter(_GENERATION_OFFSET) == self.position:
+            return 0
+        delivered = 0
+        with self._lock:
+            latest = self._counter(_GENERATION_OFFSET)
+            missed = latest - self.position > self.capacity
+            for sequence in range(max(self.position, latest - self.capacity) + 1, latest + 1):
+                offset = self._offset(sequence % self.slots)
+                stored_sequence, length, signature = _EVENT.unpack_from(self._map, offset)
+                payload = self._map[offset + _EVENT.size:offset + _EVENT.size + min(length, self.record_size - _EVENT.size)]
+                fields = _SIGNED_EVENT.pack(stored_sequence, length)
+                if stored_sequence != sequence or not hmac.compare_digest(self._sign(fields, payload), signature):
+                    missed = True  # ✅ Overwritten by publishers lapping this reader
+                    break
+                origin, topic, message = pickle.loads(payload)
+                if origin != self.origin:
+                    self._deliver(topic, message)
+                    delivered += 1
+            self.position = latest
+            self.received += delivered
+        if missed:
+            self.overflows += 1
+            for on_overflow in self._resyncs:
+                on_overflow()
+        return delivered
+
+# --------------------------------------------
+# 🔹 Backend Selection
+# --------------------------------------------
+
+def create_cache(name: str, maxsize: int, ttl: float, enabled: bool = True, record_size: int = 1024, **local_options):
+    """
+    🔹 Cache for `name` on the configured backend.
+    - local: TTLCache (local_options: max_bytes, sizeof, on_evict)
+    - shared: SharedMemoryCache in this deployment's private directory under CACHE_SHARED_DIR;
+      record_size bounds each pickled entry
+      and max_bytes, if given, caps the table at max_bytes // record_size slots
+    """
+    if CACHE_BACKEND == "shared":
+        if not enabled:
+            return TTLCache(maxsize=maxsize, ttl=ttl, enabled=False)
+        max_bytes = local_options.get("max_bytes")
+        slots = max(1, maxsize if max_bytes is None else min(maxsize, max_bytes // record_size))
+        # ✅ Layout in the file name: workers started with other sizes get their own table
+        path = shared_path(f"{name}-{slots}x{record_size}.cache")
+        return SharedMemoryCache(path, slots, ttl, record_size=record_size, on_evict=local_options.get("on_evict"))
+    if CACHE_BACKEND == "local":
+        return TTLCache(maxsize=maxsize, ttl=ttl, enabled=enabled, **local_options)
+    raise ValueError(f"❌ Unknown cache backend: {CACHE_BACKEND}")
+
+
+def create_invalidation_bus(name: str = "invalidations"):
+    if CACHE_BACKEND == "shared":
+        return SharedInvalidationBus(shared_path(f"{name}-{CACHE_BUS_CAPACITY}.bus"))
+    return InvalidationBus()
+
+
+# ✅ One bus per process; with the shared backend every worker on the host receives each message
+invalidation_bus = create_invalidation_bus()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func
+from sqlalchemy.future import select
+import database
+from models import DocumentChange
+from retrievers import CHANGE_ORIGIN, fetch_documents_by_ids, notify_document_changes
+
+logger = logging.getLogger(__name__)
+
+# ✅ Document Change Feed Settings
+DOCUMENT_FEED_ENABLED = os.getenv("DOCUMENT_FEED_ENABLED", "true").lower() in ("1", "true", "yes")
+DOCUMENT_FEED_POLL_SECONDS = float(os.getenv("DOCUMENT_FEED_POLL_SECONDS", "1.0"))  # Idle wait between polls
+DOCUMENT_FEED_BATCH_SIZE = int(os.getenv("DOCUMENT_FEED_BATCH_SIZE", "1000"))  # Log rows applied per poll
+DOCUMENT_FEED_GAP_SECONDS = float(os.getenv("DOCUMENT_FEED_GAP_SECONDS", "5.0"))  # Wait for a hole in the log ids
+DOCUMENT_FEED_RETENTION_HOURS = float(os.getenv("DOCUMENT_FEED_RETENTION_HOURS", "168"))  # Log rows kept
+DOCUMENT_FEED_RECHECK_SECONDS = float(os.getenv("DOCUMENT_FEED_RECHECK_SECONDS", "3600"))  # Re-query skipped ids this long
+DOCUMENT_FEED_MAX_SKIPPED = 10000  # Skipped ids remembered for re-checks
+
+
+class DocumentChangeFeed:
+    """
+    🔹 Tails `document_changes` and applies other processes' document writes in memory.
+    - Changes go through notify_document_changes, so every document listener
+      (BM25 / FAISS indexes, answer cache) gets the same deltas as a local commit
+    - Starts at the end of the log: indexes built later read the table itself
+    - Rows written by this process are skipped (already applied after its own commit)
+    - Log ids are assigned before commit, so a lower id can become visible after a
+      higher one; a hole is waited for up to `gap_timeout` before it is skipped
+      (rolled-back writers leave holes that never fill)
+    - Skipped ids are re-queried on every poll for `recheck_seconds`, so a writer slower
+      than gap_timeout (a large ingestion batch) is still applied once it commits
+    - lag_seconds: age of the oldest change not applied yet (0 when caught up)
+    """
+
+    def __init__(self, session_factory=None, poll_interval: float = DOCUMENT_FEED_POLL_SECONDS,
+                 batch_size: int = DOCUMENT_FEED_BATCH_SIZE, gap_timeout: float = DOCUMENT_FEED_GAP_SECONDS,
+                 retention_hours: float = DOCUMENT_FEED_RETENTION_HOURS,
+                 recheck_seconds: float = DOCUMENT_FEED_RECHECK_SECONDS):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.gap_timeout = gap_timeout
+        self.retention_hours = retention_hours
+        self.recheck_seconds = recheck_seconds
+        self.position = None  # Id of the last consumed log row
+        self.applied = 0
+        self.lag_seconds = 0.0
+        self.errors = 0
+        self.gaps_skipped = 0  # Ids given up on after gap_timeout
+        self.late_applied = 0  # Skipped ids that committed later and were applied on a re-check
+        self._skipped = {}  # log id -> monotonic time it was skipped
+        self._recheck_at = 0.0
+        self._gap_seen_at = None
+        self._pruned_at = 0.0
+        self._task = None
+
+    async def poll(self) -> int:
+        """Consumes one batch of log rows; returns how many were consumed"""
+        async with (self.session_factory or database.SessionLocal)() as db:
+            if self.position is None:
+                self.position = (await db.execute(select(func.max(DocumentChange.id)))).scalar() or 0
+                return 0
+
+            rows = (await db.execute(
+                select(DocumentChange.id, DocumentChange.document_id, DocumentChange.operation,
+                       DocumentChange.origin, DocumentChange.changed_at)
+                .where(DocumentChange.id > self.position)
+                .order_by(DocumentChange.id)
+                .limit(self.batch_size)
+            )).all()
+
+            consumed, expected = [], self.position + 1
+            for row in rows:
+                if row.id != expected:
+                    if not self._gap_expired():
+                        break  # ✅ An earlier writer may not have committed yet
+                    self._skip(range(expected, row.id))  # ✅ Given up on for now: re-checked later
+                    self._gap_seen_at = None
+                consumed.append(row)
+                expected = row.id + 1
+            else:
+                self._gap_seen_at = None
+
+            late = await self._recheck_skipped(db)
+            self._apply(await self._changes(db, late + consumed))
+
+            if consumed:
+                self.position = consumed[-1].id
+                self.applied += len(consumed)
+            self.late_applied += len(late)
+
+            # ✅ Lag: oldest visible row not applied yet (held back by a gap, or beyond this batch)
+            if len(consumed) < len(rows):
+                pending_since = rows[len(consumed)].changed_at
+            elif len(rows) == self.batch_size:
+                pending_since = (await db.execute(
+                    select(DocumentChange.changed_at).where(DocumentChange.id > self.position)
+                    .order_by(DocumentChange.id).limit(1)
+                )).scalar()
+            else:
+                pending_since = None
+            self.lag_seconds = max(0.0, (datetime.utcnow() - pending_since).total_seconds()) if pending_since else 0.0
+
+            if self.retention_hours and time.monotonic() - self._pruned_at > 3600:
+                self._pruned_at = time.monotonic()
+                horizon = datetime.utcnow() - timedelta(hours=self.retention_hours)
+                await db.execute(delete(DocumentChange).where(DocumentChange.changed_at < horizon))
+                await db.commit()
+            return len(consumed)
+
+    def _skip(self, ids):
+        ids = list(ids)
+        self.gaps_skipped += len(ids)
+        logger.warning("⚠️ Document change feed skipped a gap; re-checking it later",
+                       extra={"ids": ids[:20], "count": len(ids), "gap_timeout": self.gap_timeout})
+        now = time.monotonic()
+        for log_id in ids:
+            self._skipped[log_id] = now
+        while len(self._skipped) > DOCUMENT_FEED_MAX_SKIPPED:
+            self._skipped.pop(next(iter(self._skipped)))  # ✅ Oldest first (insertion order)
+
+    async def _recheck_skipped(self, db) -> list:
+        """Skipped ids that have committed since; ids older than recheck_seconds are dropped"""
+        if not self._skipped or time.monotonic() < self._recheck_at:
+            return []
+        self._recheck_at = time.monotonic() + self.gap_timeout  # ✅ At most one re-query per gap_timeout
+        horizon = time.monotonic() - self.recheck_seconds
+        for log_id in [log_id for log_id, skipped_at in self._skipped.items() if skipped_at < horizon]:
+            del self._skipped[log_id]
+        if not self._skipped:
+            return []
+        rows = (await db.execute(
+            select(DocumentChange.id, DocumentChange.document_id, DocumentChange.operation,
+                   DocumentChange.origin, DocumentChange.changed_at)
+            .where(DocumentChange.id.in_(list(self._skipped)))
+            .order_by(DocumentChange.id)
+        )).all()
+        for row in rows:
+            del self._skipped[row.id]
+        if rows:
+            logger.info("✅ Document change feed applied late commits", extra={"ids": [row.id for row in rows][:20], "count": len(rows)})
+        return rows
+
+    @staticmethod
+    async def _changes(db, rows) -> tuple:
+        """(upserts {id: content}, deleted ids) from log rows of other processes, last operation per document"""
+        changes = {}  # document id -> last operation (rows are in log order)
+        for row in sorted(rows, key=lambda row: row.id):
+            if row.origin != CHANGE_ORIGIN:
+                changes[row.document_id] = row.operation
+        if not changes:
+            return {}, set()
+        upserted = [doc_id for doc_id, operation in changes.items() if operation == "upsert"]
+        rows_by_id = await fetch_documents_by_ids(db, upserted)
+        upserts = {doc_id: rows_by_id[doc_id]["content"] for doc_id in upserted if doc_id in rows_by_id}
+        return upserts, set(changes) - set(upserts)  # ✅ Gone since: a delete
+
+    @staticmethod
+    def _apply(changes: tuple):
+        upserts, deleted_ids = changes
+        if upserts or deleted_ids:
+            notify_document_changes(upserts, deleted_ids)
+
+    def _gap_expired(self) -> bool:
+        if self._gap_seen_at is None:
+            self._gap_seen_at = time.monotonic()
+        return time.monotonic() - self._gap_seen_at >= self.gap_timeout
+
+    async def run(self):
+        """Polls until cancelled; a full batch is followed by the next poll straight away"""
+        failures = 0
+        while True:
+            try:
+                consumed = await self.poll()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                failures += 1
+                consumed = 0
+                logger.warning("⚠️ Document change feed poll failed", extra={"error": repr(e)})
+            if consumed < self.batch_size:
+                await asyncio.sleep(min(self.poll_interval * 2 ** min(failures, 5), 30.0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"position": self.position, "applied": self.applied, "lag_seconds": self.lag_seconds, "errors": self.errors,
+                "gaps_skipped": self.gaps_skipped, "late_applied": self.late_applied, "rechecking": len(self._skipped)}
+
+
+# ✅ One consumer per worker process, started by the application lifespan
+document_feed = DocumentChangeFeed()
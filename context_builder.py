@@ -0,0 +1,163 @@
+import math
+import os
+import re
+
+# ✅ Context Assembly Settings
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))  # Max tokens of context per prompt
+RAG_CONTEXT_DEDUP_THRESHOLD = float(os.getenv("RAG_CONTEXT_DEDUP_THRESHOLD", "0.8"))  # Shingle Jaccard for near-duplicates
+RAG_CONTEXT_TRIM_SENTENCES = os.getenv("RAG_CONTEXT_TRIM_SENTENCES", "false").lower() in ("1", "true", "yes")
+RAG_CONTEXT_MIN_PASSAGE_TOKENS = 16  # Don't bother squeezing in passage fragments smaller than this
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+# ✅ Optional exact tokenizer (tiktoken); a fast regex estimate is used when it is not installed
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+_encoding_loaded = False
+
+
+def get_encoding():
+    """
+    🔹 The tiktoken encoding, loaded on first use (not at import: it may be downloaded).
+    - None when tiktoken is missing or the encoding can't be fetched (offline); not retried
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4o vocabulary
+            except Exception:
+                _encoding = None
+    return _encoding
+
+
+def count_tokens(text_value: str) -> int:
+    """Prompt tokens for text (exact with tiktoken, otherwise ~4 characters per word piece)"""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text_value, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text_value))
+
+
+def truncate_to_tokens(text_value: str, max_tokens: int) -> str:
+    """Cuts text to at most max_tokens, on a word boundary"""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text_value, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text_value
+        return encoding.decode(tokens[:max_tokens]).rsplit(" ", 1)[0]
+
+    kept, used = [], 0
+    for word in text_value.split():
+        cost = count_tokens(word)
+        if used + cost > max_tokens:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept)
+
+
+def split_sentences(text_value: str) -> list:
+    return [sentence for sentence in _SENTENCE_END.split(text_value.strip()) if sentence]
+
+
+def _shingles(text_value: str, size: int = 3) -> set:
+    words = _WORD.findall(text_value.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def is_near_duplicate(shingles: set, kept: list, threshold: float) -> bool:
+    for other in kept:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= threshold:
+            return True
+    return False
+
+
+def trim_to_relevant_sentences(text_value: str, query: str, max_tokens: int) -> str:
+    """
+    🔹 Keeps the sentences sharing the most words with the query.
+    - Sentences without any query word are dropped (unless none match)
+    - Selected sentences stay in their original order
+    - Stops once max_tokens would be exceeded
+    """
+    sentences = split_sentences(text_value)
+    query_words = set(_WORD.findall(query.lower()))
+    overlap = [len(query_words & set(_WORD.findall(sentence.lower()))) for sentence in sentences]
+    ranked = sorted(range(len(sentences)), key=lambda i: (-overlap[i], i))
+    if any(overlap):
+        ranked = [i for i in ranked if overlap[i]]  # ✅ Only sentences that mention the query
+
+    chosen, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(sentences[i])
+        if used + cost <= max_tokens:
+            chosen.add(i)
+            used += cost
+    if not chosen:
+        return truncate_to_tokens(sentences[ranked[0]], max_tokens) if sentences else ""
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def assemble_context(documents, query: str, token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+                     dedup_threshold: float = RAG_CONTEXT_DEDUP_THRESHOLD,
+                     trim_sentences: bool = RAG_CONTEXT_TRIM_SENTENCES) -> dict:
+    """
+    🔹 Packs retrieved chunks into a token budget.
+    - Ranks passages by retrieval score (best first)
+    - Drops near-duplicate passages (word-shingle Jaccard >= dedup_threshold)
+    - Optionally trims each passage to its most query-relevant sentences
+    - Passages that don't fit are trimmed/truncated into the remaining budget or skipped
+    - Returns {"context", "passages", "context_tokens", "dropped_duplicates", "dropped_over_budget"}
+    """
+    ranked = sorted(documents, key=lambda doc: doc.get("score") or 0.0, reverse=True)
+    passages, kept_shingles, parts = [], [], []
+    used = 0
+    duplicates = over_budget = 0
+    separator_cost = count_tokens("\n")
+
+    for doc in ranked:
+        shingles = _shingles(doc["content"])
+        if is_near_duplicate(shingles, kept_shingles, dedup_threshold):
+            duplicates += 1
+            continue
+
+        remaining = token_budget - used - (separator_cost if parts else 0)
+        content = doc["content"]
+        if trim_sentences:
+            content = trim_to_relevant_sentences(content, query, remaining)
+        cost = count_tokens(content)
+        if cost > remaining:
+            if remaining < RAG_CONTEXT_MIN_PASSAGE_TOKENS:
+                over_budget += 1
+                continue
+            content = truncate_to_tokens(content, remaining)
+            cost = count_tokens(content)
+        if not content:
+            over_budget += 1
+            continue
+
+        kept_shingles.append(shingles)
+        passages.append({**doc, "content": content})
+        parts.append(content)
+        used += cost + (separator_cost if len(parts) > 1 else 0)
+
+    return {
+        "context": "\n".join(parts),
+        "passages": passages,
+        "context_tokens": used,
+        "dropped_duplicates": duplicates,
+        "dropped_over_budget": over_budget,
+    }
@@ -1,23 +1,83 @@
+import os
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 # ✅ SQLAlchemy Base Model (Used for ORM Mappings)
 Base = declarative_base()
 
-# ✅ Database Connection URL (Ensure correct credentials & DB exists)
-DATABASE_URL = "mysql+asyncmy://root@localhost/fastapi_db"
+# ✅ Database Connection URLs (Ensure correct credentials & DB exists)
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+asyncmy://root@localhost/fastapi_db")
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")  # Optional read replica; reads use the primary when unset
 
-# ✅ Create an Async Engine (Asynchronous MySQL Connection)
-engine = create_async_engine(DATABASE_URL, echo=True)
+# ✅ Connection Pool Settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # Persistent connections per engine
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # Extra connections under burst load
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))  # Wait for a free connection
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))  # Below MySQL's wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")  # Log every SQL statement (debug only)
 
-# ✅ Configure Async Session Maker (For DB Transactions)
+
+def engine_options(url: str) -> dict:
+    """
+    🔹 create_async_engine keyword arguments from the environment.
+    - Pool sizing is skipped for in-memory SQLite (single shared connection)
+    """
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE_SECONDS}
+    if not (url.startswith("sqlite") and ":memory:" in url):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT_SECONDS)
+    return options
+
+
+class ReadOnlySession(Session):
+    """Session class for replica reads; any flush is rejected"""
+
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_replica_writes(session, flush_context, instances):
+    raise RuntimeError("Attempted to write through a read-only (replica) session")
+
+
+# ✅ Create Async Engines (primary for writes, replica for reads)
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+replica_engine = (
+    create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    if DATABASE_REPLICA_URL else engine
+)
+
+# ✅ Configure Async Session Makers (For DB Transactions)
 SessionLocal = sessionmaker(
     bind=engine,
     expire_on_commit=False,  # Prevent auto-expiring objects after commit
     class_=AsyncSession  # Ensure async session is used correctly
 )
+ReadSessionLocal = sessionmaker(
+    bind=replica_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=ReadOnlySession,
+)
+
+def has_replica() -> bool:
+    return ReadSessionLocal.kw["bind"] is not SessionLocal.kw["bind"]
+
+async def warm_up():
+    """Opens (and pings) a pooled connection on the primary and the replica (startup warm-up)"""
+    for bound_engine in dict.fromkeys((SessionLocal.kw["bind"], ReadSessionLocal.kw["bind"])):
+        async with bound_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
 
 # ✅ Dependency to Get Database Session (For FastAPI Dependency Injection)
 async def get_db():
+    """Read-write session on the primary"""
     async with SessionLocal() as session:
         yield session
+
+async def get_read_db():
+    """
+    🔹 Read-only session on the replica (or the primary when no replica is configured).
+    - Replicas may lag: read-your-own-writes paths should use get_db
+    """
+    async with ReadSessionLocal() as session:
+        yield session
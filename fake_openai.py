@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ✅ Local stand-in for the OpenAI Chat Completions API (tests & benchmarks)
+# Run with: uvicorn fake_openai:app --port 8001  and set OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+FAKE_OPENAI_LATENCY_SECONDS = float(os.getenv("FAKE_OPENAI_LATENCY_SECONDS", "0.0"))  # Delay before first token
+FAKE_OPENAI_TOKEN_DELAY_SECONDS = float(os.getenv("FAKE_OPENAI_TOKEN_DELAY_SECONDS", "0.0"))  # Delay between tokens
+FAKE_OPENAI_ANSWER = os.getenv("FAKE_OPENAI_ANSWER", "This is a fake answer generated from the provided context.")
+FAKE_OPENAI_RPM = int(os.getenv("FAKE_OPENAI_RPM", "10000"))  # Advertised in x-ratelimit-* headers
+FAKE_OPENAI_TPM = int(os.getenv("FAKE_OPENAI_TPM", "2000000"))
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def create_fake_openai_app(
+    latency: float = FAKE_OPENAI_LATENCY_SECONDS,
+    token_delay: float = FAKE_OPENAI_TOKEN_DELAY_SECONDS,
+    answer: str = FAKE_OPENAI_ANSWER,
+    rpm: int = FAKE_OPENAI_RPM,
+    tpm: int = FAKE_OPENAI_TPM,
+) -> FastAPI:
+    """
+    🔹 Builds a fake OpenAI server.
+    - latency: Seconds before the first byte of the completion
+    - token_delay: Seconds between streamed tokens (also added per token when not streaming)
+    - answer: Completion text, split into whitespace tokens
+    - rpm / tpm: Limits reported in x-ratelimit-* headers (remaining counts down per minute window)
+    - fake_app.state.fail_next: The next N calls get a 429 with retry-after-ms (for scheduler tests)
+    """
+    fake_app = FastAPI(title="Fake OpenAI")
+    fake_app.state.requests = 0
+    fake_app.state.fail_next = 0
+    window = {"started": time.monotonic(), "requests": 0, "tokens": 0}
+
+    def _rate_limit_headers(tokens_used: int) -> dict:
+        if time.monotonic() - window["started"] >= 60:
+            window.update(started=time.monotonic(), requests=0, tokens=0)
+        window["requests"] += 1
+        window["tokens"] += tokens_used
+        reset = max(0.0, 60 - (time.monotonic() - window["started"]))
+        return {
+            "x-ratelimit-limit-requests": str(rpm),
+            "x-ratelimit-remaining-requests": str(max(0, rpm - window["requests"])),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            "x-ratelimit-limit-tokens": str(tpm),
+            "x-ratelimit-remaining-tokens": str(max(0, tpm - window["tokens"])),
+            "x-ratelimit-reset-tokens": f"{reset:.3f}s",
+        }
+
+    @fake_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        fake_app.state.requests += 1
+        model = body.get("model", "gpt-4o")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tokens = [f"{word} " if i < len(answer.split()) - 1 else word for i, word in enumerate(answer.split())]
+
+        if fake_app.state.fail_next > 0:
+            fake_app.state.fail_next -= 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after-ms": "10"},
+            )
+        headers = _rate_limit_headers(len(json.dumps(body.get("messages", []))) // 4 + len(tokens))
+
+        if body.get("stream"):
+            async def _events():
+                await asyncio.sleep(latency)
+                yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+                for token in tokens:
+                    yield _chunk(completion_id, model, {"content": token})
+                    await asyncio.sleep(token_delay)
+                yield _chunk(completion_id, model, {}, finish_reason="stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(_events(), media_type="text/event-stream", headers=headers)
+
+        await asyncio.sleep(latency + token_delay * len(tokens))
+        return JSONResponse(headers=headers, content={
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        })
+
+    return fake_app
+
+
+app = create_fake_openai_app()
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from metrics import span
+
+# ✅ Hashing Executor Settings (bcrypt is ~0.5s of CPU per call, keep it off the event loop)
+HASHER_BACKEND = os.getenv("HASHER_BACKEND", "thread")  # "thread" or "process"
+HASHER_MAX_WORKERS = int(os.getenv("HASHER_MAX_WORKERS", str(os.cpu_count() or 1)))
+HASHER_MAX_QUEUE = int(os.getenv("HASHER_MAX_QUEUE", "64"))  # Waiting jobs allowed beyond busy workers
+HASHER_RETRY_AFTER_SECONDS = int(os.getenv("HASHER_RETRY_AFTER_SECONDS", "1"))
+
+# ✅ Module-level context so worker processes can rebuild it after import
+_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash_password(password: str) -> str:
+    return _pwd_context.hash(password)
+
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    return _pwd_context.verify(password, hashed_password)
+
+
+def _timed(fn, *args):
+    """Runs fn inside the worker and reports its pure CPU/wall time"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class HashingExecutor:
+    """
+    🔹 Dedicated pool for bcrypt work with a bounded queue.
+    - backend: "thread" (bcrypt releases the GIL) or "process"
+    - max_workers: Concurrent hashes
+    - max_queue: Jobs allowed to wait once every worker is busy
+    - Raises HTTPException(503) with Retry-After when saturated
+    """
+
+    def __init__(self, backend: str = "thread", max_workers: int = 1, max_queue: int = 64, retry_after: int = 1):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"❌ Unknown hashing backend: {backend}")
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._executor = None
+
+        # ✅ Metrics
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.backend == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a free worker"""
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on the pool, applying backpressure when the queue is full"""
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication service is busy, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, elapsed = await loop.run_in_executor(self._get_executor(), _timed, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.hash_seconds_total += elapsed
+        self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+        self.wait_seconds_total += max(0.0, time.perf_counter() - started - elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        with span("password_hash"):
+            return await self.run(_hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        with span("password_verify"):
+            return await self.run(_verify_password, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """Returns queue depth & hash latency metrics"""
+        return {
+            "backend": self.backend,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "hash_seconds_total": self.hash_seconds_total,
+            "hash_seconds_max": self.hash_seconds_max,
+            "hash_seconds_avg": self.hash_seconds_total / self.completed if self.completed else 0.0,
+            "wait_seconds_total": self.wait_seconds_total,
+        }
+
+
+# ✅ Shared executor used by the auth routes
+password_hasher = HashingExecutor(
+    backend=HASHER_BACKEND,
+    max_workers=HASHER_MAX_WORKERS,
+    max_queue=HASHER_MAX_QUEUE,
+    retry_after=HASHER_RETRY_AFTER_SECONDS,
+)
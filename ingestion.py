@@ -0,0 +1,185 @@
+import codecs
+import hashlib
+import json
+import os
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text, bindparam
+from models import Document
+from retrievers import log_document_changes, notify_document_changes
+
+# ✅ Ingestion Settings
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "256"))  # Max tokens (words) per chunk
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "32"))  # Tokens shared by consecutive chunks
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))  # Chunks per executemany / transaction
+
+
+def content_hash(content: str) -> str:
+    """SHA-1 of whitespace/case-normalized content (dedup key)"""
+    return hashlib.sha1(" ".join(content.lower().split()).encode("utf-8")).hexdigest()
+
+
+class Chunker:
+    """
+    🔹 Incremental splitter into overlapping, token-bounded chunks.
+    - feed() accepts text in arbitrary pieces (e.g. lines) and returns completed chunks
+    - flush() returns the trailing partial chunk
+    - Only `max_tokens` words are ever buffered, so inputs can be arbitrarily large
+    """
+
+    def __init__(self, max_tokens: int = INGEST_CHUNK_TOKENS, overlap: int = INGEST_CHUNK_OVERLAP):
+        if not 0 <= overlap < max_tokens:
+            raise ValueError("❌ Chunk overlap must be smaller than the chunk size")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self._window = []
+        self._fresh = 0  # Words not yet emitted in any chunk
+
+    def feed(self, piece: str) -> list:
+        chunks = []
+        for word in piece.split():
+            self._window.append(word)
+            self._fresh += 1
+            if len(self._window) == self.max_tokens:
+                chunks.append(" ".join(self._window))
+                self._window = self._window[self.max_tokens - self.overlap:] if self.overlap else []
+                self._fresh = 0
+        return chunks
+
+    def flush(self) -> list:
+        chunks = [" ".join(self._window)] if self._fresh else []
+        self._window, self._fresh = [], 0
+        return chunks
+
+
+async def iter_stream_lines(byte_stream):
+    """Decodes an async byte stream into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    async for data in byte_stream:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _aiter(lines):
+    """Lets sync line sources (open files) share the async ingestion path"""
+    if hasattr(lines, "__aiter__"):
+        async for line in lines:
+            yield line
+    else:
+        for line in lines:
+            yield line
+
+
+class DocumentIngestor:
+    """
+    🔹 Streams documents into `documents` as deduplicated chunks.
+    - Chunks are buffered up to `batch_size`, checked against existing
+      content hashes in one query, then bulk-inserted with executemany
+    - Each batch commits on its own, so memory and lock time stay bounded
+    - Retrieval indexes are updated incrementally after every batch
+    """
+
+    def __init__(self, db: AsyncSession, chunk_tokens: int = INGEST_CHUNK_TOKENS,
+                 overlap: int = INGEST_CHUNK_OVERLAP, batch_size: int = INGEST_BATCH_SIZE):
+        self.db = db
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self._pending = {}  # content hash -> row
+        self.stats = {"documents": 0, "chunks": 0, "inserted": 0, "duplicates": 0}
+
+    async def add_text(self, title: str, lines):
+        """Chunks one document whose text arrives as lines (sync or async iterable)"""
+        chunker = Chunker(self.chunk_tokens, self.overlap)
+        async for line in _aiter(lines):
+            for chunk in chunker.feed(line):
+                await self._add_chunk(title, chunk)
+        for chunk in chunker.flush():
+            await self._add_chunk(title, chunk)
+        self.stats["documents"] += 1
+
+    async def add_ndjson(self, lines):
+        """Ingests one {"title": ..., "content": ...} document per line"""
+        line_number = 0
+        async for line in _aiter(lines):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                title, content = record["title"], record["content"]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPException(status_code=400, detail=f"Invalid NDJSON document on line {line_number}")
+            await self.add_text(title, [content])
+
+    async def _add_chunk(self, title: str, content: str):
+        self.stats["chunks"] += 1
+        digest = content_hash(content)
+        if digest in self._pending:
+            self.stats["duplicates"] += 1
+            return
+        self._pending[digest] = {"title": title[:255], "content": content, "content_hash": digest}
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Writes the buffered batch (skipping chunks already stored) and commits"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+
+        lookup = text("SELECT id, content_hash FROM documents WHERE content_hash IN :hashes").bindparams(
+            bindparam("hashes", expanding=True)
+        )
+        existing = {row[1] for row in (await self.db.execute(lookup, {"hashes": list(batch)})).all()}
+        rows = [row for digest, row in batch.items() if digest not in existing]
+        self.stats["duplicates"] += len(batch) - len(rows)
+        if not rows:
+            return
+
+        try:
+            await self.db.execute(Document.__table__.insert(), rows)  # ✅ executemany
+            inserted = (await self.db.execute(lookup, {"hashes": [row["content_hash"] for row in rows]})).all()
+            await log_document_changes(self.db, {doc_id: 1 for doc_id, _ in inserted})  # ✅ Same transaction
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        self.stats["inserted"] += len(rows)
+
+        contents = {row["content_hash"]: row["content"] for row in rows}
+        notify_document_changes({doc_id: contents[digest] for doc_id, digest in inserted})
+
+
+if __name__ == "__main__":
+    # ✅ CLI: python ingestion.py notes.txt corpus.ndjson [--chunk-tokens 256 --overlap 32]
+    import argparse
+    import asyncio
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Ingest text or NDJSON files into the documents table")
+    parser.add_argument("paths", nargs="+", help="*.ndjson files hold one {title, content} per line; others are one document each")
+    parser.add_argument("--chunk-tokens", type=int, default=INGEST_CHUNK_TOKENS)
+    parser.add_argument("--overlap", type=int, default=INGEST_CHUNK_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def _ingest():
+        async with SessionLocal() as session:
+            ingestor = DocumentIngestor(session, args.chunk_tokens, args.overlap, args.batch_size)
+            for path in args.paths:
+                with open(path, encoding="utf-8", errors="replace") as handle:
+                    if path.endswith((".ndjson", ".jsonl")):
+                        await ingestor.add_ndjson(handle)
+                    else:
+                        await ingestor.add_text(os.path.basename(path), handle)
+            await ingestor.flush()
+        print(f"✅ Ingestion complete: {ingestor.stats}")
+
+    asyncio.run(_ingest())
@@ -0,0 +1,174 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# ✅ Logging Settings
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")  # Per-module overrides, e.g. "auth=DEBUG,httpx=WARNING"
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))  # Share of DEBUG records kept
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Rotate app.log at this size
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records buffered for the writer thread
+
+# ✅ Chatty third-party loggers stay quiet unless LOG_LEVELS says otherwise
+DEFAULT_LEVELS = {
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+    "openai": "WARNING",
+    "aiosqlite": "WARNING",
+    "asyncio": "WARNING",
+    "sqlalchemy.engine": "WARNING",
+    "multipart": "WARNING",
+}
+
+# ✅ Attributes every LogRecord has; anything else came in through `extra=` and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sample_rate"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, location and any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """
+    🔹 Keeps every INFO+ record and a random share of DEBUG records.
+    - rate: Default share kept (0.0 - 1.0)
+    - A record may carry its own rate: logger.debug("...", extra={"sample_rate": 0.01})
+    """
+
+    def __init__(self, rate: float = LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, "sample_rate", self.rate)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    🔹 Hands records to the writer thread without ever waiting.
+    - The message is rendered in the caller (args may be mutable), JSON/file I/O happen in the listener
+    - When the queue is full the record is dropped and counted
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> dict:
+    """"auth=DEBUG,httpx=WARNING" -> {"auth": "DEBUG", "httpx": "WARNING"}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def build_pipeline(path: str = LOG_FILE, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                   queue_size: int = LOG_QUEUE_SIZE, sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+    """Returns (queue handler for loggers, listener writing JSON lines to a rotating file)"""
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+    file_handler.setFormatter(JsonFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(DebugSampler(sample_rate))
+    listener = QueueListener(handler.queue, file_handler, respect_handler_level=True)
+    return handler, listener
+
+
+_handler = None
+_listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS):
+    """
+    🔹 Installs the queue-backed JSON pipeline on the root logger (idempotent).
+    - Request code only enqueues; a background thread formats, writes and rotates
+    - Per-module levels: DEFAULT_LEVELS overridden by LOG_LEVELS
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+
+    _handler, _listener = build_pipeline()
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    for name, module_level in {**DEFAULT_LEVELS, **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _handler
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    _handler = _listener = None
+
+
+def stats() -> dict:
+    if _handler is None:
+        return {"enabled": False}
+    sampler = next(f for f in _handler.filters if isinstance(f, DebugSampler))
+    return {
+        "enabled": True,
+        "queued": _handler.queue.qsize(),
+        "dropped": _handler.dropped,
+        "sampled_out": sampler.sampled_out,
+    }
@@ -1,24 +1,113 @@
-from fastapi import FastAPI, Depends, HTTPException
+import time
+
+# ✅ Startup clock: module imports + lifespan warm-up are measured against STARTUP_BUDGET_SECONDS
+STARTUP_STARTED = time.perf_counter()
+
+import logging
+import os
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from logging_config import setup_logging
+
+# ✅ Load .env before any module reads its settings
+load_dotenv()
+
+# ✅ Configure Logging first (JSON lines to a rotating app.log, written off the event loop),
+# so startup messages from the modules imported below are captured too
+setup_logging()
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
+import database
+from database import get_db, get_read_db
 from models import User, Profile
-from auth import get_current_user
-from oso_rbac import authorize
+from auth import get_current_user, principal_cache, revoked_sessions
+from cache import invalidation_bus
+from oso_rbac import authorize, authorized_filter, decision_cache, ensure_policies, is_allowed
+from profile_store import (
+    PROFILE_CACHE_CONTROL, delete_profile_if_match, etag_matches, get_or_create_profile, invalidate_profile,
+    profile_cache, profile_etag, read_profile, update_profile_bio_if_match, upsert_profile_bio,
+)
 from sqlalchemy.future import select
+import logging_config
+import rag_pipeline
+from hashing import password_hasher
+from metrics import MetricsMiddleware, registry
 from rag_pipeline import router as rag_router
+from ingestion import iter_stream_lines
+from user_import import UserImporter, bulk_hasher
+from change_feed import DOCUMENT_FEED_ENABLED, document_feed
 from auth import router as auth_router
 from pydantic import BaseModel
-import logging
+from schemas import ProfileBatch, ProfileOut, ProfilePage, ProfileUpdated, parse_fields, partial_response
 
-# ✅ Configure Logging
-logging.basicConfig(
-    filename="app.log",  # ✅ Log file for tracking errors & requests
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.DEBUG
-)
+logger = logging.getLogger(__name__)
+
+# ✅ Profile Listing Settings
+PROFILES_PAGE_SIZE = int(os.getenv("PROFILES_PAGE_SIZE", "50"))
+PROFILES_PAGE_MAX = int(os.getenv("PROFILES_PAGE_MAX", "500"))
+PROFILES_BATCH_MAX = int(os.getenv("PROFILES_BATCH_MAX", "1000"))
+
+# ✅ Startup Settings
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() in ("1", "true", "yes")  # Pre-load before serving
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))  # Warn when startup takes longer
+
+startup_stats = {"import_seconds": time.perf_counter() - STARTUP_STARTED, "warmup_seconds": 0.0, "total_seconds": None}
+
+async def warm_up() -> dict:
+    """
+    🔹 Optional warm-up run by the lifespan before the first request (STARTUP_WARMUP=true).
+    - Loads the Oso policies, opens DB pool connections, creates the OpenAI client and retrieval indexes
+    - A failing step is logged and skipped (it is retried lazily on first use)
+    - Returns seconds spent per step
+    """
+    steps = {}
+    for name, step in (("policies", ensure_policies), ("database", database.warm_up), ("ai", rag_pipeline.warm_up)):
+        started = time.perf_counter()
+        try:
+            result = step()
+            if result is not None:
+                await result
+        except Exception as e:
+            logger.warning("⚠️ Warm-up step failed", extra={"step": name, "error": str(e)})
+        steps[name] = round(time.perf_counter() - started, 4)
+    return steps
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    🔹 Startup / shutdown.
+    - Nothing heavy happens at import: the AI client, retrievers and policy engine are built on first use
+    - Startup time (imports + warm-up) is logged and checked against STARTUP_BUDGET_SECONDS
+    """
+    if STARTUP_WARMUP:
+        warmup_started = time.perf_counter()
+        startup_stats["steps"] = await warm_up()
+        startup_stats["warmup_seconds"] = time.perf_counter() - warmup_started
+    startup_stats["total_seconds"] = startup_stats["import_seconds"] + startup_stats["warmup_seconds"]
+
+    if startup_stats["total_seconds"] > STARTUP_BUDGET_SECONDS:
+        logger.warning("⚠️ Startup exceeded its time budget", extra={**startup_stats, "budget_seconds": STARTUP_BUDGET_SECONDS})
+    else:
+        logger.info("✅ Application started", extra=startup_stats)
+
+    # ✅ Apply document writes made by other workers to this worker's indexes & answer cache
+    if DOCUMENT_FEED_ENABLED:
+        document_feed.start()
+
+    yield
+
+    await document_feed.stop()
+    await rag_pipeline.close_openai_client()
+    password_hasher.shutdown()
+    bulk_hasher.shutdown()
 
 # ✅ Initialize FastAPI Application
-app = FastAPI(title="FastAPI Microservice with AI & RBAC")
+app = FastAPI(title="FastAPI Microservice with AI & RBAC", lifespan=lifespan)
+
+# ✅ Request count/latency per route (+ optional Server-Timing header)
+app.add_middleware(MetricsMiddleware)
 
 # ✅ Include Authentication & AI Query Routes
 app.include_router(auth_router, prefix="")
@@ -30,91 +119,118 @@ async def root():
     return {"message": "FastAPI Microservice is running"}
 
 # ✅ User Profile Routes
-@app.get("/profile")
+def conditional_profile(profile: dict, response: Response, if_none_match: str = None, include: set = None):
+    """Returns the profile (only the `include` fields, if given) with its ETag, or an empty 304 when the client's copy is current"""
+    etag = profile_etag(profile)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = PROFILE_CACHE_CONTROL
+    if include is not None:
+        return partial_response(ProfileOut(**profile), include, response)
+    return profile
+
+@app.get("/profile", response_model=ProfileOut)
 async def get_profile(
+    response: Response,
     user: User = Depends(get_current_user), 
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    if_none_match: str = Header(None),
+    fields: str = None,
 ):
     """
     🔹 Fetch user profile (protected by JWT authentication).
     - If the profile does not exist, it is created automatically.
+    - Sends a strong ETag; If-None-Match revalidations are answered with 304 from the profile cache
+    - ?fields=id,bio returns only those fields
     """
     try:
-        result = await db.execute(select(Profile).where(Profile.user_id == user.id))
-        profile = result.scalars().first()
-
-        # ✅ Create profile if missing
+        include = parse_fields(fields, ProfileOut)
+        profile = profile_cache.get(("primary", user.id))
         if profile is None:
-            profile = Profile(user_id=user.id, bio="This is a new profile.")
-            db.add(profile)
-            await db.commit()
-            await db.refresh(profile)
+            # ✅ Single SELECT when the profile exists; atomic upsert (no duplicate-key race) when it doesn't
+            profile = await get_or_create_profile(db, user.id, default_bio="This is a new profile.")
+            profile_cache.set(("primary", user.id), profile)
 
         # ✅ Authorization check after ensuring profile exists
-        authorize(user, "read", profile)
+        authorize(user, "read", Profile(**profile))
 
-        return profile
+        return conditional_profile(profile, response, if_none_match, include)
+
+    except HTTPException:
+        raise
 
     except Exception as e:
-        logging.error(f"❌ Profile Retrieval Error: {e}")  # ✅ Logging error
+        logger.error(f"❌ Profile Retrieval Error: {e}")  # ✅ Logging error
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 # ✅ Update User Profile
 class ProfileUpdate(BaseModel):
     bio: str  # ✅ Ensure request body contains "bio"
 
-@app.put("/profile")
+@app.put("/profile", response_model=ProfileUpdated)
 async def update_profile(
     request: ProfileUpdate, 
+    response: Response,
     user: User = Depends(get_current_user), 
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    if_match: str = Header(None),
 ):
     """
     🔹 Update the bio of the authenticated user's profile.
     - If profile does not exist, it is created automatically.
+    - If-Match: only update while the profile still has that ETag (412 otherwise)
     """
     try:
-        result = await db.execute(select(Profile).where(Profile.user_id == user.id))
-        profile = result.scalars().first()
-
-        # ✅ Create profile if it doesn't exist
-        if profile is None:
-            profile = Profile(user_id=user.id, bio=request.bio)
-            db.add(profile)
+        if if_match is None:
+            # ✅ One INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE (create or update)
+            profile = await upsert_profile_bio(db, user.id, request.bio)
         else:
-            profile.bio = request.bio  # ✅ Update existing bio
+            # ✅ Optimistic concurrency: conditional UPDATE on the version the client read
+            profile = await update_profile_bio_if_match(db, user.id, request.bio, if_match)
+            if profile is None:
+                raise HTTPException(status_code=412, detail="Profile has changed; fetch it again and retry")
+        invalidate_profile(user.id)
 
-        await db.commit()
-        await db.refresh(profile)  # ✅ Ensure update is saved
+        response.headers["ETag"] = profile_etag(profile)
+        return {"message": "Profile updated successfully", "bio": profile["bio"]}
 
-        return {"message": "Profile updated successfully", "bio": profile.bio}
+    except HTTPException:
+        raise
 
     except Exception as e:
         await db.rollback()  # ✅ Rollback transaction on failure
-        logging.error(f"❌ Profile Update Error: {e}")
+        logger.error(f"❌ Profile Update Error: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 # ✅ Delete User Profile
 @app.delete("/profile")
-async def delete_profile(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def delete_profile(
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    if_match: str = Header(None),
+):
     """
     🔹 Delete the authenticated user's profile.
     - Ensures only profile owners can delete their profiles.
+    - If-Match: only delete while the profile still has that ETag (412 otherwise)
     """
     try:
-        result = await db.execute(select(Profile).where(Profile.user_id == user.id))
-        profile = result.scalars().first()
+        deleted = await delete_profile_if_match(db, user.id, if_match)
+        invalidate_profile(user.id)
 
-        if profile is None:
+        if not deleted:
+            if if_match is not None:
+                raise HTTPException(status_code=412, detail="Profile has changed; fetch it again and retry")
             raise HTTPException(status_code=404, detail="Profile not found")
 
-        await db.delete(profile)
-        await db.commit()
-
         return {"message": "Profile deleted successfully"}
 
+    except HTTPException:
+        raise
+
     except Exception as e:
-        logging.error(f"❌ Profile Deletion Error: {e}")
+        logger.error(f"❌ Profile Deletion Error: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 # ✅ Admin-Only Route with RBAC
@@ -128,20 +244,97 @@ async def get_admin_data(user: User = Depends(get_current_user)):
 
     return {"message": f"Welcome, {user.username}. You have admin access."}
 
+# ✅ Bulk User Import (Admin Only)
+@app.post("/admin/users/bulk")
+async def bulk_import_users(
+    request: Request,
+    fmt: str = Query(None, alias="format", pattern="^(ndjson|csv)$"),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    🔹 Streams NDJSON or CSV user rows (username, email, password) into `users`.
+    - Requires "manage" permission on "users" (admins).
+    - Format: ?format=, else Content-Type (text/csv or application/x-ndjson)
+    - Batched uniqueness checks, parallel bcrypt on a process pool, executemany per batch
+    - Returns a summary plus one result per row (created with id / duplicate / invalid)
+    """
+    authorize(user, "manage", "users")
+    fmt = fmt or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+
+    importer = UserImporter(db)
+    await importer.add_lines(iter_stream_lines(request.stream()), fmt)
+    await importer.flush()
+
+    logger.info("✅ Bulk user import", extra={"admin": user.username, "summary": importer.stats})
+    return importer.report()
+
+# ✅ Point-in-time gauges read at scrape time (no cost on the request path)
+def _cache_stats(field: str):
+    caches = {
+        "principal": principal_cache.stats(),
+        "authz_decision": decision_cache.stats(),
+        "answer": rag_pipeline.answer_cache.stats(),
+        "profile": profile_cache.stats(),
+    }
+    return {(name,): stats[field] for name, stats in caches.items()}
+
+registry.register_gauge("cache_entries", "Entries held per cache", lambda: _cache_stats("size"), ("cache",))
+registry.register_gauge("cache_hits", "Cache hits since start", lambda: _cache_stats("hits"), ("cache",))
+registry.register_gauge("cache_misses", "Cache misses since start", lambda: _cache_stats("misses"), ("cache",))
+registry.register_gauge("revoked_sessions", "Revoked sessions held in memory", lambda: len(revoked_sessions))
+registry.register_gauge("cache_invalidations", "Invalidation bus messages, by direction", lambda: {
+    ("published",): invalidation_bus.published, ("received",): invalidation_bus.received, ("overflows",): invalidation_bus.overflows,
+}, ("direction",))
+registry.register_gauge("password_hasher_in_flight", "bcrypt jobs running or queued", lambda: password_hasher.in_flight)
+registry.register_gauge("password_hasher_rejected", "bcrypt jobs rejected with 503", lambda: password_hasher.rejected)
+registry.register_gauge("ai_in_flight", "OpenAI calls holding a concurrency slot", lambda: rag_pipeline.ai_scheduler.in_flight)
+registry.register_gauge("ai_queued", "OpenAI calls waiting for a slot", lambda: rag_pipeline.ai_scheduler.slots.queued)
+registry.register_gauge("startup_seconds", "Time to become ready, by phase", lambda: {
+    (phase,): startup_stats[f"{phase}_seconds"] for phase in ("import", "warmup", "total")
+}, ("phase",))
+registry.register_gauge("document_feed_lag_seconds", "Age of the oldest document change not yet applied in this worker", lambda: document_feed.lag_seconds)
+registry.register_gauge("document_feed_applied", "Document change log rows consumed since start", lambda: document_feed.applied)
+registry.register_gauge("document_feed_gaps_skipped", "Change log ids skipped after DOCUMENT_FEED_GAP_SECONDS (re-checked later)", lambda: document_feed.gaps_skipped)
+registry.register_gauge("document_feed_late_applied", "Skipped change log ids applied after their writer committed", lambda: document_feed.late_applied)
+registry.register_gauge("log_records_dropped", "Log records dropped on a full queue", lambda: logging_config.stats().get("dropped"))
+
+# ✅ Prometheus Metrics (Admin Only)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(user: User = Depends(get_current_user)):
+    """
+    🔹 Prometheus text exposition of request, stage and cache metrics.
+    - Requires "manage" permission on "metrics" (admins).
+    - Stage histograms: jwt_decode, user_lookup, get_current_user, authorize, db,
+      retrieval, completion, completion_stream, password_hash, password_verify
+    """
+    authorize(user, "manage", "metrics")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # ✅ Fetch Any User's Profile (Admin or Profile Owner)
-@app.get("/profile/{user_id}")
+@app.get("/profile/{user_id}", response_model=ProfileOut)
 async def get_user_profile(
     user_id: int, 
+    response: Response,
     user: User = Depends(get_current_user), 
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db),
+    if_none_match: str = Header(None),
+    fields: str = None,
 ):
     """
     🔹 Fetch a user's profile (Only accessible by the profile owner or an admin).
     - Ensures security by restricting unauthorized access.
+    - Sends a strong ETag; If-None-Match revalidations are answered with 304 from the profile cache
+    - ?fields=id,bio returns only those fields
     """
     try:
-        result = await db.execute(select(Profile).where(Profile.user_id == user_id))
-        profile = result.scalars().first()
+        include = parse_fields(fields, ProfileOut)
+        # ✅ Prefer a copy read from the primary; replica reads are cached under their own key
+        profile = profile_cache.get(("primary", user_id)) or profile_cache.get(("replica", user_id))
+        if profile is None:
+            profile = await read_profile(db, user_id)
+            if profile is not None:
+                profile_cache.set(("replica", user_id), profile)
 
         if profile is None:
             raise HTTPException(status_code=404, detail="Profile not found")
@@ -150,8 +343,106 @@ async def get_user_profile(
         if user.id != user_id and not user.is_admin:
             raise HTTPException(status_code=403, detail="Access denied")
 
-        return profile
+        return conditional_profile(profile, response, if_none_match, include)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"❌ Error Fetching User Profile: {e}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+def item_fields(include: set) -> dict:
+    """?fields= applied to every entry of a list response's "items" """
+    return {"items": {"__all__": include}}
+
+# ✅ List Readable Profiles (Keyset Pagination, RBAC in SQL)
+@app.get("/profiles", response_model=ProfilePage)
+async def list_profiles(
+    after: int = 0,
+    limit: int = Query(PROFILES_PAGE_SIZE, ge=1, le=PROFILES_PAGE_MAX),
+    fields: str = None,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    🔹 List the profiles the caller may read (admins: all, users: their own).
+    - Keyset pagination on Profile.id: pass next_after from the previous page as ?after=
+    - The "read" rule from policies.polar is applied as a SQL WHERE clause,
+      so only readable rows are fetched, in one query
+    - ?fields=id,bio trims every item to those fields
+    """
+    try:
+        include = parse_fields(fields, ProfileOut)
+        query = select(Profile).where(Profile.id > after).order_by(Profile.id).limit(limit + 1)
+        condition = authorized_filter(user, "read", Profile)
+        if condition is not None:
+            query = query.where(condition)
+
+        result = await db.execute(query)
+        profiles = result.scalars().all()
+        has_more = len(profiles) > limit
+        profiles = profiles[:limit]
+        next_after = profiles[-1].id if has_more else None
+
+        if condition is None:
+            profiles = [profile for profile in profiles if is_allowed(user, "read", profile)]  # ✅ Row-by-row fallback
+
+        page = ProfilePage(items=profiles, next_after=next_after)
+        if include is not None:
+            return partial_response(page, {**item_fields(include), "next_after": True})
+        return page
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"❌ Profile Listing Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+# ✅ Bulk Profile Read
+class ProfileBatchRequest(BaseModel):
+    ids: list[int]  # ✅ Profile ids
+
+@app.post("/profiles/batch", response_model=ProfileBatch)
+async def get_profiles_batch(
+    request: ProfileBatchRequest,
+    fields: str = None,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    🔹 Fetch many profiles by id in one round trip.
+    - Only profiles the caller may read are returned (RBAC filter in the WHERE clause)
+    - Ids that don't exist or aren't readable are listed in "missing" (indistinguishably)
+    - ?fields=id,bio trims every item to those fields
+    """
+    include = parse_fields(fields, ProfileOut)
+    ids = sorted(set(request.ids))
+    if len(ids) > PROFILES_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PROFILES_BATCH_MAX} ids per batch")
+
+    try:
+        profiles = []
+        if ids:
+            query = select(Profile).where(Profile.id.in_(ids)).order_by(Profile.id)
+            condition = authorized_filter(user, "read", Profile)
+            if condition is not None:
+                query = query.where(condition)
+            result = await db.execute(query)
+            profiles = result.scalars().all()
+            if condition is None:
+                profiles = [profile for profile in profiles if is_allowed(user, "read", profile)]
+
+        found = {profile.id for profile in profiles}
+        batch = ProfileBatch(items=profiles, missing=[profile_id for profile_id in ids if profile_id not in found])
+        if include is not None:
+            return partial_response(batch, {**item_fields(include), "missing": True})
+        return batch
+
+    except HTTPException:
+        raise
 
     except Exception as e:
-        logging.error(f"❌ Error Fetching User Profile: {e}")
+        logger.error(f"❌ Profile Batch Error: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
@@ -0,0 +1,248 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ✅ Instrumentation Settings
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() in ("1", "true", "yes")  # Per-request header
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ✅ Per-request stage totals (stage -> [seconds, count]) for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """
+    🔹 Prometheus-style histogram.
+    - observe() is a bisect + three additions under a lock (sub-microsecond)
+    - Buckets are stored non-cumulative and summed at render time
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *labels):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.gauges = []  # (name, help, callback returning a number or {labels tuple: number})
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_gauge(self, name: str, help_text: str, callback, labelnames=()):
+        """callback() returns a number, or a dict of label values tuple -> number"""
+        self.gauges.append((name, help_text, callback, tuple(labelnames)))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for name, help_text, callback, labelnames in self.gauges:
+            try:
+                values = callback()
+            except Exception:
+                continue  # ✅ A broken collector must not break the scrape
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+            if not isinstance(values, dict):
+                values = {(): values}
+            for labels, value in sorted(values.items()):
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+REQUESTS = registry.register(Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+REQUEST_LATENCY = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+STAGE_LATENCY = registry.register(Histogram("stage_duration_seconds", "Latency of instrumented request stages", ("stage",)))
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        totals = timings.get(stage)
+        if totals is None:
+            timings[stage] = [seconds, 1]
+        else:
+            totals[0] += seconds
+            totals[1] += 1
+
+
+class span:
+    """
+    🔹 Times a block into stage_duration_seconds{stage=...} (and Server-Timing).
+    - Usable as `with span("retrieval"):` in sync or async code
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if METRICS_ENABLED:
+            record_stage(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def timed(stage: str):
+    """Decorator: times every call of a sync function, coroutine function or async generator"""
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def _agen(*args, **kwargs):
+                with span(stage):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return _agen
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def _async(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return _async
+
+        @functools.wraps(fn)
+        def _sync(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return _sync
+    return decorator
+
+
+# ✅ Every SQL statement on any engine is timed as the "db" stage
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if started:
+        seconds = time.perf_counter() - started.pop()
+        if METRICS_ENABLED:
+            record_stage("db", seconds)
+
+
+def server_timing_header(timings: dict, total: float) -> str:
+    parts = [f'{stage};dur={seconds * 1000:.2f};desc="{count}x"' for stage, (seconds, count) in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    🔹 ASGI middleware: request count/latency per route template and optional Server-Timing.
+    - Route label is the matched path template (/profile/{user_id}), never the raw path
+    - Latency is measured to the end of the response body (includes streaming)
+    """
+
+    def __init__(self, app, server_timing: bool = None):
+        self.app = app
+        self.server_timing = server_timing  # None: follow METRICS_SERVER_TIMING
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+        server_timing = METRICS_SERVER_TIMING if self.server_timing is None else self.server_timing
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if server_timing:
+                    header = server_timing_header(timings, time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - started, scope["method"], route_label)
+            REQUESTS.inc(scope["method"], route_label, str(status["code"]))
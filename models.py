@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -20,6 +21,8 @@ class Profile(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)  # User ID (Foreign Key)
     bio = Column(String(255), default=None)  # Optional Bio
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every write (ETag)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Last write (Last-Modified)
 
     # Relationship with User Table
     user = relationship("User", back_populates="profile")
@@ -27,6 +30,18 @@ class Profile(Base):
 # ✅ Establish One-to-One Relationship (User <--> Profile)
 User.profile = relationship("Profile", back_populates="user", uselist=False)
 
+# ✅ Refresh Token Table Model (only an HMAC of the token is stored)
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    family_id = Column(String(32), index=True, nullable=False)  # One login session; shared by every rotation
+    token_hash = Column(String(64), unique=True, nullable=False)  # HMAC-SHA256 of the opaque token
+    expires_at = Column(DateTime, nullable=False)
+    rotated_at = Column(DateTime, default=None)  # Set when exchanged; presenting it again is reuse
+    revoked_at = Column(DateTime, default=None, index=True)  # Set for the whole family on logout / reuse
+
 # ✅ Documents Table Model
 class Document(Base):
     __tablename__ = "documents"
@@ -34,4 +49,20 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)  # Document Title
     content = Column(Text, nullable=False)  # Document Content
-    created_at = Column(String(50), default="CURRENT_TIMESTAMP")  # Timestamp
+    content_hash = Column(String(40), index=True)  # SHA-1 of normalized content (ingestion dedup)
+    created_at = Column(DateTime, default=datetime.utcnow)  # Timestamp
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Last write
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped by every ORM update
+
+    __mapper_args__ = {"version_id_col": version}
+
+# ✅ Document Change Log (append-only; written in the same transaction as the document change)
+class DocumentChange(Base):
+    __tablename__ = "document_changes"
+
+    id = Column(Integer, primary_key=True, index=True)  # Feed position
+    document_id = Column(Integer, index=True, nullable=False)  # No foreign key: deletes are logged too
+    operation = Column(String(10), nullable=False)  # "upsert" or "delete"
+    version = Column(Integer)  # Document version written by this change
+    origin = Column(String(32))  # Writing process (it already applied the change in memory)
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
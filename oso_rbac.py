@@ -1,6 +1,22 @@
+import logging
+import os
 from oso import Oso
 from fastapi import HTTPException
+from sqlalchemy import and_, false, or_, true
 from models import User, Profile
+from cache import create_cache
+from policy_compiler import PolicyCompileError, compile_policy
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ✅ Authorization Settings
+POLICY_FILES = ["policies.polar"]
+AUTHZ_CACHE_ENABLED = os.getenv("AUTHZ_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+AUTHZ_CACHE_TTL_SECONDS = float(os.getenv("AUTHZ_CACHE_TTL_SECONDS", "300"))
+AUTHZ_CACHE_MAXSIZE = int(os.getenv("AUTHZ_CACHE_MAXSIZE", "100000"))
+AUTHZ_CACHE_RECORD_BYTES = int(os.getenv("AUTHZ_CACHE_RECORD_BYTES", "256"))  # Shared backend: pickled key + decision limit
+AUTHZ_COMPILED = os.getenv("AUTHZ_COMPILED", "false").lower() in ("1", "true", "yes")  # Evaluate rules in Python, skip the Polar VM
 
 # ✅ Initialize Oso (RBAC Policy Engine)
 oso = Oso()
@@ -9,15 +25,126 @@ oso = Oso()
 # This allows Oso to enforce permissions based on model attributes
 oso.register_class(User)
 oso.register_class(Profile)
+REGISTERED_CLASSES = {"User": User, "Profile": Profile}
+
+# ✅ Decision cache: (actor attributes, action, resource type + attributes) -> allowed
+decision_cache = create_cache(
+    "authz_decisions", maxsize=AUTHZ_CACHE_MAXSIZE, ttl=AUTHZ_CACHE_TTL_SECONDS,
+    enabled=AUTHZ_CACHE_ENABLED, record_size=AUTHZ_CACHE_RECORD_BYTES,
+)
+
+# ✅ Compiled form of the loaded policy (None if it uses syntax the compiler doesn't support)
+compiled_policy = None
+policies_loaded = False
+
 
-# ✅ Load Oso RBAC Policies from File (Ensure 'policies.polar' exists)
-try:
-    oso.load_files(["policies.polar"])
-    print("✅ Oso RBAC Policies Loaded Successfully")
-except Exception as e:
-    print(f"❌ Error loading Oso policies: {str(e)}")  # ✅ Debugging
-    raise RuntimeError("Failed to load Oso policies.")
+def load_policies(files=None):
+    """
+    🔹 (Re)loads the Polar policy files.
+    - Recompiles the Python fast-path and clears cached decisions
+    - Raises RuntimeError if Oso rejects the policy
+    """
+    global compiled_policy, policies_loaded
+    files = files or POLICY_FILES
+    try:
+        oso.clear_rules()
+        oso.load_files(files)
+    except Exception as e:
+        logger.critical("❌ Error loading Oso policies", extra={"files": files, "error": str(e)})
+        raise RuntimeError("Failed to load Oso policies.")
 
+    try:
+        source = "\n".join(open(path, encoding="utf-8").read() for path in files)
+        compiled_policy = compile_policy(source, REGISTERED_CLASSES)
+    except PolicyCompileError as e:
+        logger.warning("⚠️ Policy not compiled, using the Polar VM only", extra={"error": str(e)})
+        compiled_policy = None
+    decision_cache.clear()  # ✅ Old decisions may no longer hold
+    policies_loaded = True
+    logger.info("✅ Oso RBAC Policies Loaded Successfully", extra={"files": files, "compiled": compiled_policy is not None})
+
+
+def ensure_policies():
+    """Loads policies.polar on the first authorization check (or at startup warm-up), not at import"""
+    if not policies_loaded:
+        load_policies()
+
+
+def decision_key(policy, user, action: str, resource):
+    """
+    🔹 Cache key for a decision, built from only the attributes the policy reads.
+    - Returns None when the decision can't be keyed safely (policy not compiled / unhashable values)
+    """
+    if policy is None or not policy.cacheable:
+        return None
+    attributes = policy.key_attributes
+    if isinstance(resource, str):
+        resource_key = resource
+    else:
+        resource_key = (type(resource).__name__,) + tuple(getattr(resource, name, None) for name in attributes["resource"])
+    key = (type(user).__name__, *(getattr(user, name, None) for name in attributes["actor"]), action, resource_key)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def is_allowed(user, action: str, resource) -> bool:
+    """Cached decision; compiled Python predicates when enabled, otherwise the Polar VM"""
+    if not policies_loaded:
+        ensure_policies()
+    policy = compiled_policy
+    if AUTHZ_COMPILED and policy is not None:
+        return policy.is_allowed(user, action, resource)  # ✅ Cheaper than a cache lookup
+
+    key = decision_key(policy, user, action, resource)
+    if key is not None:
+        allowed = decision_cache.get(key)
+        if allowed is not None:
+            return allowed
+
+    allowed = oso.is_allowed(user, action, resource)
+    if key is not None:
+        decision_cache.set(key, allowed)
+    return allowed
+
+
+def _column_condition(model, attribute: str, operator: str, value):
+    column = getattr(model, attribute)
+    if value is None:
+        return column.is_(None) if operator == "==" else column.is_not(None)
+    if operator == "==":
+        return column == value
+    return or_(column != value, column.is_(None))  # ✅ NULL != value in the policy, but not in SQL
+
+
+def authorized_filter(user, action: str, model):
+    """
+    🔹 SQL WHERE clause selecting the `model` rows user may perform action on.
+    - Derived from policies.polar by partially evaluating the compiled policy
+    - Returns None if the policy can't be expressed as a filter (check rows with is_allowed instead)
+    """
+    ensure_policies()
+    policy = compiled_policy
+    if policy is None:
+        return None
+    try:
+        alternatives = policy.filter_conditions(user, action, model)
+        if any(not constraints for constraints in alternatives):
+            return true()  # ✅ e.g. admins: every row
+        if not alternatives:
+            return false()
+        return or_(*(
+            and_(*(_column_condition(model, *constraint) for constraint in constraints))
+            for constraints in alternatives
+        ))
+    except (PolicyCompileError, LookupError, AttributeError) as e:
+        logger.warning("⚠️ No SQL filter for policy", extra={"action": action, "model": model.__name__, "error": str(e)})
+        return None
+
+
+@timed("authorize")
 def authorize(user: User, action: str, resource: object):
     """
     🔹 Authorize user actions using Oso RBAC.
@@ -27,12 +154,13 @@ def authorize(user: User, action: str, resource: object):
     - Raises HTTPException(403) if access is denied.
     """
     try:
-        if not oso.is_allowed(user, action, resource):
-            print(f"❌ Access Denied: {user.username} attempted '{action}' on {resource}")  # ✅ Debugging
+        if not is_allowed(user, action, resource):
+            logger.debug("❌ Access Denied", extra={"username": user.username, "action": action, "resource": str(resource)})
             raise HTTPException(status_code=403, detail="Access denied")
-        
-        print(f"✅ Access Granted: {user.username} performed '{action}' on {resource}")  # ✅ Debugging
-    
-    except Exception as e:
-        print(f"❌ Authorization Error: {str(e)}")  # ✅ Debugging
+
+    except HTTPException:
+        raise  # ✅ Keep 403 denials as 403
+
+    except Exception:
+        logger.exception("❌ Authorization Error")
         raise HTTPException(status_code=500, detail="Authorization service error")
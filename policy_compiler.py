@@ -0,0 +1,322 @@
+import re
+
+# ✅ Compiles the simple subset of Polar used in policies.polar into plain Python predicates.
+# Supported: rules `name(arg, "literal", _ignored, var: Class) if term and not term ...;`
+# where a term is `a.attr = b.attr` / `!=` / `==` (paths or string/number/boolean literals),
+# a bare `a.attr` (truthiness) or a call to another rule with bound arguments.
+# Anything else raises PolicyCompileError and the caller keeps using the Polar VM.
+
+_RULE = re.compile(r"^(\w+)\s*\((.*?)\)\s*(?:if\s+(.+))?$", re.DOTALL)
+_CALL = re.compile(r"^(\w+)\s*\((.*)\)$", re.DOTALL)
+_COMPARISON = re.compile(r"^(.+?)\s*(==|!=|=)\s*(.+)$")
+_PATH = re.compile(r"^[A-Za-z_]\w*(\.\w+)*$")
+_COMMENT = re.compile(r"#[^\n]*")
+_NOT_FOUND = object()
+
+
+class PolicyCompileError(Exception):
+    """The policy uses syntax the compiler does not handle"""
+
+
+def _literal(token: str):
+    """Returns (True, value) for string/number/boolean literals, (False, None) otherwise"""
+    if len(token) >= 2 and token[0] == token[-1] == '"':
+        return True, token[1:-1]
+    if token in ("true", "false"):
+        return True, token == "true"
+    if re.fullmatch(r"-?\d+", token):
+        return True, int(token)
+    if re.fullmatch(r"-?\d+\.\d+", token):
+        return True, float(token)
+    return False, None
+
+
+def _split_args(text_value: str) -> list:
+    args = [arg.strip() for arg in text_value.split(",")] if text_value.strip() else []
+    for arg in args:
+        if arg.count('"') % 2 or any(char in arg for char in "()[]{}"):
+            raise PolicyCompileError(f"Unsupported argument: {arg}")
+    return args
+
+
+def _split_terms(body: str) -> list:
+    if re.search(r"\b(or|forall|in|matches|cut|print)\b", body):
+        raise PolicyCompileError(f"Unsupported rule body: {body}")
+    return [term.strip() for term in re.split(r"\band\b", body) if term.strip()]
+
+
+def _resolve(path: str, env: dict):
+    name, *attributes = path.split(".")
+    value = env[name]
+    for attribute in attributes:
+        value = getattr(value, attribute, _NOT_FOUND)
+        if value is _NOT_FOUND:
+            raise LookupError(f"Attribute not found: {path}")
+    return value
+
+
+class CompiledPolicy:
+    """
+    🔹 Python evaluation of a compiled Polar policy.
+    - is_allowed(actor, action, resource) mirrors oso.is_allowed for the supported subset
+    - key_attributes: actor/resource attributes the decision can depend on (used for decision cache keys)
+    - cacheable: False if decisions may depend on more than those attributes
+    """
+
+    def __init__(self, rules: dict, key_attributes: dict, cacheable: bool):
+        self.rules = rules  # rule name -> [compiled rule functions]
+        for rule in (rule for compiled in rules.values() for rule in compiled):
+            rule.policy = self
+        self.key_attributes = key_attributes
+        self.cacheable = cacheable
+
+    def query(self, name: str, args: tuple) -> bool:
+        return any(rule(args) for rule in self.rules.get(name, ()))
+
+    def is_allowed(self, actor, action, resource) -> bool:
+        return self.query("allow", (actor, action, resource))
+
+    def filter_conditions(self, actor, action: str, resource_class) -> list:
+        """
+        🔹 Partially evaluates allow(actor, action, <unknown resource_class instance>).
+        - Returns alternatives (OR) of constraint lists (AND) of (attribute, "==" | "!=", value)
+        - [] means nothing is allowed; [[]] means every row is allowed
+        - Raises PolicyCompileError if the policy can't be reduced to such constraints
+        """
+        return self._partial("allow", (actor, action, Unknown(resource_class)))
+
+    def _partial(self, name: str, args: tuple) -> list:
+        alternatives = []
+        for rule in self.rules.get(name, ()):
+            alternatives.extend(self._partial_rule(rule, args))
+        return alternatives
+
+    def _partial_rule(self, rule, args: tuple) -> list:
+        if len(args) != len(rule.params):
+            return []
+        env = {}
+        for (kind, value, cls), arg in zip(rule.params, args):
+            if isinstance(arg, Unknown):
+                if kind == "literal" or (cls is not None and not issubclass(arg.cls, cls)):
+                    return []  # ✅ Rows of arg.cls can never match this head
+            elif kind == "literal":
+                if arg != value or type(arg) is not type(value):
+                    return []
+                continue
+            elif cls is not None and not isinstance(arg, cls):
+                return []
+            if kind == "variable":
+                if value in env and (isinstance(arg, Unknown) or isinstance(env[value], Unknown)):
+                    raise PolicyCompileError(f"Repeated unknown variable: {value}")
+                if value in env and env[value] != arg:
+                    return []
+                env[value] = arg
+
+        conjunctions = [[]]
+        for term in rule.terms:
+            alternatives = self._partial_term(term, env)
+            conjunctions = [known + extra for known in conjunctions for extra in alternatives]
+            if not conjunctions:
+                return []
+        return conjunctions
+
+    def _partial_term(self, term, env: dict) -> list:
+        kind, payload, negate = term.spec
+
+        def _unknown_attribute(path: str):
+            """Attribute name if path reads the unknown resource, else None"""
+            name, *attributes = path.split(".")
+            if not isinstance(env.get(name), Unknown):
+                return None
+            if len(attributes) != 1:
+                raise PolicyCompileError(f"Only direct attributes of the resource can be filtered: {path}")
+            return attributes[0]
+
+        if kind == "call":
+            callee, operands = payload
+            args = tuple(value if is_literal else env[value] for is_literal, value in operands)
+            if not any(isinstance(arg, Unknown) for arg in args):
+                return [[]] if term(env, self) else []
+            if negate:
+                raise PolicyCompileError(f"Negated rule call on the resource: {callee}")
+            return self._partial(callee, args)
+
+        if kind == "compare":
+            sides, operator = payload
+            unknown = [None if is_literal else _unknown_attribute(value) for is_literal, value in sides]
+            if unknown == [None, None]:
+                return [[]] if term(env, self) else []
+            if None not in unknown:
+                raise PolicyCompileError("Comparisons between two resource attributes are not supported")
+            is_literal, other = sides[unknown.index(None)]
+            value = other if is_literal else _resolve(other, env)
+            operator = "!=" if (operator == "!=") != negate else "=="
+            return [[(next(name for name in unknown if name), operator, value)]]
+
+        attribute = _unknown_attribute(payload)
+        if attribute is None:
+            return [[]] if term(env, self) else []
+        return [[(attribute, "!=" if negate else "==", True)]]
+
+
+class Unknown:
+    """Placeholder for the resource during partial evaluation (any row of cls)"""
+
+    def __init__(self, cls):
+        self.cls = cls
+
+
+def compile_policy(source: str, classes: dict = None) -> CompiledPolicy:
+    """
+    🔹 Compiles Polar source into a CompiledPolicy.
+    - classes: Registered class names -> classes (for `var: Class` specializers)
+    - Raises PolicyCompileError for anything outside the supported subset
+    """
+    classes = classes or {}
+    rules = {}
+    accessed = {}  # (rule name, position) -> attribute names read on that argument
+    forwarded = []  # ((callee, position), (caller, position)): argument passed through to another rule
+    cacheable = True
+
+    for statement in _COMMENT.sub("", source).split(";"):
+        statement = " ".join(statement.split())
+        if not statement:
+            continue
+        match = _RULE.match(statement)
+        if not match:
+            raise PolicyCompileError(f"Unsupported statement: {statement}")
+        name, head, body = match.groups()
+
+        params, positions = [], {}
+        for index, arg in enumerate(_split_args(head)):
+            variable, _, class_name = (part.strip() for part in arg.partition(":"))
+            if class_name and class_name not in classes:
+                raise PolicyCompileError(f"Unknown class in specializer: {class_name}")
+            is_literal, value = _literal(variable)
+            if is_literal:
+                params.append(("literal", value, None))
+            elif re.fullmatch(r"\w+", variable):
+                kind = "ignored" if variable.startswith("_") else "variable"
+                params.append((kind, variable, classes.get(class_name)))
+                if kind == "variable":
+                    positions.setdefault(variable, index)
+            else:
+                raise PolicyCompileError(f"Unsupported parameter: {arg}")
+
+        terms = []
+        for term in _split_terms(body or ""):
+            check, trackable = _compile_term(term, positions, name, accessed, forwarded)
+            terms.append(check)
+            cacheable = cacheable and trackable  # ✅ Nested attribute paths can't be captured by the cache key
+        rules.setdefault(name, []).append(_build_rule(params, terms))
+
+    # ✅ Attributes read by a rule also matter to every caller that forwards the argument to it
+    changed = True
+    while changed:
+        changed = False
+        for callee, caller in forwarded:
+            missing = accessed.get(callee, set()) - accessed.setdefault(caller, set())
+            if missing:
+                accessed[caller] |= missing
+                changed = True
+
+    key_attributes = {
+        "actor": tuple(sorted(accessed.get(("allow", 0), ()))),
+        "resource": tuple(sorted(accessed.get(("allow", 2), ()))),
+    }
+    return CompiledPolicy(rules, key_attributes, cacheable)
+
+
+def _compile_term(term: str, positions: dict, rule_name: str, accessed: dict, forwarded: list):
+    negate = term.startswith("not ")
+    if negate:
+        term = term[4:].strip()
+
+    def _track(path: str) -> bool:
+        """Records attribute reads on rule arguments; False if the key can't capture the path"""
+        name, *attributes = path.split(".")
+        if name not in positions:
+            raise PolicyCompileError(f"Unbound variable: {name}")
+        if len(attributes) != 1:
+            return False
+        accessed.setdefault((rule_name, positions[name]), set()).add(attributes[0])
+        return True
+
+    call = _CALL.match(term)
+    comparison = _COMPARISON.match(term)
+    if call:
+        callee, arg_text = call.groups()
+        operands = []
+        for index, arg in enumerate(_split_args(arg_text)):
+            is_literal, value = _literal(arg)
+            if is_literal:
+                operands.append((True, value))
+            elif re.fullmatch(r"\w+", arg) and arg in positions:
+                operands.append((False, arg))
+                forwarded.append(((callee, index), (rule_name, positions[arg])))
+            else:
+                raise PolicyCompileError(f"Unsupported call argument: {arg}")
+
+        def evaluate(env, policy):
+            return policy.query(callee, tuple(value if is_literal else env[value] for is_literal, value in operands))
+        trackable = True
+    elif comparison:
+        left, operator, right = (part.strip() for part in comparison.groups())
+        sides, trackable = [], True
+        for side in (left, right):
+            is_literal, value = _literal(side)
+            if is_literal:
+                sides.append((True, value))
+            elif _PATH.match(side):
+                trackable = _track(side) and trackable
+                sides.append((False, side))
+            else:
+                raise PolicyCompileError(f"Unsupported operand: {side}")
+
+        def evaluate(env, policy):
+            left_value, right_value = (value if is_literal else _resolve(value, env) for is_literal, value in sides)
+            return (left_value != right_value) if operator == "!=" else (left_value == right_value)
+    elif _PATH.match(term) and "." in term:
+        trackable = _track(term)
+
+        def evaluate(env, policy):
+            return _resolve(term, env) is True
+    else:
+        raise PolicyCompileError(f"Unsupported term: {term}")
+
+    def checked(env, policy):
+        result = evaluate(env, policy)  # ✅ Missing attributes raise LookupError, like the Polar VM does
+        return not result if negate else result
+
+    if call:
+        checked.spec = ("call", (callee, operands), negate)
+    elif comparison:
+        checked.spec = ("compare", (sides, operator), negate)
+    else:
+        checked.spec = ("truthy", term, negate)
+
+    return checked, trackable
+
+
+def _build_rule(params: list, terms: list):
+    def rule(args):
+        if len(args) != len(params):
+            return False
+        env = {}
+        for (kind, value, cls), arg in zip(params, args):
+            if kind == "literal":
+                if arg != value or type(arg) is not type(value):
+                    return False
+                continue
+            if cls is not None and not isinstance(arg, cls):
+                return False
+            if kind == "variable":
+                if value in env and env[value] != arg:
+                    return False
+                env[value] = arg
+        return all(term(env, rule.policy) for term in terms)
+
+    rule.policy = None  # ✅ Set once the CompiledPolicy exists (rules call back into it)
+    rule.params = params
+    rule.terms = terms
+    return rule
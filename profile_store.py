@@ -0,0 +1,206 @@
+import os
+from datetime import datetime
+from sqlalchemy import delete, insert as generic_insert, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from cache import create_cache
+from models import Profile
+
+# ✅ Profile Read Cache Settings (serves If-None-Match revalidations without a query)
+PROFILE_CACHE_ENABLED = os.getenv("PROFILE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "30"))
+PROFILE_CACHE_MAXSIZE = int(os.getenv("PROFILE_CACHE_MAXSIZE", "100000"))
+PROFILE_CACHE_RECORD_BYTES = int(os.getenv("PROFILE_CACHE_RECORD_BYTES", "512"))  # Shared backend: pickled profile limit
+PROFILE_CACHE_CONTROL = os.getenv("PROFILE_CACHE_CONTROL", "private, no-cache")  # Clients store, then revalidate
+
+# ✅ Keyed by (source, user_id): primary reads ("primary") and replica reads ("replica") are cached
+# apart, so a lagging replica can never hide a write from the read-your-writes GET /profile
+profile_cache = create_cache(
+    "profiles",
+    maxsize=PROFILE_CACHE_MAXSIZE,
+    ttl=PROFILE_CACHE_TTL_SECONDS,
+    enabled=PROFILE_CACHE_ENABLED,
+    record_size=PROFILE_CACHE_RECORD_BYTES,
+)
+
+# ✅ Dialect-specific INSERT constructs that support upserts
+_UPSERT_INSERTS = {
+    "mysql": mysql.insert,
+    "mariadb": mysql.insert,
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+_PROFILE_COLUMNS = (Profile.id, Profile.user_id, Profile.bio, Profile.version, Profile.updated_at)
+
+
+def _row_to_dict(row) -> dict:
+    return {"id": row.id, "user_id": row.user_id, "bio": row.bio, "version": row.version, "updated_at": row.updated_at}
+
+
+def profile_etag(profile: dict) -> str:
+    """Strong validator: changes with every write and when a profile is deleted and re-created"""
+    return f'"{profile["id"]}-{profile["version"]}"'
+
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """
+    🔹 Checks an If-None-Match / If-Match header against the current ETag.
+    - weak=True: W/ prefixes are ignored (If-None-Match); weak=False: only strong tags match (If-Match)
+    - "*" matches any existing representation
+    """
+    if not header or etag is None:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def invalidate_profile(user_id: int):
+    """Drops every cached copy of a user's profile (after writes)"""
+    profile_cache.invalidate(("primary", user_id))
+    profile_cache.invalidate(("replica", user_id))
+
+
+async def read_profile(db: AsyncSession, user_id: int) -> dict:
+    """Current profile row as a dict, or None"""
+    row = (await db.execute(select(*_PROFILE_COLUMNS).where(Profile.user_id == user_id))).first()
+    return _row_to_dict(row) if row is not None else None
+
+
+def _upsert_statement(dialect, user_id: int, bio: str, overwrite: bool):
+    """
+    🔹 INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE on profiles.user_id.
+    - overwrite=False keeps an existing bio (create-if-missing)
+    - Returns None for dialects without an upsert construct
+    """
+    insert = _UPSERT_INSERTS.get(dialect.name)
+    if insert is None:
+        return None
+
+    now = datetime.utcnow()
+    statement = insert(Profile).values(user_id=user_id, bio=bio, version=1, updated_at=now)
+    # ✅ Overwrites bump the version; a no-op assignment still reports the row, so create-if-missing
+    # never fails on the unique key (and leaves the version alone)
+    if dialect.name in ("mysql", "mariadb"):
+        proposed = statement.inserted
+    else:
+        proposed = statement.excluded
+    changes = {"bio": Profile.bio}
+    if overwrite:
+        changes = {"bio": proposed.bio, "version": Profile.version + 1, "updated_at": proposed.updated_at}
+    if dialect.name in ("mysql", "mariadb"):
+        statement = statement.on_duplicate_key_update(**changes)
+    else:
+        statement = statement.on_conflict_do_update(index_elements=[Profile.user_id], set_=changes)
+    if dialect.insert_returning:
+        statement = statement.returning(*_PROFILE_COLUMNS)
+    return statement
+
+
+async def _upsert(db: AsyncSession, user_id: int, bio: str, overwrite: bool) -> dict:
+    dialect = db.get_bind().dialect
+    statement = _upsert_statement(dialect, user_id, bio, overwrite)
+    if statement is None:
+        return await _select_then_write(db, user_id, bio, overwrite)
+
+    result = await db.execute(statement)
+    if dialect.insert_returning:
+        row = result.one()
+    else:
+        # ✅ MySQL has no RETURNING: read the row back inside the same transaction
+        row = (await db.execute(select(*_PROFILE_COLUMNS).where(Profile.user_id == user_id))).one()
+    await db.commit()
+    return _row_to_dict(row)
+
+
+async def _select_then_write(db: AsyncSession, user_id: int, bio: str, overwrite: bool) -> dict:
+    """Portable fallback: read, then insert/update; a lost insert race is retried as an update"""
+    for _ in range(2):
+        row = (await db.execute(select(*_PROFILE_COLUMNS).where(Profile.user_id == user_id))).first()
+        try:
+            if row is None:
+                await db.execute(generic_insert(Profile).values(user_id=user_id, bio=bio, version=1, updated_at=datetime.utcnow()))
+            elif overwrite:
+                await db.execute(Profile.__table__.update().where(Profile.user_id == user_id).values(
+                    bio=bio, version=Profile.version + 1, updated_at=datetime.utcnow(),
+                ))
+            else:
+                return _row_to_dict(row)
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()  # ✅ Another request created it first
+            continue
+        row = (await db.execute(select(*_PROFILE_COLUMNS).where(Profile.user_id == user_id))).one()
+        return _row_to_dict(row)
+    raise RuntimeError(f"Could not upsert profile for user {user_id}")
+
+
+async def get_or_create_profile(db: AsyncSession, user_id: int, default_bio: str) -> dict:
+    """
+    🔹 Returns the user's profile, creating it atomically on first access.
+    - Existing profile: one SELECT (no write)
+    - Missing profile: one upsert (+ RETURNING), so concurrent first requests can't collide on user_id
+    """
+    row = (await db.execute(select(*_PROFILE_COLUMNS).where(Profile.user_id == user_id))).first()
+    if row is not None:
+        return _row_to_dict(row)
+    return await _upsert(db, user_id, default_bio, overwrite=False)
+
+
+async def upsert_profile_bio(db: AsyncSession, user_id: int, bio: str) -> dict:
+    """🔹 Creates or updates the user's bio in one statement; returns the stored profile"""
+    return await _upsert(db, user_id, bio, overwrite=True)
+
+
+async def update_profile_bio_if_match(db: AsyncSession, user_id: int, bio: str, if_match: str) -> dict:
+    """
+    🔹 Optimistic-concurrency update (PUT with If-Match).
+    - Writes only if the stored profile still has the ETag the client read
+    - The UPDATE is conditional on the version, so a concurrent writer can't slip in between
+    - Returns the new profile, or None when the precondition fails (412)
+    """
+    current = await read_profile(db, user_id)
+    if current is None or not etag_matches(if_match, profile_etag(current), weak=False):
+        return None
+
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(Profile)
+        .where(Profile.id == current["id"], Profile.version == current["version"])
+        .values(bio=bio, version=current["version"] + 1, updated_at=now)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return None
+    await db.commit()
+    return {**current, "bio": bio, "version": current["version"] + 1, "updated_at": now}
+
+
+async def delete_profile_if_match(db: AsyncSession, user_id: int, if_match: str = None) -> bool:
+    """
+    🔹 Deletes the user's profile; with If-Match only while it is unchanged.
+    - Returns False when there is nothing to delete or the precondition fails
+    """
+    condition = [Profile.user_id == user_id]
+    if if_match is not None:
+        current = await read_profile(db, user_id)
+        if current is None or not etag_matches(if_match, profile_etag(current), weak=False):
+            return False
+        condition += [Profile.id == current["id"], Profile.version == current["version"]]
+
+    result = await db.execute(delete(Profile).where(*condition))
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    await db.commit()
+    return True
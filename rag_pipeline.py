@@ -1,83 +1,392 @@
-from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import httpx
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from models import Document
 import os
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from pydantic import BaseModel, Field
+import database
+from database import get_db, get_read_db
 from auth import get_current_user
-from openai import OpenAI, OpenAIError
-from sqlalchemy.sql import text
+from retrievers import create_retriever, HashingEmbedder, RAG_EMBEDDER, RAG_RETRIEVER
+from answer_cache import AnswerCache, ANSWER_CACHE_SEMANTIC, context_signature, normalize_query
+from singleflight import SingleFlight
+from context_builder import assemble_context, count_tokens
+from ai_scheduler import AIScheduler, CircuitOpenError, PRIORITY_ADMIN, PRIORITY_BATCH, PRIORITY_USER
+from ingestion import DocumentIngestor, iter_stream_lines
+from oso_rbac import authorize
+from metrics import timed
+from schemas import RAGAnswer
 
-# ✅ Load environment variables securely
-load_dotenv()
-openai_api_key = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
 
-if not openai_api_key:
-    raise ValueError("❌ Missing OpenAI API Key. Set OPENAI_API_KEY in .env")
+# ✅ OpenAI Client Settings
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # ✅ Optional override (e.g. a local fake server)
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
 
-# ✅ Initialize OpenAI Client
-client = OpenAI(api_key=openai_api_key)
+# ✅ Shared, pooled OpenAI client, built on first use (the service starts without OPENAI_API_KEY;
+# only the AI routes need it). Tests & benchmarks may assign `client` directly.
+http_client = None
+client = None
+
+def get_openai_client():
+    """
+    🔹 Returns the shared AsyncOpenAI client, creating it (and its connection pool) on first call.
+    - Raises HTTPException(503) if OPENAI_API_KEY is not set
+    - Retries are owned by the scheduler below (max_retries=0)
+    """
+    global client, http_client
+    if client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            logger.error("❌ Missing OpenAI API Key. Set OPENAI_API_KEY in .env")
+            raise HTTPException(status_code=503, detail="AI service is not configured")
+        from openai import AsyncOpenAI  # ✅ Heavy import, deferred until an AI route is used
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+            timeout=OPENAI_TIMEOUT_SECONDS,
+        )
+        client = AsyncOpenAI(api_key=api_key, base_url=OPENAI_BASE_URL, http_client=http_client, max_retries=0)
+    return client
+
+async def close_openai_client():
+    """Closes the pooled connections (application shutdown)"""
+    global client, http_client
+    if http_client is not None:
+        await http_client.aclose()
+    client = http_client = None
+
+def ai_errors() -> tuple:
+    """Failures answered with the fallback message (openai is only imported once a client exists)"""
+    from openai import OpenAIError
+    return (OpenAIError, CircuitOpenError, asyncio.TimeoutError)
+
+# ✅ Concurrency / rate-limit governor for every completion
+ai_scheduler = AIScheduler()
+AI_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("AI_COMPLETION_TOKEN_ESTIMATE", "500"))  # Reserved per call in the token bucket
+
+AI_FALLBACK_RESPONSE = "❌ Sorry, I couldn't generate a response at the moment."
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))  # Chunks retrieved per query (then packed into the token budget)
+RAG_BATCH_MAX_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", "500"))  # Queries accepted per /rag/query/batch call
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "16"))  # Completions in flight per batch call
+RAG_RESPONSE_INCLUDE_CONTEXT = os.getenv("RAG_RESPONSE_INCLUDE_CONTEXT", "true").lower() in ("1", "true", "yes")  # Echo the context by default
+
+# ✅ Pluggable retrieval backend (RAG_RETRIEVER=fulltext|faiss), created on first use
+retriever = None
+
+def get_retriever():
+    global retriever
+    if retriever is None:
+        retriever = create_retriever(RAG_RETRIEVER, client=get_openai_client() if RAG_EMBEDDER == "openai" else None)
+    return retriever
+
+async def warm_up():
+    """
+    🔹 Startup warm-up for the AI routes (STARTUP_WARMUP=true).
+    - Creates the OpenAI client & its pool (when OPENAI_API_KEY is set)
+    - Runs one retrieval so the FAISS index is loaded / the BM25 index is built
+    """
+    if os.getenv("OPENAI_API_KEY"):
+        get_openai_client()
+    async with database.ReadSessionLocal() as db:
+        await get_retriever().search(db, "warm up", 1)
+
+# ✅ Answer cache in front of the completion (near-duplicate lookup uses the local embedder)
+answer_cache = AnswerCache(embedder=HashingEmbedder() if ANSWER_CACHE_SEMANTIC else None)
+
+def is_cacheable_answer(answer: str) -> bool:
+    return bool(answer) and not answer.endswith(AI_FALLBACK_RESPONSE)
+
+# ✅ Identical concurrent queries share one retrieval and one completion
+RAG_COALESCE_ENABLED = os.getenv("RAG_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+rag_flights = SingleFlight(enabled=RAG_COALESCE_ENABLED)
+
+async def _shared_retrieval(query: str, top_k: int):
+    """Coalesced retrieval on its own read session: it must outlive the request that started it"""
+    async with database.ReadSessionLocal() as db:
+        return await get_relevant_chunks(db, query, top_k)
 
 # ✅ Initialize FastAPI Router
 router = APIRouter()
 
 # ✅ Define request model
-class QueryRequest(BaseModel):
+class ContextOptions(BaseModel):
+    include_context: bool = RAG_RESPONSE_INCLUDE_CONTEXT  # ✅ false: leave the retrieved context out of the response
+    context_chars: Optional[int] = Field(None, ge=0)  # ✅ Echo at most this many characters of the context
+
+class QueryRequest(ContextOptions):
     query: str
+    stream: bool = False  # ✅ Send answer tokens as Server-Sent Events
+
+class BatchQueryRequest(ContextOptions):
+    queries: list[str] = Field(..., min_length=1, max_length=RAG_BATCH_MAX_QUERIES)
+
+def shape_context(context: str, options: ContextOptions) -> dict:
+    """The context fields of a response: omitted, truncated to context_chars, or in full"""
+    if not options.include_context:
+        return {}
+    if options.context_chars is not None and len(context) > options.context_chars:
+        return {"context": context[:options.context_chars], "context_truncated": True}
+    return {"context": context}
 
-async def generate_response_with_ai(context: str, query: str):
+def build_prompt(context: str, query: str) -> str:
+    return f"Based on the following context, answer the query.\n\nContext:\n{context}\n\nQuery: {query}\nAnswer:"
+
+@timed("completion")
+async def generate_response_with_ai(context: str, query: str, priority: int = PRIORITY_USER):
     """
     🔹 Generate an AI-powered response based on retrieved document context.
     - context: Extracted relevant document data
     - query: User's input query
-    - Returns AI-generated response
+    - priority: Scheduler lane (PRIORITY_ADMIN runs ahead of PRIORITY_USER)
+    - Returns AI-generated response (or the fallback message on failure / open breaker)
     """
-    prompt = f"Based on the following context, answer the query.\n\nContext:\n{context}\n\nQuery: {query}\nAnswer:"
-    
+    prompt = build_prompt(context, query)
+    ai_client = get_openai_client()
+
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o",  # ✅ Ensure correct model is used
-            messages=[{"role": "user", "content": prompt}]
+        completion = await ai_scheduler.run(
+            lambda: ai_client.chat.completions.with_raw_response.create(
+                model=OPENAI_MODEL,  # ✅ Ensure correct model is used
+                messages=[{"role": "user", "content": prompt}]
+            ),
+            priority=priority,
+            estimated_tokens=count_tokens(prompt) + AI_COMPLETION_TOKEN_ESTIMATE,
         )
         return completion.choices[0].message.content
 
-    except OpenAIError as e:
-        print(f"❌ OpenAI API Error: {e}")  # ✅ Debugging
-        return "❌ Sorry, I couldn't generate a response at the moment."
+    except ai_errors() as e:
+        logger.warning("❌ OpenAI API Error", extra={"error": repr(e)})
+        return AI_FALLBACK_RESPONSE
 
-@router.post("/query")
+@timed("completion_stream")
+async def stream_response_with_ai(context: str, query: str, priority: int = PRIORITY_USER):
+    """
+    🔹 Stream an AI-powered response token by token.
+    - Yields text deltas as soon as OpenAI produces them
+    - Yields the fallback message if the completion fails
+    """
+    prompt = build_prompt(context, query)
+    ai_client = get_openai_client()
+    try:
+        stream = ai_scheduler.stream(
+            lambda: ai_client.chat.completions.with_raw_response.create(
+                model=OPENAI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            ),
+            priority=priority,
+            estimated_tokens=count_tokens(prompt) + AI_COMPLETION_TOKEN_ESTIMATE,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    except ai_errors() as e:
+        logger.warning("❌ OpenAI API Error (stream)", extra={"error": repr(e)})
+        yield AI_FALLBACK_RESPONSE
+
+def format_sse(data: dict, event: str = None) -> str:
+    """Encodes one Server-Sent Event frame"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _complete_and_cache(context: str, query: str, documents, priority: int):
+    answer = await generate_response_with_ai(context, query, priority)
+    if is_cacheable_answer(answer):
+        await answer_cache.set(query, documents, answer)
+    return answer
+
+async def _stream_and_cache(context: str, query: str, documents, priority: int):
+    tokens = []
+    async for token in stream_response_with_ai(context, query, priority):
+        tokens.append(token)
+        yield token
+    if is_cacheable_answer("".join(tokens)):
+        await answer_cache.set(query, documents, "".join(tokens))
+
+async def _sse_answer_events(query: str, context: dict, tokens, prompt_tokens: int):
+    """Context first, then one event per answer token, then a done marker"""
+    yield format_sse({"query": query, **context, "prompt_tokens": prompt_tokens}, event="context")
+    async for token in tokens:
+        yield format_sse({"delta": token}, event="token")
+    yield "event: done\ndata: [DONE]\n\n"
+
+async def _single_token(answer: str):
+    yield answer
+
+@router.post("/query", response_model=RAGAnswer, response_model_exclude_none=True)
 async def query_rag(
     request: QueryRequest, 
-    db: AsyncSession = Depends(get_db), 
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),  # ✅ Retrieval only reads: served by the replica
     user: dict = Depends(get_current_user)
 ):
     """
     🔹 AI-powered RAG Pipeline Query Handler
     - Searches for relevant documents
     - Extracts relevant content
+    - Serves repeat questions from the answer cache (X-Cache header)
     - Uses OpenAI to generate AI responses
+    - include_context=false / context_chars=N omit or shorten the echoed context
     """
+    get_openai_client()  # ✅ 503 up front when the AI backend isn't configured
+
     try:
-        # ✅ Retrieve relevant document chunks
-        documents = await get_relevant_chunks(db, request.query)
+        # ✅ Retrieve relevant document chunks (shared with identical in-flight queries)
+        documents = await rag_flights.do(
+            ("retrieve", normalize_query(request.query)),
+            lambda: _shared_retrieval(request.query, RAG_TOP_K) if rag_flights.enabled else get_relevant_chunks(db, request.query, RAG_TOP_K),
+        )
         
         if not documents:
             raise HTTPException(status_code=404, detail="No relevant documents found")
 
-        # ✅ Combine relevant document contents into a context string
-        context = "\n".join([doc.content for doc in documents])
+        # ✅ Pack ranked, de-duplicated passages into the context token budget
+        assembled = assemble_context(documents, request.query)
+        context = assembled["context"]
+        documents = assembled["passages"]
+        prompt_tokens = count_tokens(build_prompt(context, request.query))
+
+        # ✅ Same question over the same chunk versions -> reuse the answer
+        cached_answer, cache_status = await answer_cache.get(request.query, documents)
+
+        completion_key = answer_cache.make_key(request.query, context_signature(documents))
+        priority = PRIORITY_ADMIN if getattr(user, "is_admin", False) else PRIORITY_USER
+
+        # ✅ Stream tokens as they arrive (time-to-first-byte independent of answer length)
+        if request.stream:
+            if cached_answer is not None:
+                tokens = _single_token(cached_answer)
+            else:
+                tokens = rag_flights.stream(("stream", completion_key), lambda: _stream_and_cache(context, request.query, documents, priority))
+            return StreamingResponse(
+                _sse_answer_events(request.query, shape_context(context, request), tokens, prompt_tokens),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                    "X-Cache": cache_status, "X-Prompt-Tokens": str(prompt_tokens),
+                },
+            )
+
+        response.headers["X-Cache"] = cache_status
+        response.headers["X-Prompt-Tokens"] = str(prompt_tokens)
+        if cached_answer is not None:
+            return {"query": request.query, **shape_context(context, request), "answer": cached_answer, "prompt_tokens": prompt_tokens}
 
-        # ✅ Generate AI response based on retrieved context
-        answer = await generate_response_with_ai(context, request.query)
+        # ✅ Generate AI response based on retrieved context (one completion per identical request group)
+        answer = await rag_flights.do(("complete", completion_key), lambda: _complete_and_cache(context, request.query, documents, priority))
 
-        return {"query": request.query, "context": context, "answer": answer}
-    
-    except Exception as e:
-        print(f"❌ Unexpected Error: {e}")  # ✅ Debugging
+        return {"query": request.query, **shape_context(context, request), "answer": answer, "prompt_tokens": prompt_tokens}
+
+    except HTTPException:
+        raise
+
+    except Exception:
+        logger.exception("❌ Unexpected Error in RAG query")
         raise HTTPException(status_code=404, detail="No relevant documents found")
 
+async def _answer_batch_item(index: int, query: str, documents, completions: asyncio.Semaphore, options: ContextOptions) -> dict:
+    """One /rag/query/batch result line; failures are reported in the line instead of aborting the batch"""
+    try:
+        if not documents:
+            return {"index": index, "query": query, "status": 404, "error": "No relevant documents found"}
+
+        assembled = assemble_context(documents, query)
+        context = assembled["context"]
+        documents = assembled["passages"]
+        prompt_tokens = count_tokens(build_prompt(context, query))
+
+        answer, cache_status = await answer_cache.get(query, documents)
+        if answer is None:
+            completion_key = answer_cache.make_key(query, context_signature(documents))
+            async with completions:
+                answer = await rag_flights.do(("complete", completion_key), lambda: _complete_and_cache(context, query, documents, PRIORITY_BATCH))
+
+        return {"index": index, "query": query, "status": 200, **shape_context(context, options), "answer": answer,
+                "prompt_tokens": prompt_tokens, "cache": cache_status}
+
+    except Exception:
+        logger.exception("❌ Unexpected Error in batch RAG query", extra={"index": index})
+        return {"index": index, "query": query, "status": 500, "error": "Query failed"}
+
+async def _batch_answer_lines(queries, documents_per_query, options: ContextOptions):
+    """NDJSON lines in completion order; pending completions are cancelled if the client goes away"""
+    completions = asyncio.Semaphore(RAG_BATCH_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_answer_batch_item(index, query, documents, completions, options))
+        for index, (query, documents) in enumerate(zip(queries, documents_per_query))
+    ]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield json.dumps(await next_result) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@router.post("/query/batch")
+async def query_rag_batch(
+    request: BatchQueryRequest,
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    🔹 Many RAG queries in one request (offline evaluation, internal tools)
+    - Retrieval for every distinct query runs in one pass (`search_many`: one
+      embedding call / index search, or one UNION ALL statement)
+    - Completions run concurrently (RAG_BATCH_CONCURRENCY per call, batch
+      priority in the AI scheduler) and share the answer cache
+    - Streams NDJSON in completion order; each line carries the query's `index`
+    """
+    get_openai_client()  # ✅ 503 up front when the AI backend isn't configured
+
+    # ✅ Retrieve once per distinct (normalized) query, then fan the rows back out
+    distinct = {}
+    for query in request.queries:
+        distinct.setdefault(normalize_query(query), query)
+    retrieved = await get_relevant_chunks_many(db, list(distinct.values()), RAG_TOP_K)
+    documents_by_query = dict(zip(distinct, retrieved))
+    documents_per_query = [documents_by_query[normalize_query(query)] for query in request.queries]
+
+    return StreamingResponse(
+        _batch_answer_lines(request.queries, documents_per_query, request),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+@router.post("/documents")
+async def ingest_documents(
+    request: Request,
+    title: str = "Untitled",
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """
+    🔹 Streaming document ingestion (admin only)
+    - Content-Type application/x-ndjson: one {"title", "content"} document per line
+    - Any other body: a single plain-text document named by `?title=`
+    - Splits into overlapping chunks, skips duplicates, bulk-inserts & updates indexes
+    """
+    authorize(user, "manage", "documents")
+
+    ingestor = DocumentIngestor(db)
+    lines = iter_stream_lines(request.stream())
+    if "ndjson" in request.headers.get("content-type", ""):
+        await ingestor.add_ndjson(lines)
+    else:
+        await ingestor.add_text(title, lines)
+    await ingestor.flush()
+
+    return ingestor.stats
+
 # async def get_relevant_chunks(db: AsyncSession, query: str, top_k: int = 3):
     # """
     # 🔹 Retrieve the most relevant documents based on a user query.
@@ -98,27 +407,36 @@ async def query_rag(
         # print(f"❌ Database Query Error: {e}")  # ✅ Debugging
         # return []
         
+@timed("retrieval")
 async def get_relevant_chunks(db: AsyncSession, query: str, top_k: int = 3):
     """
-    🔹 Retrieve relevant documents using MySQL Full-Text Search.
-    ✅ Fix: Ensure the full document (title, content) is retrieved.
+    🔹 Retrieve relevant documents using the configured retriever backend.
+    - fulltext: MySQL Full-Text Search (default)
+    - faiss: On-disk vector index over document embeddings
+    ✅ Returns full documents (id, title, content, score) ranked best first.
     """
     try:
-        sql = text("""
-            SELECT id, title, content FROM documents 
-            WHERE MATCH(content) AGAINST (:query IN BOOLEAN MODE) 
-            LIMIT :top_k
-        """)
-
-        result = await db.execute(sql, {"query": f'+{query}*', "top_k": top_k})
-        documents = result.mappings().all()  # ✅ Fetch full document as dict
+        documents = await get_retriever().search(db, query, top_k)
 
         if not documents:
-            print(f"❌ No matching documents found for: {query}")  # ✅ Debugging
+            logger.info("❌ No matching documents found", extra={"query": query})
         
         return documents  # ✅ Returns a list of full document data
 
-    except Exception as e:
-        print(f"❌ Database Query Error: {e}")  # ✅ Debugging
+    except Exception:
+        logger.exception("❌ Database Query Error")
         return []
- 
\ No newline at end of file
+ 
+
+@timed("retrieval_batch")
+async def get_relevant_chunks_many(db: AsyncSession, queries, top_k: int = 3):
+    """
+    🔹 get_relevant_chunks for many queries in one retrieval pass.
+    ✅ Returns one ranked document list per query (empty lists on failure).
+    """
+    try:
+        return await get_retriever().search_many(db, queries, top_k)
+
+    except Exception:
+        logger.exception("❌ Database Query Error")
+        return [[] for _ in queries]
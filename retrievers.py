@@ -0,0 +1,762 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import uuid
+import zlib
+from datetime import datetime
+from array import array
+from collections import Counter
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text, bindparam
+from models import Document, DocumentChange
+
+logger = logging.getLogger(__name__)
+
+# ✅ Retrieval Settings
+RAG_RETRIEVER = os.getenv("RAG_RETRIEVER", "fulltext")  # "fulltext", "faiss", "bm25" or "hybrid"
+RAG_EMBEDDER = os.getenv("RAG_EMBEDDER", "hashing")  # "hashing" (local, deterministic) or "openai"
+RAG_EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "text-embedding-3-small")
+RAG_EMBEDDING_DIM = int(os.getenv("RAG_EMBEDDING_DIM", "384"))  # Used by the hashing embedder
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "faiss.index")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw")  # "hnsw", "ivf" or "flat"
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() in ("1", "true", "yes")
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))  # Reciprocal-rank fusion damping constant
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "50"))  # Per-retriever list size before fusion
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text_value: str) -> list:
+    """Lower-cased word tokens"""
+    return TOKEN_PATTERN.findall(text_value.lower())
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row so inner product == cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+# --------------------------------------------
+# 🔹 Embedding Functions
+# --------------------------------------------
+
+class HashingEmbedder:
+    """
+    🔹 Deterministic local embedder (feature hashing of words and word prefixes).
+    - No network or model download; identical vectors on every run
+    - Prefix features let morphological variants ("learn", "learning") overlap
+    """
+
+    def __init__(self, dim: int = RAG_EMBEDDING_DIM, prefix_length: int = 4):
+        self.dim = dim
+        self.prefix_length = prefix_length
+
+    def _features(self, text_value: str):
+        for token in tokenize(text_value):
+            yield token, 1.0
+            if len(token) > self.prefix_length:
+                yield f"{token[:self.prefix_length]}~", 0.5
+
+    def embed_sync(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text_value in enumerate(texts):
+            for feature, weight in self._features(text_value):
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dim] += sign * weight
+        return normalize_rows(vectors)
+
+    async def embed(self, texts) -> np.ndarray:
+        return self.embed_sync(list(texts))
+
+
+class OpenAIEmbedder:
+    """
+    🔹 Embeddings from the OpenAI API.
+    - client: An AsyncOpenAI client (shared with the completion path)
+    """
+
+    def __init__(self, client, model: str = RAG_EMBEDDING_MODEL):
+        self.client = client
+        self.model = model
+        self.dim = None  # Known after the first call
+
+    async def embed(self, texts) -> np.ndarray:
+        response = await self.client.embeddings.create(model=self.model, input=list(texts))
+        vectors = normalize_rows(np.array([item.embedding for item in response.data], dtype=np.float32))
+        self.dim = vectors.shape[1]
+        return vectors
+
+
+def create_embedder(name: str = RAG_EMBEDDER, client=None):
+    if name == "hashing":
+        return HashingEmbedder()
+    if name == "openai":
+        if client is None:
+            raise ValueError("❌ The openai embedder needs an OpenAI client")
+        return OpenAIEmbedder(client)
+    raise ValueError(f"❌ Unknown embedder: {name}")
+
+# --------------------------------------------
+# 🔹 Shared Document Fetching
+# --------------------------------------------
+
+async def fetch_documents_by_ids(db: AsyncSession, ids) -> dict:
+    """Loads documents by id in one round trip; returns {id: row dict}"""
+    if not ids:
+        return {}
+    sql = text("SELECT id, title, content FROM documents WHERE id IN :ids").bindparams(
+        bindparam("ids", expanding=True)
+    )
+    result = await db.execute(sql, {"ids": [int(doc_id) for doc_id in ids]})
+    return {row["id"]: dict(row) for row in result.mappings().all()}
+
+
+async def rows_for_rankings(db: AsyncSession, rankings) -> list:
+    """Turns several [(id, score)] rankings into row lists with one fetch for all of them"""
+    rows = await fetch_documents_by_ids(db, {doc_id for ranking in rankings for doc_id, _ in ranking})
+    return [[{**rows[doc_id], "score": score} for doc_id, score in ranking if doc_id in rows] for ranking in rankings]
+
+
+async def iter_document_batches(db: AsyncSession, batch_size: int = 1000):
+    """Streams (id, content) rows in keyset-paginated batches (bounded memory)"""
+    last_id = 0
+    sql = text("SELECT id, content FROM documents WHERE id > :last_id ORDER BY id LIMIT :batch_size")
+    while True:
+        result = await db.execute(sql, {"last_id": last_id, "batch_size": batch_size})
+        rows = result.all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+# --------------------------------------------
+# 🔹 Document Change Notifications
+# --------------------------------------------
+
+# ✅ Callbacks fn(upserts: {id: content}, deleted_ids: set) run after a commit that changed documents
+document_listeners = []
+
+# ✅ Tags this process's rows in document_changes: the writer applies its own changes right after
+# commit, so its change feed consumer skips them; other processes pick them up from the log
+CHANGE_ORIGIN = uuid.uuid4().hex
+
+
+def notify_document_changes(upserts: dict, deleted_ids=()):
+    """
+    🔹 Pushes committed document changes to in-process indexes (also used by raw-SQL writers).
+    - Runs after the commit: a failing listener is logged, never turned into an error for a write
+      that already landed, and the other listeners still run
+    """
+    for listener in list(document_listeners):
+        try:
+            listener(upserts, set(deleted_ids))
+        except Exception:
+            logger.exception("❌ Document listener failed", extra={"listener": getattr(listener, "__qualname__", repr(listener))})
+
+
+def change_log_rows(versions: dict, deleted_ids=()) -> list:
+    """document_changes rows for upserted {id: version} and deleted ids"""
+    now = datetime.utcnow()
+    rows = [{"document_id": doc_id, "operation": "upsert", "version": version, "origin": CHANGE_ORIGIN, "changed_at": now}
+            for doc_id, version in versions.items()]
+    rows += [{"document_id": doc_id, "operation": "delete", "version": None, "origin": CHANGE_ORIGIN, "changed_at": now}
+             for doc_id in deleted_ids]
+    return rows
+
+
+async def log_document_changes(db: AsyncSession, versions: dict, deleted_ids=()):
+    """
+    🔹 Appends to the change log for writers that bypass the ORM (bulk inserts, raw SQL).
+    - Call before commit, so the log row and the document change land in the same transaction
+    """
+    rows = change_log_rows(versions, deleted_ids)
+    if rows:
+        await db.execute(DocumentChange.__table__.insert(), rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_document_changes(session, flush_context):
+    changes = session.info.setdefault("document_changes", {})
+    versions, deleted_ids = {}, []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Document):
+            changes[obj.id] = obj.content
+            versions[obj.id] = obj.version
+    for obj in session.deleted:
+        if isinstance(obj, Document):
+            changes[obj.id] = None
+            deleted_ids.append(obj.id)
+    if versions or deleted_ids:
+        # ✅ Same connection & transaction as the flush: the log commits or rolls back with the documents
+        session.connection().execute(DocumentChange.__table__.insert(), change_log_rows(versions, deleted_ids))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_document_changes(session):
+    changes = session.info.pop("document_changes", None)
+    if changes:
+        upserts = {doc_id: content for doc_id, content in changes.items() if content is not None}
+        notify_document_changes(upserts, {doc_id for doc_id, content in changes.items() if content is None})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_document_changes(session):
+    session.info.pop("document_changes", None)
+
+# --------------------------------------------
+# 🔹 BM25 Inverted Index
+# --------------------------------------------
+
+class BM25Index:
+    """
+    🔹 In-process BM25 inverted index over `documents.content`.
+    - Postings are compact parallel arrays (uint32 slot, uint32 term frequency)
+    - Documents are added / removed incrementally; removals are tombstoned
+      and postings are compacted once enough of them pile up
+    - Scoring is vectorized with numpy over the postings of the query terms
+    - ensure_built() runs one build however many cold requests arrive together
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.built = False
+        self._build_lock = asyncio.Lock()
+        self._changed_during_build = None  # Ids written while a build is scanning (set), else None
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}  # term -> (array("I") slots, array("I") term frequencies)
+        self._slot_of = {}  # document id -> slot
+        self._doc_ids = array("q")  # slot -> document id
+        self._doc_len = array("I")  # slot -> token count
+        self._alive = bytearray()  # slot -> 1 if live
+        self._total_len = 0
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def add_document(self, doc_id: int, content: str):
+        """Indexes (or re-indexes) one document"""
+        if doc_id in self._slot_of:
+            self.remove_document(doc_id)
+
+        tokens = tokenize(content)
+        slot = len(self._doc_ids)
+        self._slot_of[doc_id] = slot
+        self._doc_ids.append(doc_id)
+        self._doc_len.append(len(tokens))
+        self._alive.append(1)
+        self._total_len += len(tokens)
+
+        for term, frequency in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("I"))
+            postings[0].append(slot)
+            postings[1].append(frequency)
+
+    def remove_document(self, doc_id: int):
+        slot = self._slot_of.pop(doc_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = 0
+        self._total_len -= self._doc_len[slot]
+        self._dead += 1
+        if self._dead > self.compact_ratio * len(self._doc_ids):
+            self.compact()
+
+    def apply_changes(self, upserts: dict, deleted_ids=()):
+        """Document listener: keeps the index in sync with committed writes"""
+        if self._changed_during_build is not None:
+            self._changed_during_build.update(deleted_ids, upserts)
+        for doc_id in deleted_ids:
+            self.remove_document(doc_id)
+        for doc_id, content in upserts.items():
+            self.add_document(doc_id, content)
+
+    def compact(self):
+        """Drops tombstoned slots and renumbers the survivors"""
+        alive = np.frombuffer(bytes(self._alive), dtype=np.uint8).astype(bool)
+        remap = np.cumsum(alive, dtype=np.int64) - 1
+
+        postings = {}
+        for term, (slots, frequencies) in self._postings.items():
+            slot_view = np.frombuffer(slots, dtype=np.uint32)
+            keep = alive[slot_view]
+            if keep.any():
+                postings[term] = (
+                    array("I", remap[slot_view[keep]].astype(np.uint32).tobytes()),
+                    array("I", np.frombuffer(frequencies, dtype=np.uint32)[keep].tobytes()),
+                )
+        doc_ids = np.frombuffer(self._doc_ids, dtype=np.int64)[alive]
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)[alive]
+
+        self._postings = postings
+        self._doc_ids = array("q", doc_ids.tobytes())
+        self._doc_len = array("I", doc_len.tobytes())
+        self._alive = bytearray(b"\x01" * len(doc_ids))
+        self._slot_of = {int(doc_id): slot for slot, doc_id in enumerate(doc_ids)}
+        self._dead = 0
+
+    async def build(self, db: AsyncSession, batch_size: int = 1000) -> int:
+        """
+        🔹 Indexes every document (keyset batches) and subscribes to later changes.
+        - Subscribes before scanning: a document committed after its batch was read
+          still reaches the index, and a batch never overwrites a newer committed write
+        """
+        self.built = False
+        self._reset()
+        if self.apply_changes not in document_listeners:
+            document_listeners.append(self.apply_changes)
+        self._changed_during_build = set()
+        try:
+            async for rows in iter_document_batches(db, batch_size):
+                for doc_id, content in rows:
+                    if doc_id not in self._changed_during_build:
+                        self.add_document(doc_id, content)
+        finally:
+            self._changed_during_build = None
+        self.built = True
+        return len(self)
+
+    async def ensure_built(self, db: AsyncSession, batch_size: int = 1000):
+        """Builds the index on first use; concurrent callers wait for the same build"""
+        if self.built:
+            return
+        async with self._build_lock:
+            if not self.built:
+                await self.build(db, batch_size)
+
+    def search(self, query: str, top_k: int = 3) -> list:
+        """Returns [(document id, BM25 score)] ranked best first"""
+        live_docs = len(self._slot_of)
+        terms = [term for term in set(tokenize(query)) if term in self._postings]
+        if not terms or not live_docs:
+            return []
+
+        avg_len = self._total_len / live_docs
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+        slot_parts, weight_parts = [], []
+        for term in terms:
+            slots, frequencies = self._postings[term]
+            slot_view = np.frombuffer(slots, dtype=np.uint32)
+            tf = np.frombuffer(frequencies, dtype=np.uint32).astype(np.float32)
+            idf = math.log(1.0 + (live_docs - len(slot_view) + 0.5) / (len(slot_view) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_len[slot_view] / avg_len)
+            slot_parts.append(slot_view)
+            weight_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+        slots = np.concatenate(slot_parts)
+        weights = np.concatenate(weight_parts)
+        if self._dead:
+            keep = np.frombuffer(bytes(self._alive), dtype=np.uint8)[slots].astype(bool)
+            slots, weights = slots[keep], weights[keep]
+            if not len(slots):
+                return []
+
+        unique_slots, inverse = np.unique(slots, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self._doc_ids[unique_slots[i]]), float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(rankings, k: int = RAG_RRF_K) -> list:
+    """Fuses ranked [(id, score)] lists: score(d) = sum(1 / (k + rank))"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+# --------------------------------------------
+# 🔹 Retriever Backends
+# --------------------------------------------
+
+# ✅ SQLite FTS5 index mirroring `documents` (external content table kept in sync by triggers)
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, content, content='documents', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    "INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')",
+]
+
+
+def create_sqlite_fts(connection):
+    """
+    🔹 Creates (or rebuilds) the SQLite FTS5 index over `documents`.
+    - Sync connection: `await conn.run_sync(create_sqlite_fts)`
+    - Existing rows are indexed; later writes are mirrored by triggers
+    """
+    for statement in SQLITE_FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def fts_match_expression(query: str) -> str:
+    """"machine learning?" -> '"machine"* OR "learning"*' (quoted, so user input can't inject FTS syntax)"""
+    return " OR ".join(f'"{token}"*' for token in tokenize(query))
+
+
+def like_pattern(query: str) -> str:
+    """"100%" -> '%100\\%%' (substring match; LIKE wildcards in user input match literally, escape '\\')"""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class FullTextRetriever:
+    """
+    🔹 SQL full-text retrieval.
+    - MySQL: MATCH ... AGAINST in boolean mode, ordered by relevance
+    - SQLite: FTS5 + bm25 ranking when `documents_fts` exists (see create_sqlite_fts)
+    - Other dialects: substring match fallback (tests / local development)
+    """
+
+    name = "fulltext"
+    max_union = 200  # ✅ Sub-selects per batched statement (SQLite caps compound SELECTs at 500 terms)
+
+    def __init__(self):
+        self._fts_databases = set()  # SQLite URLs known to have documents_fts
+
+    async def _has_sqlite_fts(self, db: AsyncSession) -> bool:
+        url = str(db.get_bind().url)
+        if url not in self._fts_databases:
+            result = await db.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'"))
+            if result.first() is None:
+                return False  # ✅ Not cached: the index may be created later
+            self._fts_databases.add(url)
+        return True
+
+    async def _statement(self, db: AsyncSession):
+        """(SELECT template with {n}-suffixed parameters, query -> parameters) for this database"""
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite" and await self._has_sqlite_fts(db):
+            sql = """
+                SELECT d.id, d.title, d.content, -bm25(documents_fts) AS score
+                FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH :match{n}
+                ORDER BY bm25(documents_fts)
+                LIMIT :top_k
+            """
+            return sql, lambda query: {"match": fts_match_expression(query)} if tokenize(query) else None
+        if dialect == "mysql":
+            sql = """
+                SELECT id, title, content, MATCH(content) AGAINST (:query{n} IN BOOLEAN MODE) AS score
+                FROM documents
+                WHERE MATCH(content) AGAINST (:query{n} IN BOOLEAN MODE)
+                ORDER BY score DESC
+                LIMIT :top_k
+            """
+            return sql, lambda query: {"query": f'+{query}*'}
+        sql = "SELECT id, title, content, 1.0 AS score FROM documents WHERE content LIKE :pattern{n} ESCAPE '\\' LIMIT :top_k"
+        return sql, lambda query: {"pattern": like_pattern(query)}
+
+    async def search(self, db: AsyncSession, query: str, top_k: int = 3) -> list:
+        sql, parameters = await self._statement(db)
+        values = parameters(query)
+        if values is None:
+            return []
+        result = await db.execute(text(sql.format(n="")), {**values, "top_k": top_k})
+        return [dict(row) for row in result.mappings().all()]
+
+    async def search_many(self, db: AsyncSession, queries, top_k: int = 3) -> list:
+        """
+        🔹 One ranked result list per query, in one round trip per `max_union` queries.
+        - Each query is its own ranked sub-select; they are combined with UNION ALL
+        """
+        sql, parameters = await self._statement(db)
+        results = [[] for _ in queries]
+        parts, values = [], {"top_k": top_k}
+        for n, query in enumerate(queries):
+            query_values = parameters(query)
+            if query_values is not None:
+                parts.append(f"SELECT {n} AS query_index, q{n}.* FROM ({sql.format(n=n)}) AS q{n}")
+                values.update({f"{name}{n}": value for name, value in query_values.items()})
+            if parts and (len(parts) == self.max_union or n == len(queries) - 1):
+                rows = (await db.execute(text(" UNION ALL ".join(parts)), values)).mappings().all()
+                for row in rows:
+                    row = dict(row)
+                    results[row.pop("query_index")].append(row)
+                parts, values = [], {"top_k": top_k}
+        return results
+
+
+class FaissRetriever:
+    """
+    🔹 Dense vector retrieval over an on-disk FAISS index of document embeddings.
+    - embedder: Any object with `async embed(texts) -> np.ndarray`
+    - index_type: "hnsw" (default), "ivf" (trained inverted lists) or "flat" (exact)
+    - mmap: Memory-map the index file on load instead of reading it into RAM
+    - Vectors are keyed by `documents.id`; rows are re-read from SQL by id
+    - Committed document changes are embedded in the background and applied
+      in memory (the on-disk file is refreshed by the next build)
+    """
+
+    name = "faiss"
+
+    def __init__(self, embedder, index_path: str = FAISS_INDEX_PATH, index_type: str = FAISS_INDEX_TYPE,
+                 mmap: bool = FAISS_MMAP, hnsw_m: int = 32, ef_search: int = 64, nlist: int = 1024, nprobe: int = 16):
+        if index_type not in ("hnsw", "ivf", "flat"):
+            raise ValueError(f"❌ Unknown FAISS index type: {index_type}")
+        self.embedder = embedder
+        self.index_path = index_path
+        self.index_type = index_type
+        self.mmap = mmap
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.index = None
+        self._read_only = False
+        self._deleted_ids = set()
+        self._pending_updates = set()
+
+    def _tune(self, index):
+        import faiss  # ✅ Imported lazily (heavy native module)
+
+        params = faiss.ParameterSpace()
+        for name, value in (("efSearch", self.ef_search), ("nprobe", self.nprobe)):
+            try:
+                params.set_index_parameter(index, name, value)
+            except RuntimeError:
+                pass  # Parameter does not apply to this index type
+        return index
+
+    def load(self) -> bool:
+        """Loads the index from disk (memory-mapped when enabled); False if it was never built"""
+        import faiss
+
+        if not os.path.exists(self.index_path):
+            return False
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if self.mmap else 0
+        self.index = self._tune(faiss.read_index(self.index_path, flags))
+        self._read_only = self.mmap
+        self._deleted_ids.clear()
+        if self.apply_changes not in document_listeners:
+            document_listeners.append(self.apply_changes)
+        return True
+
+    def apply_changes(self, upserts: dict, deleted_ids=()):
+        """Document listener: tombstones deletes and embeds upserts in the background"""
+        if self.index is None:
+            return
+        self._deleted_ids.update(deleted_ids)
+        self._deleted_ids.difference_update(upserts)
+        if upserts:
+            task = asyncio.get_running_loop().create_task(self._add_vectors(dict(upserts)))
+            self._pending_updates.add(task)
+            task.add_done_callback(self._pending_updates.discard)
+
+    async def wait_for_updates(self):
+        """Waits until background embedding of committed changes has been applied"""
+        if self._pending_updates:
+            await asyncio.gather(*list(self._pending_updates))
+
+    async def _add_vectors(self, upserts: dict):
+        import faiss
+
+        ids = np.array(list(upserts), dtype=np.int64)
+        vectors = await self.embedder.embed(list(upserts.values()))
+        if self._read_only:
+            # ✅ Memory-mapped files are read-only; switch to an in-memory copy before the first write
+            self.index = self._tune(faiss.read_index(self.index_path))
+            self._read_only = False
+        try:
+            self.index.remove_ids(ids)  # ✅ Replace previous vectors where the index type supports it
+        except RuntimeError:
+            pass  # HNSW cannot remove; duplicates are collapsed at search time
+        self.index.add_with_ids(vectors, ids)
+
+    def _new_index(self, vectors: np.ndarray):
+        import faiss
+
+        dim = vectors.shape[1]
+        if self.index_type == "ivf":
+            nlist = max(1, min(self.nlist, int(math.sqrt(len(vectors)))))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            return index
+        if self.index_type == "hnsw":
+            return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT))
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    async def build(self, db: AsyncSession, batch_size: int = 1000) -> int:
+        """
+        🔹 Embeds every document and writes a fresh index to disk.
+        - Reads `documents` in keyset batches
+        - Swaps the file atomically, then reloads it
+        - Returns the number of indexed documents
+        """
+        import faiss
+
+        ids, vectors = [], []
+        async for rows in iter_document_batches(db, batch_size):
+            ids.extend(row[0] for row in rows)
+            vectors.append(await self.embedder.embed([row[1] for row in rows]))
+        if not ids:
+            return 0
+
+        matrix = np.vstack(vectors)
+        index = self._new_index(matrix)
+        index.add_with_ids(matrix, np.array(ids, dtype=np.int64))
+
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self.load()
+        return len(ids)
+
+    async def search_ids(self, query: str, top_k: int = 3) -> list:
+        """Returns [(document id, similarity)] ranked best first"""
+        if self.index is None and not self.load():
+            return []
+        query_vector = await self.embedder.embed([query])
+        scores, ids = self.index.search(query_vector, top_k + len(self._deleted_ids))
+
+        ranked, seen = [], set()
+        for doc_id, score in zip(ids[0], scores[0]):
+            doc_id = int(doc_id)
+            if doc_id == -1 or doc_id in seen or doc_id in self._deleted_ids:
+                continue
+            seen.add(doc_id)
+            ranked.append((doc_id, float(score)))
+        return ranked[:top_k]
+
+    async def search_ids_many(self, queries, top_k: int = 3) -> list:
+        """search_ids for many queries: one embedding call and one index search over the query matrix"""
+        if not queries or (self.index is None and not self.load()):
+            return [[] for _ in queries]
+        query_vectors = await self.embedder.embed(list(queries))
+        scores, ids = self.index.search(query_vectors, top_k + len(self._deleted_ids))
+
+        results = []
+        for row_ids, row_scores in zip(ids, scores):
+            ranked, seen = [], set()
+            for doc_id, score in zip(row_ids, row_scores):
+                doc_id = int(doc_id)
+                if doc_id == -1 or doc_id in seen or doc_id in self._deleted_ids:
+                    continue
+                seen.add(doc_id)
+                ranked.append((doc_id, float(score)))
+            results.append(ranked[:top_k])
+        return results
+
+    async def search(self, db: AsyncSession, query: str, top_k: int = 3) -> list:
+        ranked = await self.search_ids(query, top_k)
+        rows = await fetch_documents_by_ids(db, [doc_id for doc_id, _ in ranked])
+        return [{**rows[doc_id], "score": score} for doc_id, score in ranked if doc_id in rows]
+
+    async def search_many(self, db: AsyncSession, queries, top_k: int = 3) -> list:
+        return await rows_for_rankings(db, await self.search_ids_many(queries, top_k))
+
+
+class BM25Retriever:
+    """
+    🔹 Lexical retrieval from the in-process BM25 index (any SQL dialect).
+    - The index is built from `documents` on first use and then kept current
+    """
+
+    name = "bm25"
+
+    def __init__(self, index: BM25Index = None):
+        self.index = index or BM25Index()
+
+    async def search_ids(self, db: AsyncSession, query: str, top_k: int = 3) -> list:
+        await self.index.ensure_built(db)
+        return self.index.search(query, top_k)
+
+    async def search(self, db: AsyncSession, query: str, top_k: int = 3) -> list:
+        ranked = await self.search_ids(db, query, top_k)
+        rows = await fetch_documents_by_ids(db, [doc_id for doc_id, _ in ranked])
+        return [{**rows[doc_id], "score": score} for doc_id, score in ranked if doc_id in rows]
+
+    async def search_ids_many(self, db: AsyncSession, queries, top_k: int = 3) -> list:
+        await self.index.ensure_built(db)
+        return [self.index.search(query, top_k) for query in queries]
+
+    async def search_many(self, db: AsyncSession, queries, top_k: int = 3) -> list:
+        return await rows_for_rankings(db, await self.search_ids_many(db, queries, top_k))
+
+
+class HybridRetriever:
+    """
+    🔹 BM25 + dense retrieval merged with reciprocal-rank fusion.
+    - Each retriever contributes `candidates` results before the top-k cut
+    - `score` in the returned rows is the fused RRF score
+    """
+
+    name = "hybrid"
+
+    def __init__(self, lexical: BM25Retriever, dense: FaissRetriever,
+                 rrf_k: int = RAG_RRF_K, candidates: int = RAG_HYBRID_CANDIDATES):
+        self.lexical = lexical
+        self.dense = dense
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+
+    async def search(self, db: AsyncSession, query: str, top_k: int = 3) -> list:
+        candidates = max(top_k, self.candidates)
+        lexical = await self.lexical.search_ids(db, query, candidates)
+        dense = await self.dense.search_ids(query, candidates)
+        fused = reciprocal_rank_fusion([lexical, dense], k=self.rrf_k)[:top_k]
+
+        rows = await fetch_documents_by_ids(db, [doc_id for doc_id, _ in fused])
+        return [{**rows[doc_id], "score": score} for doc_id, score in fused if doc_id in rows]
+
+    async def search_many(self, db: AsyncSession, queries, top_k: int = 3) -> list:
+        candidates = max(top_k, self.candidates)
+        lexical = await self.lexical.search_ids_many(db, queries, candidates)
+        dense = await self.dense.search_ids_many(queries, candidates)
+        fused = [reciprocal_rank_fusion(pair, k=self.rrf_k)[:top_k] for pair in zip(lexical, dense)]
+        return await rows_for_rankings(db, fused)
+
+
+def create_retriever(name: str = RAG_RETRIEVER, client=None):
+    """
+    🔹 Builds a retriever backend by name.
+    - client: AsyncOpenAI client, required only for the openai embedder
+    """
+    if name == "fulltext":
+        return FullTextRetriever()
+    if name == "faiss":
+        return FaissRetriever(create_embedder(RAG_EMBEDDER, client))
+    if name == "bm25":
+        return BM25Retriever()
+    if name == "hybrid":
+        return HybridRetriever(BM25Retriever(), FaissRetriever(create_embedder(RAG_EMBEDDER, client)))
+    raise ValueError(f"❌ Unknown retriever: {name}")
+
+
+if __name__ == "__main__":
+    # ✅ CLI: python retrievers.py  -> (re)builds the FAISS index from the documents table
+    from database import SessionLocal
+
+    async def _build():
+        client = None
+        if RAG_EMBEDDER == "openai":
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI()
+        retriever = FaissRetriever(create_embedder(RAG_EMBEDDER, client))
+        async with SessionLocal() as session:
+            count = await retriever.build(session)
+        print(f"✅ Indexed {count} documents into {retriever.index_path} ({retriever.index_type})")
+
+    asyncio.run(_build())
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class RevocationList:
+    """
+    🔹 Revoked session ids, held in memory only as long as they matter.
+    - add(key, ttl): key stays revoked for ttl seconds (no access token issued
+      before the revocation outlives that, so the entry can then be dropped)
+    - is_revoked(key): a single dict lookup on the request path
+    - Never evicts live entries (unlike TTLCache's LRU, which would un-revoke)
+    - loaded: set once revocations persisted by other processes have been read
+    - synced_at / needs_refresh(): revocations made by other workers are re-read
+      (incrementally) every refresh interval
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.synced_at = None  # Wall-clock start of the last read from the database
+        self.rejected = 0
+        self._refresh_at = 0.0
+        self._entries = {}  # key -> monotonic expiry
+        self._prune_at = 1024
+        self._lock = threading.Lock()
+
+    def add(self, key: str, ttl: float):
+        with self._lock:
+            expires_at = time.monotonic() + ttl
+            self._entries[key] = max(expires_at, self._entries.get(key, 0.0))
+            if len(self._entries) >= self._prune_at:
+                self._prune()
+
+    def _prune(self):
+        """Drops expired entries (caller holds the lock); amortized by doubling the threshold"""
+        now = time.monotonic()
+        self._entries = {key: expires_at for key, expires_at in self._entries.items() if expires_at > now}
+        self._prune_at = max(1024, 2 * len(self._entries))
+
+    def is_revoked(self, key: str) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at > time.monotonic():
+            self.rejected += 1
+            return True
+        with self._lock:
+            self._entries.pop(key, None)
+        return False
+
+    def needs_refresh(self, interval: float) -> bool:
+        """True before the first load and, with interval > 0, once the last sync is that old"""
+        return not self.loaded or (interval > 0 and time.monotonic() >= self._refresh_at)
+
+    def mark_synced(self, synced_at, interval: float):
+        self.synced_at = synced_at
+        self.loaded = True
+        self._refresh_at = time.monotonic() + interval
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.loaded = False
+            self.synced_at = None
+            self.rejected = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, ConfigDict
+
+# ✅ Response Models
+# Routes declare these as response_model, so FastAPI serializes the result straight to JSON bytes
+# with pydantic-core (no jsonable_encoder walk, no lazy ORM attribute access)
+
+class ProfileOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: int
+    bio: Optional[str] = None
+    version: int = 1
+    updated_at: Optional[datetime] = None
+
+class ProfilePage(BaseModel):
+    items: list[ProfileOut]
+    next_after: Optional[int] = None  # ✅ Pass as ?after= for the next page; null on the last page
+
+class ProfileBatch(BaseModel):
+    items: list[ProfileOut]
+    missing: list[int]
+
+class ProfileUpdated(BaseModel):
+    message: str
+    bio: str
+
+class RAGAnswer(BaseModel):
+    query: str
+    context: Optional[str] = None  # ✅ Omitted when the request sets include_context=false
+    context_truncated: Optional[bool] = None  # ✅ Set when context_chars cut the context short
+    answer: str
+    prompt_tokens: int
+
+# ✅ Field Selection (?fields=id,bio)
+
+def parse_fields(fields: Optional[str], model: type[BaseModel]) -> Optional[set]:
+    """
+    🔹 Parses a comma-separated ?fields= value against a response model.
+    - None / empty: every field
+    - Unknown names: 400 listing the valid ones
+    """
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - model.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))} (valid: {', '.join(model.model_fields)})",
+        )
+    return names
+
+def partial_response(content: BaseModel, include, response: Response = None) -> Response:
+    """
+    🔹 Serializes only the selected fields (pydantic-core, straight to bytes).
+    - include: pydantic include spec, e.g. {"bio"} or {"items": {"__all__": {"id"}}, "next_after": True}
+    - Headers already set on the injected `response` (ETag, Cache-Control) are carried over
+    """
+    partial = Response(content=content.model_dump_json(include=include), media_type="application/json")
+    if response is not None:
+        for name, value in response.headers.items():
+            partial.headers[name] = value
+    return partial
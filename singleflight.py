@@ -0,0 +1,102 @@
+import asyncio
+
+
+class TokenBroadcast:
+    """
+    🔹 Fans one async token stream out to any number of subscribers.
+    - The source is consumed once, in its own task (subscribers may disconnect freely)
+    - Late subscribers replay the tokens produced so far, then follow live
+    """
+
+    def __init__(self, source):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source):
+        try:
+            async for token in source:
+                self.tokens.append(token)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            waiter = self._changed  # ✅ Captured before checking, so no wake-up is lost
+            while index < len(self.tokens):
+                yield self.tokens[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await waiter.wait()
+
+
+class SingleFlight:
+    """
+    🔹 In-flight request coalescing ("single flight").
+    - Concurrent calls with the same key share one execution and its result
+    - The shared work runs in its own task, so a cancelled caller does not
+      cancel it for the others
+    - Keys are released as soon as the work finishes (no result caching)
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}  # key -> Task or TokenBroadcast
+
+    def _release(self, key, owner):
+        if self._calls.get(key) is owner:
+            del self._calls[key]
+
+    async def do(self, key, fn):
+        """Awaits fn() once per key across concurrent callers"""
+        if not self.enabled:
+            return await fn()
+
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: (self._release(key, done), done.cancelled() or done.exception()))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stream(self, key, source_factory):
+        """Returns an async iterator of tokens; concurrent callers share one source stream"""
+        if not self.enabled:
+            return source_factory()
+
+        broadcast = self._calls.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = TokenBroadcast(source_factory())
+            self._calls[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._release(key, broadcast))
+        else:
+            self.coalesced += 1
+        return broadcast.subscribe()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
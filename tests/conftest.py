@@ -0,0 +1,188 @@
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+import uvicorn
+
+# ✅ Make the top-level service modules importable & satisfy the AI key check
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("DOCUMENT_FEED_ENABLED", "false")  # ✅ Feed tests drive their own consumer against SQLite
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.gettempdir(), "fastapi-microservice-tests.log"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_read_db
+from main import app
+from auth import principal_cache, revoked_sessions
+from rag_pipeline import answer_cache
+from profile_store import profile_cache
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    """🔹 Throwaway SQLite database with all tables created"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+
+    async def _create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(_create_tables())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def session_factory(sqlite_engine):
+    return sessionmaker(bind=sqlite_engine, expire_on_commit=False, class_=AsyncSession)
+
+
+@pytest.fixture(autouse=True)
+def isolated_document_listeners():
+    """🔹 Drops index listeners registered during a test"""
+    from retrievers import document_listeners
+
+    registered = list(document_listeners)
+    yield
+    document_listeners[:] = registered
+
+
+@pytest.fixture(autouse=True)
+def fresh_ai_scheduler(monkeypatch):
+    """🔹 Gives each test its own OpenAI scheduler (breaker/rate-limit state) with short backoffs"""
+    import rag_pipeline
+    from ai_scheduler import AIScheduler
+
+    scheduler = AIScheduler(backoff_base=0.01, backoff_max=0.05)
+    monkeypatch.setattr(rag_pipeline, "ai_scheduler", scheduler)
+    return scheduler
+
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    """🔹 In-process TestClient wired to the SQLite database"""
+    import database
+
+    async def _get_test_db():
+        async with session_factory() as session:
+            yield session
+
+    monkeypatch.setattr(database, "ReadSessionLocal", session_factory)  # ✅ Shared loads open their own sessions
+    app.dependency_overrides[get_db] = _get_test_db
+    app.dependency_overrides[get_read_db] = _get_test_db
+    principal_cache.clear()
+    revoked_sessions.clear()
+    answer_cache.clear()
+    profile_cache.clear()
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+    principal_cache.clear()
+    answer_cache.clear()
+    profile_cache.clear()
+
+
+@pytest.fixture
+def test_user(client):
+    """🔹 Registers a fresh user and returns its credentials"""
+    credentials = {"username": "testuser", "email": "testuser@example.com", "password": "securepass"}
+    response = client.post("/register", json=credentials)
+    assert response.status_code == 200
+    return {**credentials, "id": response.json()["id"]}
+
+
+@pytest.fixture
+def auth_headers(client, test_user):
+    """🔹 Bearer headers for the registered test user"""
+    response = client.post("/login", json={"username": test_user["username"], "password": test_user["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def admin_headers(client, session_factory):
+    """🔹 Bearer headers for a freshly registered admin user"""
+    from sqlalchemy import update
+    from models import User
+
+    credentials = {"username": "adminuser", "email": "admin@example.com", "password": "adminpass"}
+    assert client.post("/register", json=credentials).status_code == 200
+
+    async def _promote():
+        async with session_factory() as session:
+            await session.execute(update(User).where(User.username == "adminuser").values(is_admin=True))
+            await session.commit()
+
+    asyncio.run(_promote())
+    response = client.post("/login", json={"username": credentials["username"], "password": credentials["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_openai_server():
+    """🔹 Runs a fake OpenAI server in a background thread; yields a start(**options) -> base_url factory"""
+    from fake_openai import create_fake_openai_app
+
+    servers = []
+
+    def _start(**options):
+        fake_app = create_fake_openai_app(**options)
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(fake_app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        servers.append((server, thread))
+        return f"http://127.0.0.1:{port}/v1", fake_app
+
+    yield _start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+@pytest.fixture
+def ai_backend(fake_openai_server, monkeypatch):
+    """🔹 Points rag_pipeline at a fresh fake OpenAI server; yields a configure(**options) -> fake_app helper"""
+    import httpx
+    import rag_pipeline
+    from openai import AsyncOpenAI
+
+    def _configure(**options):
+        base_url, fake_app = fake_openai_server(**options)
+        monkeypatch.setattr(rag_pipeline, "client", AsyncOpenAI(api_key="sk-test", base_url=base_url, http_client=httpx.AsyncClient(), max_retries=0))
+        return fake_app
+
+    return _configure
+
+
+@pytest.fixture
+def stub_documents(monkeypatch):
+    """🔹 Replaces full-text retrieval with a fixed document list"""
+    import rag_pipeline
+
+    documents = [
+        {"id": 1, "title": "ML", "content": "Machine learning lets computers learn from data."},
+        {"id": 2, "title": "AI", "content": "Artificial intelligence covers machine learning and more."},
+    ]
+
+    async def _get_relevant_chunks(db, query, top_k=3):
+        return documents[:top_k]
+
+    monkeypatch.setattr(rag_pipeline, "get_relevant_chunks", _get_relevant_chunks)
+    return documents
@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+import rag_pipeline
+from ai_scheduler import (
+    AIScheduler, CircuitBreaker, CircuitOpenError, PRIORITY_ADMIN, PRIORITY_USER, RateLimiter, TokenBucket,
+    parse_reset_duration,
+)
+
+
+class _Raw:
+    """🔹 Minimal stand-in for an openai raw response"""
+
+    def __init__(self, value="ok", headers=None):
+        self.value = value
+        self.headers = headers or {}
+
+    def parse(self):
+        return self.value
+
+
+def _rate_limit_error(retry_after_ms="10"):
+    request = httpx.Request("POST", "http://fake/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after-ms": retry_after_ms})
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_parse_reset_duration():
+    """✅ OpenAI reset headers are converted to seconds."""
+    assert parse_reset_duration("1s") == 1.0
+    assert parse_reset_duration("6m0s") == 360.0
+    assert parse_reset_duration("20ms") == pytest.approx(0.02)
+    assert parse_reset_duration("2") == 2.0
+    assert parse_reset_duration(None) == 0.0
+
+
+def test_token_bucket_waits_when_headers_report_exhaustion():
+    """✅ Remaining quota from the headers gates the next call."""
+    bucket = TokenBucket()
+    assert bucket.wait_time(100) == 0.0  # ✅ Unlimited until the first observation
+
+    bucket.observe(limit=1000, remaining=0, reset_seconds=10)
+    assert bucket.wait_time(100) == pytest.approx(1.0, rel=0.05)
+
+    bucket.observe(limit=1000, remaining=500, reset_seconds=10)
+    assert bucket.wait_time(100) == 0.0
+
+
+def test_rate_limiter_reads_response_headers():
+    limiter = RateLimiter()
+    limiter.observe({
+        "x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "59", "x-ratelimit-reset-requests": "1s",
+        "x-ratelimit-limit-tokens": "1000", "x-ratelimit-remaining-tokens": "10", "x-ratelimit-reset-tokens": "6m0s",
+    })
+    assert limiter.requests.level == 59
+    assert limiter.tokens.level == 10
+    assert limiter.tokens.wait_time(20) > 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_and_admins_go_first():
+    """✅ Queued admin calls get the next free slot ahead of earlier user calls."""
+    scheduler = AIScheduler(max_concurrency=1)
+    order = []
+    running = 0
+    peak = 0
+
+    def _call(name):
+        async def _run():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return _Raw(name)
+        return _run
+
+    first = asyncio.ensure_future(scheduler.run(_call("first"), PRIORITY_USER))
+    await asyncio.sleep(0)
+    users = [asyncio.ensure_future(scheduler.run(_call(f"user-{i}"), PRIORITY_USER)) for i in range(3)]
+    admin = asyncio.ensure_future(scheduler.run(_call("admin"), PRIORITY_ADMIN))
+    await asyncio.gather(first, admin, *users)
+
+    assert peak == 1
+    assert order == ["first", "admin", "user-0", "user-1", "user-2"]
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limit_errors_with_backoff():
+    scheduler = AIScheduler(backoff_base=0.001, backoff_max=0.01)
+    attempts = 0
+
+    async def _call():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise _rate_limit_error()
+        return _Raw("done")
+
+    assert await scheduler.run(_call) == "done"
+    assert attempts == 3
+    assert scheduler.stats()["retries"] == 2
+    assert scheduler.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_per_attempt_timeout_is_retried():
+    scheduler = AIScheduler(timeout=0.05, max_retries=1, backoff_base=0.001)
+    attempts = 0
+
+    async def _call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            await asyncio.sleep(1)
+        return _Raw("late but fine")
+
+    assert await scheduler.run(_call) == "late but fine"
+    assert attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_rejects_without_calling():
+    """✅ After N consecutive failures calls fail fast until the reset timeout."""
+    scheduler = AIScheduler(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+    calls = 0
+
+    async def _failing():
+        nonlocal calls
+        calls += 1
+        raise _rate_limit_error("1")
+
+    for _ in range(2):
+        with pytest.raises(RateLimitError):
+            await scheduler.run(_failing)
+    with pytest.raises(CircuitOpenError):
+        await scheduler.run(_failing)
+    assert calls == 2
+
+    await asyncio.sleep(0.11)
+
+    async def _healthy():
+        return _Raw("recovered")
+
+    assert scheduler.breaker.state == "half_open"
+    assert await scheduler.run(_healthy) == "recovered"
+    assert scheduler.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_returns_deterministic_fallback(ai_backend, fresh_ai_scheduler):
+    ai_backend()
+    fresh_ai_scheduler.breaker.opened_at = time.monotonic()
+
+    assert await rag_pipeline.generate_response_with_ai("context", "query") == rag_pipeline.AI_FALLBACK_RESPONSE
+    assert [token async for token in rag_pipeline.stream_response_with_ai("context", "query")] == [
+        rag_pipeline.AI_FALLBACK_RESPONSE
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_recovers_from_429_and_tracks_quota(ai_backend, fresh_ai_scheduler):
+    """✅ A 429 from OpenAI is retried and the x-ratelimit-* headers feed the limiter."""
+    fake_app = ai_backend(answer="Answer after retry.", rpm=100)
+    fake_app.state.fail_next = 1
+
+    assert await rag_pipeline.generate_response_with_ai("context", "query") == "Answer after retry."
+    stats = fresh_ai_scheduler.stats()
+    assert stats["retries"] == 1
+    assert stats["remaining_requests"] == pytest.approx(99, abs=1)
@@ -0,0 +1,78 @@
+import pytest
+
+from answer_cache import AnswerCache, CACHE_HIT, CACHE_MISS, CACHE_SEMANTIC_HIT, normalize_query
+from retrievers import HashingEmbedder, document_listeners, notify_document_changes
+
+DOCUMENTS = [{"id": 1, "title": "ML", "content": "Machine learning lets computers learn from data."}]
+
+
+@pytest.fixture
+def make_cache():
+    """🔹 Builds AnswerCaches and detaches their document listeners afterwards"""
+    caches = []
+
+    def _make(**options):
+        caches.append(AnswerCache(**options))
+        return caches[-1]
+
+    yield _make
+    for cache in caches:
+        cache.close()
+        assert cache.apply_changes not in document_listeners
+
+
+def test_normalize_query_ignores_case_whitespace_and_punctuation():
+    assert normalize_query("  What is   Machine Learning?? ") == "what is machine learning"
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_requires_same_chunk_versions(make_cache):
+    """✅ A changed chunk (new content version) is a miss even for the same question."""
+    cache = make_cache()
+    await cache.set("What is ML?", DOCUMENTS, "An answer.")
+
+    assert await cache.get("what is ml", DOCUMENTS) == ("An answer.", CACHE_HIT)
+    changed = [{**DOCUMENTS[0], "content": "Updated content."}]
+    assert await cache.get("what is ml", changed) == (None, CACHE_MISS)
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_questions_hit_semantically(make_cache):
+    """✅ Similar questions over the same chunks reuse the answer."""
+    cache = make_cache(embedder=HashingEmbedder(dim=256), similarity_threshold=0.8)
+    await cache.set("what is machine learning used for", DOCUMENTS, "An answer.")
+
+    assert await cache.get("what is machine learning used for today", DOCUMENTS) == ("An answer.", CACHE_SEMANTIC_HIT)
+    assert (await cache.get("how do volcanoes erupt", DOCUMENTS))[1] == CACHE_MISS
+
+
+@pytest.mark.asyncio
+async def test_document_changes_and_byte_bound_evict_entries(make_cache):
+    """✅ Source document changes invalidate; the byte budget evicts LRU entries."""
+    cache = make_cache(max_bytes=1200)
+    await cache.set("q1", DOCUMENTS, "a" * 400)
+    await cache.set("q2", [{"id": 2, "title": "X", "content": "Other."}], "b" * 400)
+    await cache.set("q3", [{"id": 3, "title": "Y", "content": "More."}], "c" * 400)
+
+    assert (await cache.get("q1", DOCUMENTS))[1] == CACHE_MISS  # evicted by size
+    assert cache.stats()["bytes"] <= 1200
+
+    notify_document_changes({2: "Changed."})
+    assert (await cache.get("q2", [{"id": 2, "title": "X", "content": "Other."}]))[1] == CACHE_MISS
+    assert (await cache.get("q3", [{"id": 3, "title": "Y", "content": "More."}]))[1] == CACHE_HIT
+
+
+def test_repeat_rag_query_skips_completion(client, auth_headers, stub_documents, ai_backend):
+    """✅ Repeats return the cached answer with X-Cache: HIT and no OpenAI call."""
+    fake_app = ai_backend(answer="Cached answer.")
+
+    first = client.post("/rag/query", json={"query": "Machine learning?"}, headers=auth_headers)
+    second = client.post("/rag/query", json={"query": "machine   learning"}, headers=auth_headers)
+    streamed = client.post("/rag/query", json={"query": "machine learning", "stream": True}, headers=auth_headers)
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json()["answer"] == "Cached answer."
+    assert streamed.headers["X-Cache"] == "HIT"
+    assert '"delta": "Cached answer."' in streamed.text
+    assert fake_app.state.requests == 1
@@ -0,0 +1,114 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.future import select
+
+from change_feed import DocumentChangeFeed
+from models import Document, DocumentChange
+from retrievers import document_listeners
+
+
+async def _log(session_factory):
+    async with session_factory() as session:
+        rows = (await session.execute(select(DocumentChange).order_by(DocumentChange.id))).scalars().all()
+        return [(row.document_id, row.operation, row.version) for row in rows]
+
+
+async def _append(session_factory, *rows):
+    """Writes log rows as another process would (foreign origin)"""
+    async with session_factory() as session:
+        session.add_all([DocumentChange(origin="other-worker", **row) for row in rows])
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_orm_writes_are_logged_in_the_same_transaction(session_factory):
+    """✅ Insert / update / delete append versioned log rows; a rollback leaves none."""
+    async with session_factory() as session:
+        document = Document(title="Doc", content="first")
+        session.add(document)
+        await session.commit()
+        document.content = "second"
+        await session.commit()
+        await session.delete(document)
+        await session.commit()
+
+        session.add(Document(title="Discarded", content="never committed"))
+        await session.flush()
+        await session.rollback()
+
+    assert await _log(session_factory) == [(document.id, "upsert", 1), (document.id, "upsert", 2), (document.id, "delete", None)]
+
+
+@pytest.mark.asyncio
+async def test_feed_applies_foreign_changes_and_skips_own(session_factory):
+    """✅ Other workers' changes reach listeners (last op per document); this worker's rows are skipped."""
+    received = []
+    document_listeners.append(lambda upserts, deleted_ids: received.append((upserts, deleted_ids)))
+    feed = DocumentChangeFeed(session_factory=session_factory, gap_timeout=60)
+    assert await feed.poll() == 0  # ✅ First poll only positions at the end of the log
+
+    async with session_factory() as session:
+        kept, removed = Document(title="Kept", content="kept content"), Document(title="Removed", content="gone")
+        session.add_all([kept, removed])
+        await session.commit()  # ✅ Own write: applied by the commit hook, not by the feed
+    received.clear()
+
+    await _append(
+        session_factory,
+        {"document_id": kept.id, "operation": "upsert", "version": 2},
+        {"document_id": removed.id, "operation": "upsert", "version": 2},
+        {"document_id": removed.id, "operation": "delete"},
+    )
+    assert await feed.poll() == 5
+    assert received == [({kept.id: "kept content"}, {removed.id})]
+    assert feed.applied == 5 and feed.lag_seconds == 0.0
+
+    assert await feed.poll() == 0
+    assert len(received) == 1
+
+
+@pytest.mark.asyncio
+async def test_feed_waits_for_gaps_then_skips_them(session_factory):
+    """✅ A hole in the log ids holds the feed back (lag reported) until gap_timeout passes."""
+    received = []
+    document_listeners.append(lambda upserts, deleted_ids: received.append(deleted_ids))
+    feed = DocumentChangeFeed(session_factory=session_factory, gap_timeout=0.2)
+    await feed.poll()
+
+    # ✅ Id 1 is "in flight" (uncommitted or rolled back); id 2 is already visible
+    await _append(session_factory, {"id": 2, "document_id": 7, "operation": "delete",
+                                    "changed_at": datetime.utcnow() - timedelta(seconds=3)})
+    assert await feed.poll() == 0
+    assert feed.position == 0 and received == []
+    assert feed.lag_seconds >= 3
+
+    time.sleep(0.25)
+    assert await feed.poll() == 1
+    assert feed.position == 2 and received == [{7}]
+    assert feed.lag_seconds == 0.0
+
+    # ✅ The slow writer behind id 1 commits after all: applied on a re-check, not lost
+    await _append(session_factory, {"id": 1, "document_id": 8, "operation": "delete"})
+    time.sleep(0.25)
+    assert await feed.poll() == 0
+    assert received == [{7}, {8}]
+    assert feed.gaps_skipped == 1 and feed.late_applied == 1 and feed.stats()["rechecking"] == 0
+
+
+@pytest.mark.asyncio
+async def test_feed_reports_lag_for_a_backlog_beyond_one_batch(session_factory):
+    """✅ Lag stays non-zero while more rows than batch_size are waiting, then drops to 0."""
+    feed = DocumentChangeFeed(session_factory=session_factory, batch_size=2)
+    await feed.poll()
+    changed_at = datetime.utcnow() - timedelta(seconds=30)
+    await _append(session_factory, *({"document_id": doc_id, "operation": "delete", "changed_at": changed_at}
+                                     for doc_id in range(1, 6)))
+
+    assert await feed.poll() == 2
+    assert feed.lag_seconds >= 30
+    assert await feed.poll() == 2
+    assert feed.lag_seconds >= 30
+    assert await feed.poll() == 1
+    assert feed.lag_seconds == 0.0
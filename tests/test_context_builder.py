@@ -0,0 +1,83 @@
+from context_builder import assemble_context, count_tokens, trim_to_relevant_sentences, truncate_to_tokens
+
+LONG_TEXT = " ".join(f"filler{i} words here." for i in range(400))
+
+
+def test_context_respects_token_budget_and_score_order():
+    """✅ Higher-scored passages come first and the budget is never exceeded."""
+    documents = [
+        {"id": 1, "title": "Low", "content": "Low relevance passage about cooking.", "score": 0.1},
+        {"id": 2, "title": "High", "content": "High relevance passage about machine learning.", "score": 0.9},
+        {"id": 3, "title": "Long", "content": LONG_TEXT, "score": 0.5},
+    ]
+
+    assembled = assemble_context(documents, "machine learning", token_budget=200)
+
+    assert [passage["id"] for passage in assembled["passages"]][:2] == [2, 3]
+    assert assembled["context"].startswith("High relevance passage")
+    assert count_tokens(assembled["context"]) <= 200
+    assert assembled["context_tokens"] <= 200
+    assert assembled["dropped_over_budget"] == 1  # the low-score passage no longer fits
+
+
+def test_near_duplicate_passages_are_dropped():
+    """✅ A passage that repeats a better one is skipped."""
+    documents = [
+        {"id": 1, "title": "A", "content": "Blockchain is a decentralized ledger used by cryptocurrencies.", "score": 2.0},
+        {"id": 2, "title": "B", "content": "Blockchain is a decentralized ledger used by cryptocurrencies!", "score": 1.0},
+        {"id": 3, "title": "C", "content": "Photosynthesis converts sunlight into energy.", "score": 0.5},
+    ]
+
+    assembled = assemble_context(documents, "blockchain", token_budget=500)
+
+    assert [passage["id"] for passage in assembled["passages"]] == [1, 3]
+    assert assembled["dropped_duplicates"] == 1
+
+
+def test_sentence_trimming_keeps_query_relevant_sentences():
+    """✅ Trimming keeps only sentences that mention the query, in order."""
+    text = "Cats sleep a lot. Machine learning needs data. Dogs bark. Learning rates matter in machine learning."
+
+    trimmed = trim_to_relevant_sentences(text, "machine learning", max_tokens=100)
+
+    assert trimmed == "Machine learning needs data. Learning rates matter in machine learning."
+    assert assemble_context(
+        [{"id": 1, "title": "T", "content": text}], "machine learning", trim_sentences=True,
+    )["context"] == trimmed
+
+
+def test_truncate_to_tokens_cuts_on_word_boundary():
+    truncated = truncate_to_tokens(LONG_TEXT, 50)
+    assert 0 < count_tokens(truncated) <= 50
+    assert LONG_TEXT.startswith(truncated)
+
+
+def test_rag_response_reports_prompt_tokens(client, auth_headers, stub_documents, ai_backend):
+    """✅ Each /rag/query response reports the prompt size."""
+    ai_backend(answer="Answer.")
+
+    response = client.post("/rag/query", json={"query": "machine learning"}, headers=auth_headers)
+
+    assert response.json()["prompt_tokens"] > 0
+    assert response.headers["X-Prompt-Tokens"] == str(response.json()["prompt_tokens"])
+
+
+def test_encoding_loads_on_first_use_and_falls_back_offline(monkeypatch):
+    """✅ The tokenizer isn't fetched at import; a failed load falls back to the estimate, once."""
+    import context_builder
+
+    calls = []
+
+    class _OfflineTiktoken:
+        @staticmethod
+        def get_encoding(name):
+            calls.append(name)
+            raise OSError("network unreachable")
+
+    monkeypatch.setattr(context_builder, "tiktoken", _OfflineTiktoken)
+    monkeypatch.setattr(context_builder, "_encoding", None)
+    monkeypatch.setattr(context_builder, "_encoding_loaded", False)
+
+    assert calls == []
+    assert count_tokens("machine learning") == count_tokens("machine learning") > 0
+    assert calls == ["o200k_base"]
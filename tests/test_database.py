@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+import database
+from auth import principal_cache
+from main import app
+from models import Profile
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """🔹 Two SQLite files standing in for primary and replica; yields (client, primary, replica) factories"""
+    engines = {name: create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db", poolclass=NullPool)
+               for name in ("primary", "replica")}
+
+    async def _create_tables():
+        for engine in engines.values():
+            async with engine.begin() as conn:
+                await conn.run_sync(database.Base.metadata.create_all)
+
+    asyncio.run(_create_tables())
+    primary = sessionmaker(bind=engines["primary"], expire_on_commit=False, class_=AsyncSession)
+    replica = sessionmaker(bind=engines["replica"], expire_on_commit=False, class_=AsyncSession,
+                           sync_session_class=database.ReadOnlySession)
+    monkeypatch.setattr(database, "SessionLocal", primary)
+    monkeypatch.setattr(database, "ReadSessionLocal", replica)
+    principal_cache.clear()
+    with TestClient(app) as client:
+        yield client, primary, replica
+    principal_cache.clear()
+    for engine in engines.values():
+        asyncio.run(engine.dispose())
+
+
+def _replicate(primary, replica, table):
+    """🔹 Copies every row of table from primary to replica (simulated replication)"""
+    async def _copy():
+        async with primary() as source:
+            rows = (await source.execute(text(f"SELECT * FROM {table}"))).mappings().all()
+        async with AsyncSession(bind=replica.kw["bind"]) as target:  # ✅ Plain session: replication bypasses the read-only guard
+            for row in rows:
+                columns = ", ".join(row.keys())
+                await target.execute(text(f"INSERT INTO {table} ({columns}) VALUES ({', '.join(':' + c for c in row.keys())})"), dict(row))
+            await target.commit()
+
+    asyncio.run(_copy())
+
+
+def _login(client):
+    credentials = {"username": "replicauser", "email": "replica@example.com", "password": "securepass"}
+    user_id = client.post("/register", json=credentials).json()["id"]
+    token = client.post("/login", json={"username": "replicauser", "password": "securepass"}).json()["access_token"]
+    return user_id, {"Authorization": f"Bearer {token}"}
+
+
+def test_writes_go_to_primary_and_reads_to_replica(replicated):
+    client, primary, replica = replicated
+    user_id, headers = _login(client)
+
+    # ✅ Not replicated yet: the principal lookup falls back to the primary
+    assert client.put("/profile", json={"bio": "primary bio"}, headers=headers).status_code == 200
+    _replicate(primary, replica, "users")
+    _replicate(primary, replica, "profiles")
+
+    async def _diverge_primary():
+        async with primary() as session:
+            await session.execute(text("UPDATE profiles SET bio = 'newer primary bio'"))
+            await session.commit()
+
+    asyncio.run(_diverge_primary())
+
+    response = client.get(f"/profile/{user_id}", headers=headers)
+    assert response.json()["bio"] == "primary bio"  # ✅ Served by the (lagging) replica
+    assert client.get("/profile", headers=headers).json()["bio"] == "newer primary bio"  # ✅ Read-your-writes path
+
+
+def test_replica_session_rejects_writes(replicated):
+    _, _, replica = replicated
+
+    async def _write():
+        async with replica() as session:
+            session.add(Profile(user_id=1, bio="nope"))
+            await session.commit()
+
+    with pytest.raises(RuntimeError, match="read-only"):
+        asyncio.run(_write())
+
+
+def test_engine_options_from_environment():
+    options = database.engine_options("mysql+asyncmy://root@localhost/fastapi_db")
+    assert options["echo"] is False
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] == database.DB_POOL_SIZE
+
+    assert "pool_size" not in database.engine_options("sqlite+aiosqlite:///:memory:")
+    assert not database.has_replica()
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from hashing import HashingExecutor
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_roundtrip():
+    """✅ Hashes produced on the pool verify correctly."""
+    hasher = HashingExecutor(max_workers=2)
+    hashed = await hasher.hash("securepass")
+
+    assert await hasher.verify("securepass", hashed)
+    assert not await hasher.verify("wrongpass", hashed)
+    assert hasher.stats()["completed"] == 3
+    assert hasher.stats()["hash_seconds_max"] > 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_while_hashing():
+    """✅ Other coroutines keep running while bcrypt is busy."""
+    hasher = HashingExecutor(max_workers=1)
+    ticks = 0
+
+    async def _ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(_ticker())
+    await hasher.hash("securepass")
+    ticker.cancel()
+
+    assert ticks > 5
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_returns_503_with_retry_after():
+    """✅ Jobs beyond workers + queue are rejected with backpressure."""
+    hasher = HashingExecutor(max_workers=1, max_queue=1, retry_after=3)
+    running = [asyncio.create_task(hasher.run(time.sleep, 0.2)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    assert hasher.queue_depth == 1
+    with pytest.raises(HTTPException) as exc_info:
+        await hasher.run(time.sleep, 0.2)
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "3"
+    assert hasher.stats()["rejected"] == 1
+    await asyncio.gather(*running)
+    hasher.shutdown()
+
+
+def test_invalid_login_is_401(client, test_user):
+    """✅ Wrong passwords are rejected (not masked as a server error)."""
+    response = client.post("/login", json={"username": test_user["username"], "password": "wrongpass"})
+    assert response.status_code == 401
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from ingestion import Chunker, DocumentIngestor
+from models import Document
+from retrievers import BM25Index, FaissRetriever, HashingEmbedder
+
+
+@pytest_asyncio.fixture
+async def session(session_factory):
+    async with session_factory() as db_session:
+        yield db_session
+
+
+def test_chunker_emits_overlapping_bounded_chunks():
+    """✅ Chunks hold at most max_tokens words and share `overlap` words."""
+    chunker = Chunker(max_tokens=4, overlap=1)
+    words = [f"w{i}" for i in range(10)]
+
+    chunks = chunker.feed(" ".join(words[:3])) + chunker.feed(" ".join(words[3:])) + chunker.flush()
+
+    assert chunks == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert Chunker(max_tokens=4, overlap=1).flush() == []
+
+
+@pytest.mark.asyncio
+async def test_ingestor_dedups_and_bulk_inserts_in_batches(session):
+    """✅ Duplicate chunks are skipped within a run and against stored rows."""
+    lines = [
+        json.dumps({"title": "A", "content": "alpha beta gamma"}),
+        json.dumps({"title": "B", "content": "Alpha  BETA gamma"}),  # same normalized content
+        json.dumps({"title": "C", "content": "delta epsilon"}),
+        json.dumps({"title": "D", "content": "zeta eta"}),
+    ]
+    ingestor = DocumentIngestor(session, chunk_tokens=8, overlap=2, batch_size=2)
+    await ingestor.add_ndjson(lines)
+    await ingestor.flush()
+
+    assert ingestor.stats == {"documents": 4, "chunks": 4, "inserted": 3, "duplicates": 1}
+
+    again = DocumentIngestor(session, batch_size=2)
+    await again.add_ndjson(lines[2:])
+    await again.flush()
+    assert again.stats["inserted"] == 0
+    assert (await session.execute(select(func.count(Document.id)))).scalar() == 3
+
+
+@pytest.mark.asyncio
+async def test_ingestion_updates_indexes_incrementally(session, tmp_path):
+    """✅ BM25 and FAISS indexes see new chunks without a rebuild."""
+    session.add(Document(title="Seed", content="Photosynthesis converts sunlight."))
+    await session.commit()
+
+    bm25 = BM25Index()
+    await bm25.build(session)
+    dense = FaissRetriever(HashingEmbedder(dim=64), index_path=str(tmp_path / "docs.index"), index_type="flat")
+    await dense.build(session)
+
+    ingestor = DocumentIngestor(session)
+    await ingestor.add_text("Ledger", ["Blockchain is a decentralized ledger."])
+    await ingestor.flush()
+    await dense.wait_for_updates()
+
+    assert len(bm25.search("ledger")) == 1
+    assert (await dense.search(session, "decentralized ledger", top_k=1))[0]["title"] == "Ledger"
+
+
+def test_ingest_endpoint_requires_admin(client, auth_headers):
+    """✅ Regular users cannot ingest documents."""
+    response = client.post("/rag/documents?title=Notes", content=b"some text", headers=auth_headers)
+    assert response.status_code == 403
+
+
+def test_ingest_endpoint_streams_ndjson_and_text(client, admin_headers):
+    """✅ Admins can upload NDJSON batches and plain-text documents."""
+    body = "\n".join(json.dumps({"title": f"Doc {i}", "content": f"document number {i}"}) for i in range(5))
+    response = client.post(
+        "/rag/documents", content=body.encode(), headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 5
+
+    response = client.post("/rag/documents?title=Notes", content=b"plain text body\nsecond line", headers=admin_headers)
+    assert response.json() == {"documents": 1, "chunks": 1, "inserted": 1, "duplicates": 0}
+
+    response = client.post(
+        "/rag/documents", content=b"{not json}", headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,80 @@
+import json
+import logging
+import queue
+import time
+
+from logging_config import DebugSampler, JsonFormatter, NonBlockingQueueHandler, build_pipeline, parse_levels
+
+
+def _record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("auth", level, __file__, 10, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_emits_structured_fields():
+    line = JsonFormatter().format(_record(username="alice"))
+    payload = json.loads(line)
+
+    assert payload["message"] == "hello world"
+    assert payload["level"] == "INFO"
+    assert payload["logger"] == "auth"
+    assert payload["username"] == "alice"
+
+
+def test_debug_records_are_sampled():
+    sampler = DebugSampler(rate=0.0)
+
+    assert sampler.filter(_record(logging.INFO))
+    assert not sampler.filter(_record(logging.DEBUG))
+    assert sampler.filter(_record(logging.DEBUG, sample_rate=1.0))  # ✅ Per-record override
+    assert sampler.sampled_out == 1
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """✅ Logging never waits on the writer: overflow is counted and dropped."""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("tests.nonblocking")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        started = time.perf_counter()
+        for _ in range(100):
+            logger.warning("burst")
+        assert time.perf_counter() - started < 0.5
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 99
+
+
+def test_pipeline_writes_json_lines_and_rotates(tmp_path):
+    path = tmp_path / "app.log"
+    handler, listener = build_pipeline(str(path), max_bytes=2000, backup_count=2, sample_rate=1.0)
+    logger = logging.getLogger("tests.pipeline")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    listener.start()
+    try:
+        for index in range(100):
+            logger.info("event %d", index, extra={"index": index})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        listener.stop()
+        logger.removeHandler(handler)
+        for file_handler in listener.handlers:
+            file_handler.close()
+
+    assert (tmp_path / "app.log.1").exists()
+    last = [json.loads(line) for line in path.read_text().splitlines()][-1]
+    assert last["message"] == "failed"
+    assert "ValueError: boom" in last["exc"]
+
+
+def test_parse_levels():
+    assert parse_levels("auth=debug, httpx=WARNING,,bad") == {"auth": "DEBUG", "httpx": "WARNING"}
@@ -0,0 +1,90 @@
+import pytest
+
+import metrics
+from metrics import Histogram, span, timed
+from profile_store import profile_cache
+
+
+def _stage_count(stage: str) -> int:
+    return metrics.STAGE_LATENCY.count(stage)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5.0, "a")
+
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="a"} 3' in lines
+    assert 'demo_seconds_sum{stage="a"} 5.550000' in lines
+
+
+@pytest.mark.asyncio
+async def test_spans_and_decorators_record_stages():
+    @timed("demo_async")
+    async def _work():
+        return 42
+
+    @timed("demo_agen")
+    async def _tokens():
+        yield "a"
+        yield "b"
+
+    before = (_stage_count("demo_async"), _stage_count("demo_agen"), _stage_count("demo_block"))
+    assert await _work() == 42
+    assert [token async for token in _tokens()] == ["a", "b"]
+    with span("demo_block"):
+        pass
+
+    assert (_stage_count("demo_async"), _stage_count("demo_agen"), _stage_count("demo_block")) == tuple(n + 1 for n in before)
+
+
+def test_metrics_endpoint_is_admin_only(client, auth_headers, admin_headers):
+    assert client.get("/metrics", headers=auth_headers).status_code == 403
+
+    response = client.get("/metrics", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/metrics",status="403"}' in body
+    assert 'stage_duration_seconds_count{stage="jwt_decode"}' in body
+    assert 'stage_duration_seconds_count{stage="password_verify"}' in body
+    assert 'stage_duration_seconds_count{stage="db"}' in body
+    assert 'cache_entries{cache="principal"}' in body
+
+
+def test_routes_are_labelled_by_template(client, auth_headers):
+    status = str(client.get("/profile/424242", headers=auth_headers).status_code)
+    before = metrics.REQUESTS.value("GET", "/profile/{user_id}", status)
+    client.get("/profile/434343", headers=auth_headers)
+    client.get("/no-such-route")
+
+    assert metrics.REQUESTS.value("GET", "/profile/{user_id}", status) == before + 1
+    assert metrics.REQUESTS.value("GET", "unmatched", "404") >= 1
+
+
+def test_rag_query_records_completion_stage(client, auth_headers, stub_documents, ai_backend):
+    ai_backend(answer="Machine learning learns from data.")
+    before = (_stage_count("completion"), _stage_count("get_current_user"))
+
+    assert client.post("/rag/query", json={"query": "what is ml"}, headers=auth_headers).status_code == 200
+
+    assert _stage_count("completion") == before[0] + 1
+    assert _stage_count("get_current_user") == before[1] + 1
+
+
+def test_server_timing_header(client, auth_headers, monkeypatch):
+    assert "server-timing" not in client.get("/profile", headers=auth_headers).headers
+
+    monkeypatch.setattr(metrics, "METRICS_SERVER_TIMING", True)
+    profile_cache.clear()  # ✅ Read through to the database
+    response = client.get("/profile", headers=auth_headers)
+
+    header = response.headers["server-timing"]
+    assert "get_current_user;dur=" in header
+    assert "db;dur=" in header
+    assert header.rsplit(", ", 1)[-1].startswith("total;dur=")
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from sqlalchemy import event
+from sqlalchemy.future import select
+
+from auth import principal_cache
+from cache import TTLCache
+from models import User
+
+
+def _count_user_lookups(engine):
+    """🔹 Counts SELECTs against `users` issued through the engine"""
+    counter = {"selects": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            counter["selects"] += 1
+
+    return counter
+
+
+def test_warm_principal_skips_database(client, auth_headers, sqlite_engine):
+    """✅ The second authenticated request is served without a users lookup."""
+    counter = _count_user_lookups(sqlite_engine)
+
+    assert client.get("/profile", headers=auth_headers).status_code == 200
+    lookups_after_first = counter["selects"]
+    assert client.get("/profile", headers=auth_headers).status_code == 200
+
+    assert lookups_after_first == 1
+    assert counter["selects"] == 1
+    assert principal_cache.hits >= 1
+
+
+def test_principal_invalidated_on_admin_change(client, auth_headers, session_factory, test_user):
+    """✅ Flipping is_admin evicts the cached principal."""
+    client.get("/profile", headers=auth_headers)
+    assert principal_cache.get(test_user["username"]) is not None
+
+    async def _promote():
+        async with session_factory() as session:
+            result = await session.execute(select(User).where(User.username == test_user["username"]))
+            result.scalars().first().is_admin = True
+            await session.commit()
+
+    asyncio.run(_promote())
+    assert principal_cache.get(test_user["username"]) is None
+
+    response = client.get("/admin", headers=auth_headers)
+    assert response.status_code == 200
+
+
+def test_ttl_expiry_and_lru_eviction():
+    """✅ Entries expire after the TTL and the oldest entry is evicted when full."""
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # evicts "b" (least recently used)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_disabled_cache_never_stores():
+    """✅ The enable switch turns the cache into a pass-through."""
+    cache = TTLCache(enabled=False)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
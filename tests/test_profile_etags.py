@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import event
+
+import profile_store
+
+
+def _capture_profile_sql(engine):
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *args: statements.append(sql) if "profiles" in sql else None)
+    return statements
+
+
+def test_revalidation_is_a_304_without_a_query(client, auth_headers, sqlite_engine):
+    """✅ If-None-Match with the current ETag -> 304 from the profile cache, no profile SELECT."""
+    first = client.get("/profile", headers=auth_headers)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == profile_store.PROFILE_CACHE_CONTROL
+    assert first.json()["version"] == 1
+    statements = _capture_profile_sql(sqlite_engine)
+
+    second = client.get("/profile", headers={**auth_headers, "If-None-Match": etag})
+
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert second.content == b""
+    assert statements == []
+
+
+def test_update_bumps_version_and_invalidates(client, auth_headers, test_user):
+    etag = client.get("/profile", headers=auth_headers).headers["etag"]
+
+    updated = client.put("/profile", json={"bio": "New bio"}, headers=auth_headers)
+    assert updated.headers["etag"] != etag
+
+    response = client.get("/profile", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["bio"] == "New bio"
+    assert response.json()["version"] == 2
+    assert response.headers["etag"] == updated.headers["etag"]
+    assert client.get(f"/profile/{test_user['id']}", headers={**auth_headers, "If-None-Match": f"W/{updated.headers['etag']}"}).status_code == 304
+
+
+def test_if_match_rejects_stale_writes(client, auth_headers):
+    """✅ Optimistic concurrency: the second writer holding an old ETag gets 412 and changes nothing."""
+    etag = client.get("/profile", headers=auth_headers).headers["etag"]
+
+    assert client.put("/profile", json={"bio": "writer one"}, headers={**auth_headers, "If-Match": etag}).status_code == 200
+    stale = client.put("/profile", json={"bio": "writer two"}, headers={**auth_headers, "If-Match": etag})
+    assert stale.status_code == 412
+    assert client.get("/profile", headers=auth_headers).json()["bio"] == "writer one"
+
+    assert client.delete("/profile", headers={**auth_headers, "If-Match": etag}).status_code == 412
+    current = client.get("/profile", headers=auth_headers).headers["etag"]
+    assert client.delete("/profile", headers={**auth_headers, "If-Match": current}).status_code == 200
+    assert client.delete("/profile", headers=auth_headers).status_code == 404
+
+
+def test_missing_profile_is_a_404(client, auth_headers):
+    assert client.get("/profile/987654", headers=auth_headers).status_code == 404
+
+
+@pytest.mark.parametrize("header, weak, expected", [
+    ('"1-2"', True, True),
+    ('"1-1", "1-2"', False, True),
+    ('W/"1-2"', True, True),
+    ('W/"1-2"', False, False),
+    ("*", False, True),
+    ('"1-3"', True, False),
+    (None, True, False),
+])
+def test_etag_matching(header, weak, expected):
+    assert profile_store.etag_matches(header, '"1-2"', weak=weak) is expected
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql, postgresql
+
+import profile_store
+
+
+def _capture_sql(engine):
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    return statements
+
+
+def test_get_profile_creates_once(client, auth_headers, test_user):
+    first = client.get("/profile", headers=auth_headers).json()
+    second = client.get("/profile", headers=auth_headers).json()
+
+    assert first == second
+    assert first["user_id"] == test_user["id"]
+    assert first["bio"] == "This is a new profile."
+
+
+def test_update_profile_is_a_single_statement(client, auth_headers, sqlite_engine):
+    """✅ PUT /profile writes with one upsert instead of SELECT + UPDATE + refresh."""
+    client.get("/profile", headers=auth_headers)
+    statements = _capture_sql(sqlite_engine)
+
+    response = client.put("/profile", json={"bio": "Updated bio"}, headers=auth_headers)
+
+    assert response.json() == {"message": "Profile updated successfully", "bio": "Updated bio"}
+    profile_statements = [sql for sql in statements if "profiles" in sql]
+    assert len(profile_statements) == 1
+    assert "ON CONFLICT" in profile_statements[0] and "RETURNING" in profile_statements[0]
+    assert client.get("/profile", headers=auth_headers).json()["bio"] == "Updated bio"
+
+
+def test_update_creates_missing_profile(client, auth_headers, test_user):
+    client.put("/profile", json={"bio": "First bio"}, headers=auth_headers)
+
+    profile = client.get("/profile", headers=auth_headers).json()
+    assert profile["bio"] == "First bio"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_reads_do_not_collide(session_factory, client, test_user):
+    """✅ Racing create-if-missing calls return the same row instead of a duplicate-key error."""
+    async def _read():
+        async with session_factory() as session:
+            return await profile_store.get_or_create_profile(session, test_user["id"], "This is a new profile.")
+
+    profiles = await asyncio.gather(*(_read() for _ in range(8)))
+
+    assert len({profile["id"] for profile in profiles}) == 1
+
+
+@pytest.mark.asyncio
+async def test_create_if_missing_keeps_existing_bio(session_factory, client, test_user):
+    async with session_factory() as session:
+        await profile_store.upsert_profile_bio(session, test_user["id"], "Custom")
+        profile = await profile_store._upsert(session, test_user["id"], "Default", overwrite=False)
+
+    assert profile["bio"] == "Custom"
+
+
+@pytest.mark.parametrize("dialect, expected", [
+    (mysql.dialect(), "ON DUPLICATE KEY UPDATE bio = VALUES(bio)"),
+    (postgresql.dialect(), "ON CONFLICT (user_id) DO UPDATE SET bio = excluded.bio, version = (profiles.version +"),
+])
+def test_upsert_statement_per_dialect(dialect, expected):
+    statement = profile_store._upsert_statement(dialect, 1, "bio", overwrite=True)
+
+    assert expected in str(statement.compile(dialect=dialect))
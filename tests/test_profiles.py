@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from models import Profile, User
+
+
+@pytest.fixture
+def seeded_profiles(client, session_factory, test_user):
+    """🔹 One profile for the test user plus 25 profiles of other users; returns the test user's profile id"""
+    async def _seed():
+        async with session_factory() as session:
+            others = [User(username=f"other{i}", email=f"other{i}@example.com", hashed_password="x") for i in range(25)]
+            session.add_all(others)
+            await session.flush()
+            own = Profile(user_id=test_user["id"], bio="mine")
+            session.add_all([Profile(user_id=other.id, bio=f"bio {other.id}") for other in others[:12]] + [own]
+                            + [Profile(user_id=other.id, bio=f"bio {other.id}") for other in others[12:]])
+            await session.commit()
+            return own.id
+
+    return asyncio.run(_seed())
+
+
+def _capture_sql(session_factory):
+    statements = []
+    engine = session_factory.kw["bind"].sync_engine
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    return statements
+
+
+def test_users_only_list_their_own_profile(client, auth_headers, seeded_profiles, session_factory):
+    """✅ The ownership rule is part of the SQL query, not a post-filter."""
+    statements = _capture_sql(session_factory)
+
+    response = client.get("/profiles", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [seeded_profiles]
+    assert response.json()["next_after"] is None
+    profile_queries = [sql for sql in statements if "FROM profiles" in sql]
+    assert len(profile_queries) == 1
+    assert "profiles.user_id = ?" in profile_queries[0]
+
+
+def test_admins_page_through_all_profiles_with_keyset(client, admin_headers, seeded_profiles, session_factory):
+    statements = _capture_sql(session_factory)
+    seen, after = [], 0
+    while after is not None:
+        page = client.get("/profiles", params={"after": after, "limit": 10}, headers=admin_headers).json()
+        seen.extend(item["id"] for item in page["items"])
+        after = page["next_after"]
+
+    assert len(seen) == 26
+    assert seen == sorted(seen)
+    profile_queries = [sql for sql in statements if "FROM profiles" in sql]
+    assert len(profile_queries) == 3
+    assert all("profiles.id > ?" in sql for sql in profile_queries)  # ✅ Keyset, not OFFSET scanning
+
+
+def test_batch_returns_only_readable_profiles(client, auth_headers, admin_headers, seeded_profiles):
+    ids = [seeded_profiles, seeded_profiles + 1, 9999]
+
+    own = client.post("/profiles/batch", json={"ids": ids}, headers=auth_headers).json()
+    assert [item["id"] for item in own["items"]] == [seeded_profiles]
+    assert own["missing"] == [seeded_profiles + 1, 9999]
+
+    admin = client.post("/profiles/batch", json={"ids": ids}, headers=admin_headers).json()
+    assert [item["id"] for item in admin["items"]] == [seeded_profiles, seeded_profiles + 1]
+    assert admin["missing"] == [9999]
+
+
+def test_batch_size_is_bounded(client, auth_headers, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "PROFILES_BATCH_MAX", 2)
+    response = client.post("/profiles/batch", json={"ids": [1, 2, 3]}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_row_by_row_fallback_without_compiled_policy(client, auth_headers, seeded_profiles, monkeypatch):
+    """✅ Policies the compiler can't handle still filter correctly (checked per row)."""
+    import oso_rbac
+
+    oso_rbac.ensure_policies()
+    monkeypatch.setattr(oso_rbac, "compiled_policy", None)
+    response = client.get("/profiles", params={"limit": 100}, headers=auth_headers)
+
+    assert [item["id"] for item in response.json()["items"]] == [seeded_profiles]
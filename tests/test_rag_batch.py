@@ -0,0 +1,62 @@
+import asyncio
+import json
+import time
+
+import rag_pipeline
+
+
+def _lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_query_streams_one_line_per_query(client, auth_headers, stub_documents, ai_backend, monkeypatch):
+    """✅ Every query gets a line with its index; retrieval runs once for the distinct queries."""
+    ai_backend(answer="Machine learning learns from data.")
+    retrieval_calls = []
+
+    async def _get_relevant_chunks_many(db, queries, top_k=3):
+        retrieval_calls.append(list(queries))
+        return [[] if "unknown" in query else stub_documents[:top_k] for query in queries]
+
+    monkeypatch.setattr(rag_pipeline, "get_relevant_chunks_many", _get_relevant_chunks_many)
+    queries = ["machine learning", "What is AI?", "Machine  learning", "unknown topic"]
+
+    response = client.post("/rag/query/batch", json={"queries": queries}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = {line["index"]: line for line in _lines(response)}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[1]["answer"] == "Machine learning learns from data."
+    assert results[2]["query"] == "Machine  learning"
+    assert results[3]["status"] == 404
+    assert retrieval_calls == [["machine learning", "What is AI?", "unknown topic"]]
+
+
+def test_batch_query_returns_in_completion_order_concurrently(client, auth_headers, stub_documents, monkeypatch):
+    """✅ Slow questions don't hold back fast ones, and completions overlap."""
+    async def _get_relevant_chunks_many(db, queries, top_k=3):
+        return [stub_documents[:top_k] for _ in queries]
+
+    async def _generate(context, query, priority=None):
+        await asyncio.sleep(0.6 if query == "slow" else 0.2)
+        return f"answer to {query}"
+
+    monkeypatch.setattr(rag_pipeline, "get_relevant_chunks_many", _get_relevant_chunks_many)
+    monkeypatch.setattr(rag_pipeline, "generate_response_with_ai", _generate)
+    queries = ["slow"] + [f"fast {i}" for i in range(10)]
+
+    started = time.perf_counter()
+    response = client.post("/rag/query/batch", json={"queries": queries}, headers=auth_headers)
+    elapsed = time.perf_counter() - started
+
+    lines = _lines(response)
+    assert [line["index"] for line in lines][-1] == 0
+    assert {line["answer"] for line in lines} == {f"answer to {query}" for query in queries}
+    assert elapsed < 1.5  # ✅ Sequential completions would take 2.6s
+
+
+def test_batch_query_validates_size(client, auth_headers):
+    assert client.post("/rag/query/batch", json={"queries": []}, headers=auth_headers).status_code == 422
+    too_many = ["q"] * (rag_pipeline.RAG_BATCH_MAX_QUERIES + 1)
+    assert client.post("/rag/query/batch", json={"queries": too_many}, headers=auth_headers).status_code == 422
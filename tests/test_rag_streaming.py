@@ -0,0 +1,70 @@
+import json
+import time
+
+import pytest
+
+import rag_pipeline
+
+
+def _parse_sse(body: str):
+    """🔹 Splits an SSE body into (event, data) pairs"""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines.get("event"), lines["data"]))
+    return events
+
+
+def test_rag_query_uses_async_client(client, auth_headers, stub_documents, ai_backend):
+    """✅ Non-streaming queries return the full completion."""
+    ai_backend(answer="Machine learning learns from data.")
+
+    response = client.post("/rag/query", json={"query": "machine learning"}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()["answer"] == "Machine learning learns from data."
+    assert "Machine learning lets computers" in response.json()["context"]
+
+
+def test_rag_query_streams_server_sent_events(client, auth_headers, stub_documents, ai_backend):
+    """✅ stream=true sends context, then one event per token, then done."""
+    ai_backend(answer="Machine learning learns from data.")
+
+    response = client.post("/rag/query", json={"query": "machine learning", "stream": True}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert events[0][0] == "context"
+    assert events[-1] == ("done", "[DONE]")
+    answer = "".join(json.loads(data)["delta"] for event, data in events if event == "token")
+    assert answer == "Machine learning learns from data."
+
+
+@pytest.mark.asyncio
+async def test_first_token_arrives_before_completion_finishes(ai_backend):
+    """✅ Time-to-first-token does not depend on answer length."""
+    ai_backend(answer=" ".join(["token"] * 20), token_delay=0.05)
+
+    started = time.perf_counter()
+    tokens = rag_pipeline.stream_response_with_ai("context", "query")
+    await tokens.__anext__()
+    first_token_at = time.perf_counter() - started
+    remaining = [token async for token in tokens]
+
+    assert first_token_at < 0.5
+    assert time.perf_counter() - started >= 0.9
+    assert len(remaining) == 19
+
+
+@pytest.mark.asyncio
+async def test_openai_failure_returns_fallback(monkeypatch):
+    """✅ Unreachable completion servers yield the fallback message."""
+    import httpx
+    from openai import AsyncOpenAI
+
+    monkeypatch.setattr(rag_pipeline, "client", AsyncOpenAI(
+        api_key="sk-test", base_url="http://127.0.0.1:9/v1", max_retries=0, http_client=httpx.AsyncClient(),
+    ))
+
+    assert await rag_pipeline.generate_response_with_ai("context", "query") == rag_pipeline.AI_FALLBACK_RESPONSE
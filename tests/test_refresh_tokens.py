@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import select
+
+import auth
+from models import RefreshToken
+from revocation import RevocationList
+
+
+@pytest.fixture
+def session(client, test_user):
+    """🔹 Login response (access + refresh token) for the test user"""
+    response = client.post("/login", json={"username": test_user["username"], "password": test_user["password"]})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _bearer(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_refresh_rotates_without_bcrypt(client, session, monkeypatch):
+    """✅ A refresh token buys a new token pair with no password check; the old one is spent."""
+    async def _no_bcrypt(*args):
+        raise AssertionError("refresh must not run bcrypt")
+
+    monkeypatch.setattr(auth.password_hasher, "verify", _no_bcrypt)
+
+    response = client.post("/token/refresh", json={"refresh_token": session["refresh_token"]})
+
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != session["refresh_token"]
+    assert rotated["expires_in"] == auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    assert client.get("/profile", headers=_bearer(rotated)).status_code == 200
+
+
+def test_refresh_tokens_are_stored_hashed(client, session, session_factory):
+    async def _stored_hashes():
+        async with session_factory() as db:
+            return (await db.execute(select(RefreshToken.token_hash))).scalars().all()
+
+    assert asyncio.run(_stored_hashes()) == [auth.hash_refresh_token(session["refresh_token"])]
+
+
+def test_reuse_revokes_the_whole_session(client, session):
+    """✅ Replaying a rotated refresh token kills the session: new tokens and access tokens included."""
+    rotated = client.post("/token/refresh", json={"refresh_token": session["refresh_token"]}).json()
+
+    replay = client.post("/token/refresh", json={"refresh_token": session["refresh_token"]})
+
+    assert replay.status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    assert client.get("/profile", headers=_bearer(rotated)).status_code == 401
+    assert client.get("/profile", headers=_bearer(session)).status_code == 401
+
+
+def test_logout_revokes_only_that_session(client, session, test_user):
+    other = client.post("/login", json={"username": test_user["username"], "password": test_user["password"]}).json()
+
+    assert client.post("/logout", headers=_bearer(session)).status_code == 200
+
+    assert client.get("/profile", headers=_bearer(session)).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": session["refresh_token"]}).status_code == 401
+    assert client.get("/profile", headers=_bearer(other)).status_code == 200
+
+
+def test_revocations_survive_a_restart(client, session):
+    """✅ A fresh process reads recent revocations from the database before trusting session tokens."""
+    assert client.post("/logout", headers=_bearer(session)).status_code == 200
+    auth.revoked_sessions.clear()  # ✅ Simulates another worker / a restart
+
+    assert client.get("/profile", headers=_bearer(session)).status_code == 401
+    assert auth.revoked_sessions.loaded
+
+
+def test_logout_on_another_worker_is_picked_up(client, session, session_factory, monkeypatch):
+    """✅ A revocation written by another worker is enforced after the next periodic re-read."""
+    from datetime import datetime
+    from sqlalchemy import update
+
+    monkeypatch.setattr(auth, "REVOCATION_REFRESH_SECONDS", 0.05)
+    assert client.get("/profile", headers=_bearer(session)).status_code == 200
+
+    async def _revoke_elsewhere():
+        async with session_factory() as db:
+            await db.execute(update(RefreshToken).values(revoked_at=datetime.utcnow()))
+            await db.commit()
+
+    asyncio.run(_revoke_elsewhere())
+    first_sync = auth.revoked_sessions.synced_at
+    time.sleep(0.1)
+
+    assert client.get("/profile", headers=_bearer(session)).status_code == 401
+    assert auth.revoked_sessions.synced_at > first_sync
+
+
+@pytest.mark.asyncio
+async def test_shared_revocation_load_outlives_the_leader_request(session_factory, monkeypatch):
+    """✅ The shared reload opens its own session, so the request that started it can end first."""
+    import database
+    from datetime import datetime
+    from models import User
+
+    async with session_factory() as db:
+        user = User(username="reloaded", email="reloaded@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        db.add(RefreshToken(user_id=user.id, family_id="family-r", token_hash="h" * 64,
+                            expires_at=datetime.utcnow(), revoked_at=datetime.utcnow()))
+        await db.commit()
+    opened = []
+
+    def _read_session():
+        opened.append(True)
+        return session_factory()
+
+    monkeypatch.setattr(database, "ReadSessionLocal", _read_session)
+    auth.revoked_sessions.clear()
+
+    leader = asyncio.create_task(auth.load_revoked_sessions())
+    await asyncio.sleep(0)
+    leader.cancel()  # ✅ The leader's request is gone
+    await auth.load_revoked_sessions()
+
+    assert opened == [True] and auth.revoked_sessions.is_revoked("family-r")
+    auth.revoked_sessions.clear()
+
+
+def test_login_without_the_refresh_tokens_table_is_a_clear_error(client, test_user, sqlite_engine):
+    """✅ A database created before refresh tokens existed: 503 with an explanation, not a bare 500."""
+    from sqlalchemy import text
+
+    async def _drop():
+        async with sqlite_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE refresh_tokens"))
+
+    asyncio.run(_drop())
+    response = client.post("/login", json={"username": test_user["username"], "password": test_user["password"]})
+    assert response.status_code == 503
+    assert "refresh_tokens" in response.json()["detail"]
+
+
+def test_unknown_refresh_token_is_rejected(client):
+    assert client.post("/token/refresh", json={"refresh_token": "not-a-token"}).status_code == 401
+
+
+def test_revocation_list_expires_entries(monkeypatch):
+    revocations = RevocationList()
+    now = [1000.0]
+    monkeypatch.setattr("revocation.time.monotonic", lambda: now[0])
+
+    revocations.add("session-1", ttl=60)
+    assert revocations.is_revoked("session-1")
+    assert not revocations.is_revoked("session-2")
+
+    now[0] += 61
+    assert not revocations.is_revoked("session-1")
+    assert len(revocations) == 0
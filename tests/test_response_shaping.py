@@ -0,0 +1,40 @@
+def test_profile_fields_selection(client, auth_headers, test_user):
+    """✅ ?fields= trims the body; validators still apply."""
+    full = client.get("/profile", headers=auth_headers)
+
+    response = client.get("/profile", params={"fields": "id,bio"}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"id": full.json()["id"], "bio": "This is a new profile."}
+    assert response.headers["etag"] == full.headers["etag"]
+    assert client.get(f"/profile/{test_user['id']}", params={"fields": "version"}, headers=auth_headers).json() == {"version": 1}
+
+
+def test_unknown_fields_are_rejected(client, auth_headers):
+    response = client.get("/profile", params={"fields": "bio,password"}, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+
+def test_list_fields_apply_to_every_item(client, admin_headers, auth_headers):
+    client.get("/profile", headers=auth_headers)
+    client.get("/profile", headers=admin_headers)
+
+    page = client.get("/profiles", params={"fields": "user_id"}, headers=admin_headers).json()
+    batch = client.post("/profiles/batch", params={"fields": "id"}, json={"ids": [1, 2, 99]}, headers=admin_headers).json()
+
+    assert page["next_after"] is None
+    assert all(list(item) == ["user_id"] for item in page["items"]) and len(page["items"]) == 2
+    assert batch == {"items": [{"id": 1}, {"id": 2}], "missing": [99]}
+
+
+def test_rag_context_can_be_omitted_or_truncated(client, auth_headers, stub_documents, ai_backend):
+    ai_backend(answer="Machine learning learns from data.")
+
+    omitted = client.post("/rag/query", json={"query": "machine learning", "include_context": False}, headers=auth_headers).json()
+    truncated = client.post("/rag/query", json={"query": "machine learning", "context_chars": 12}, headers=auth_headers).json()
+
+    assert "context" not in omitted and omitted["answer"] == "Machine learning learns from data."
+    assert len(truncated["context"]) == 12 and truncated["context_truncated"] is True
+    assert truncated["answer"] == omitted["answer"]
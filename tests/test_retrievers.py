@@ -0,0 +1,249 @@
+import asyncio
+
+import numpy as np
+import pytest
+import pytest_asyncio
+
+from models import Document
+from retrievers import (
+    BM25Index, BM25Retriever, FaissRetriever, FullTextRetriever, HashingEmbedder, HybridRetriever,
+    create_sqlite_fts, document_listeners, reciprocal_rank_fusion,
+)
+
+DOCUMENTS = [
+    "Machine learning lets computers learn patterns from data.",
+    "Blockchain is a decentralized ledger technology.",
+    "Photosynthesis converts sunlight into chemical energy in plants.",
+    "Neural networks are machine learning models inspired by the brain.",
+]
+
+
+@pytest_asyncio.fixture
+async def seeded_session(session_factory):
+    """🔹 SQLite session with a few documents"""
+    async with session_factory() as session:
+        session.add_all([Document(title=f"Doc {i}", content=content) for i, content in enumerate(DOCUMENTS, start=1)])
+        await session.commit()
+        yield session
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    """✅ Same text -> same unit vector; related texts score higher."""
+    embedder = HashingEmbedder(dim=128)
+    first, second, unrelated = embedder.embed_sync(["machine learning", "machine learning", "chemical energy"])
+
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert float(first @ embedder.embed_sync(["learning machines"])[0]) > float(first @ unrelated)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf", "flat"])
+async def test_faiss_retriever_returns_top_rows_by_id(seeded_session, tmp_path, index_type):
+    """✅ The index is built on disk, memory-mapped on load, and returns full rows."""
+    retriever = FaissRetriever(HashingEmbedder(dim=128), index_path=str(tmp_path / "docs.index"), index_type=index_type)
+
+    assert await retriever.build(seeded_session) == len(DOCUMENTS)
+
+    reloaded = FaissRetriever(HashingEmbedder(dim=128), index_path=retriever.index_path, index_type=index_type)
+    assert reloaded.load()
+    results = await reloaded.search(seeded_session, "decentralized ledger", top_k=2)
+
+    assert results[0]["id"] == 2
+    assert results[0]["content"] == DOCUMENTS[1]
+    assert results[0]["score"] >= results[-1]["score"]
+
+
+@pytest.mark.asyncio
+async def test_faiss_retriever_without_index_returns_nothing(seeded_session, tmp_path):
+    """✅ Searching before the index is built is an empty result, not an error."""
+    retriever = FaissRetriever(HashingEmbedder(dim=64), index_path=str(tmp_path / "missing.index"))
+    assert await retriever.search(seeded_session, "anything") == []
+
+
+@pytest.mark.asyncio
+async def test_fulltext_fallback_on_sqlite(seeded_session):
+    """✅ Non-MySQL dialects fall back to substring matching."""
+    results = await FullTextRetriever().search(seeded_session, "ledger", top_k=3)
+    assert [row["id"] for row in results] == [2]
+
+
+@pytest.mark.asyncio
+async def test_fulltext_fallback_matches_like_wildcards_literally(seeded_session):
+    """✅ "%" and "_" in the query are text, not LIKE wildcards."""
+    seeded_session.add_all([Document(title="Doc 5", content="Uptime was 100% in May."),
+                            Document(title="Doc 6", content="Set max_tokens, not maxXtokens.")])
+    await seeded_session.commit()
+    retriever = FullTextRetriever()
+
+    assert [row["id"] for row in await retriever.search(seeded_session, "100%", top_k=10)] == [5]
+    assert [row["id"] for row in await retriever.search(seeded_session, "x_t", top_k=10)] == [6]
+    assert [row["id"] for row in await retriever.search(seeded_session, "%", top_k=10)] == [5]
+
+
+@pytest.mark.asyncio
+async def test_fulltext_uses_sqlite_fts_when_present(seeded_session, sqlite_engine):
+    """✅ With documents_fts, SQLite ranks by bm25, matches any term and follows later writes."""
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(create_sqlite_fts)
+    retriever = FullTextRetriever()
+
+    results = await retriever.search(seeded_session, "machine learning brain?", top_k=3)
+    assert [row["id"] for row in results] == [4, 1]  # ✅ "brain" only appears in document 4
+
+    seeded_session.add(Document(title="Doc 5", content="A distributed ledger for supply chains."))
+    await seeded_session.commit()
+    assert {row["id"] for row in await retriever.search(seeded_session, "ledger", top_k=3)} == {2, 5}
+    assert await retriever.search(seeded_session, '"*', top_k=3) == []
+
+
+def test_bm25_ranks_rarer_terms_higher():
+    """✅ BM25 scores favour documents matching the rarer query term."""
+    index = BM25Index()
+    for doc_id, content in enumerate(DOCUMENTS, start=1):
+        index.add_document(doc_id, content)
+
+    ranked = index.search("machine learning brain", top_k=3)
+
+    assert [doc_id for doc_id, _ in ranked] == [4, 1]
+    assert index.search("unknownterm") == []
+
+
+def test_bm25_incremental_updates_and_compaction():
+    """✅ Re-indexed and removed documents stop matching; compaction keeps results."""
+    index = BM25Index(compact_ratio=0.5)
+    for doc_id, content in enumerate(DOCUMENTS, start=1):
+        index.add_document(doc_id, content)
+
+    index.add_document(2, "Quantum computing uses qubits.")
+    assert index.search("ledger") == []
+    assert index.search("qubits")[0][0] == 2
+
+    index.remove_document(3)
+    index.remove_document(1)  # crosses the compaction threshold
+    assert len(index) == 2
+    assert [doc_id for doc_id, _ in index.search("machine learning qubits", top_k=5)] in ([4, 2], [2, 4])
+
+
+@pytest.mark.asyncio
+async def test_bm25_follows_committed_document_changes(seeded_session):
+    """✅ The index picks up ORM commits and ignores rolled-back writes."""
+    retriever = BM25Retriever()
+    try:
+        assert (await retriever.search_ids(seeded_session, "ledger"))[0][0] == 2
+
+        seeded_session.add(Document(title="Doc 5", content="Quantum computing uses qubits."))
+        await seeded_session.commit()
+        assert (await retriever.search(seeded_session, "qubits"))[0]["id"] == 5
+
+        seeded_session.add(Document(title="Doc 6", content="Volcanoes erupt magma."))
+        await seeded_session.flush()
+        await seeded_session.rollback()
+        assert retriever.index.search("magma") == []
+    finally:
+        document_listeners.remove(retriever.index.apply_changes)
+
+
+@pytest.mark.asyncio
+async def test_failing_listener_does_not_fail_the_commit(seeded_session):
+    """✅ A broken index is logged; the commit succeeds and the other listeners still run."""
+    received = []
+
+    def _broken(upserts, deleted_ids):
+        raise RuntimeError("index unavailable")
+
+    document_listeners.extend([_broken, lambda upserts, deleted_ids: received.append(set(upserts))])
+    seeded_session.add(Document(title="Doc 5", content="Quantum computing uses qubits."))
+    await seeded_session.commit()
+
+    assert received == [{5}]
+
+
+@pytest.mark.asyncio
+async def test_bm25_cold_requests_share_one_build(seeded_session, session_factory):
+    """✅ Concurrent cold searches run one build and both see the whole corpus."""
+    retriever = BM25Retriever()
+    builds = []
+    build = retriever.index.build
+
+    async def _counted_build(db, batch_size=1000):
+        builds.append(db)
+        return await build(db, batch_size=1)
+
+    retriever.index.build = _counted_build
+    try:
+        async with session_factory() as first, session_factory() as second:
+            ledger, brain = await asyncio.gather(retriever.search_ids(first, "ledger"), retriever.search_ids(second, "brain"))
+        assert len(builds) == 1 and len(retriever.index) == len(DOCUMENTS)
+        assert ledger[0][0] == 2 and brain[0][0] == 4
+    finally:
+        document_listeners.remove(retriever.index.apply_changes)
+
+
+@pytest.mark.asyncio
+async def test_bm25_build_keeps_writes_committed_during_the_scan(seeded_session, monkeypatch):
+    """✅ Changes committed mid-build reach the index and are not overwritten by older batch rows."""
+    import retrievers
+
+    index = BM25Index()
+    scan = retrievers.iter_document_batches
+
+    async def _scan_with_concurrent_writes(db, batch_size):
+        async for rows in scan(db, batch_size):
+            yield rows
+            if rows[-1][0] == 1:
+                # ✅ Another request commits while the build is between batches (the scan's snapshot is older)
+                retrievers.notify_document_changes({3: "Quantum computing uses qubits.", 5: "Volcanoes erupt magma."}, {4})
+
+    monkeypatch.setattr(retrievers, "iter_document_batches", _scan_with_concurrent_writes)
+    try:
+        await index.build(seeded_session, batch_size=1)
+        assert [doc_id for doc_id, _ in index.search("qubits")] == [3] and index.search("sunlight") == []
+        assert index.search("magma")[0][0] == 5 and index.search("brain") == []
+    finally:
+        document_listeners.remove(index.apply_changes)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """✅ Documents ranked by both lists outrank single-list hits."""
+    fused = reciprocal_rank_fusion([[(1, 9.0), (2, 5.0)], [(3, 0.9), (2, 0.8)]], k=60)
+    assert fused[0][0] == 2
+    assert {doc_id for doc_id, _ in fused} == {1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retriever_fuses_lexical_and_dense(seeded_session, tmp_path):
+    """✅ Hybrid search returns full rows with fused scores."""
+    dense = FaissRetriever(HashingEmbedder(dim=128), index_path=str(tmp_path / "docs.index"), index_type="flat")
+    await dense.build(seeded_session)
+    retriever = HybridRetriever(BM25Retriever(), dense)
+    try:
+        results = await retriever.search(seeded_session, "machine learning", top_k=2)
+    finally:
+        document_listeners.remove(retriever.lexical.index.apply_changes)
+
+    assert {row["id"] for row in results} == {1, 4}
+    assert results[0]["score"] >= results[1]["score"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["like", "fts", "bm25", "faiss", "hybrid"])
+async def test_search_many_matches_one_search_per_query(seeded_session, sqlite_engine, tmp_path, backend):
+    """✅ Batched retrieval returns exactly what per-query searches return, in query order."""
+    if backend == "fts":
+        async with sqlite_engine.begin() as conn:
+            await conn.run_sync(create_sqlite_fts)
+    if backend in ("faiss", "hybrid"):
+        dense = FaissRetriever(HashingEmbedder(dim=128), index_path=str(tmp_path / "docs.index"), index_type="flat")
+        await dense.build(seeded_session)
+    retriever = {
+        "like": FullTextRetriever, "fts": FullTextRetriever, "bm25": BM25Retriever,
+        "faiss": lambda: dense, "hybrid": lambda: HybridRetriever(BM25Retriever(), dense),
+    }[backend]()
+    retriever.max_union = 2  # ✅ Full-text: several UNION ALL statements
+    queries = ["ledger", "machine learning", "?!", "sunlight", "ledger"]
+
+    batched = await retriever.search_many(seeded_session, queries, top_k=2)
+
+    assert batched == [await retriever.search(seeded_session, query, top_k=2) for query in queries]
+    assert [row["id"] for row in batched[0]][:1] == [2]
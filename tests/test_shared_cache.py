@@ -0,0 +1,220 @@
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+import pytest
+
+import cache
+from answer_cache import AnswerCache, CACHE_HIT, CACHE_MISS
+from cache import SharedInvalidationBus, SharedMemoryCache, TTLCache, create_cache
+from models import User
+
+ROOT_DIR = os.path.dirname(os.path.abspath(cache.__file__))
+DOCUMENTS = [{"id": 1, "content": "Machine learning lets computers learn from data."}]
+
+
+@pytest.fixture
+def shared_backend(tmp_path, monkeypatch):
+    """🔹 Switches create_cache() to the shared backend, with files under tmp_path"""
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "shared")
+    monkeypatch.setattr(cache, "CACHE_SHARED_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_shared_cache_is_seen_by_every_handle(tmp_path):
+    """✅ Two handles on one file (two workers): sets, invalidations and clears are shared."""
+    path = str(tmp_path / "principals.cache")
+    first, second = SharedMemoryCache(path, maxsize=64, ttl=60), SharedMemoryCache(path, maxsize=64, ttl=60)
+
+    first.set("alice", {"role": "admin"})
+    first.set(("User", "user", False), True)
+    assert second.get("alice") == {"role": "admin"}
+    assert second.get(("User", "user", False)) is True
+    assert len(second) == 2 and second.stats()["hits"] == 2
+
+    second.invalidate("alice")
+    assert first.get("alice") is None and "alice" not in first
+
+    first.clear()
+    assert second.get(("User", "user", False)) is None
+    assert len(second) == 0
+
+
+def test_shared_cache_expiry_eviction_and_oversize(tmp_path):
+    """✅ TTL expiry, eviction in a full probe window (with on_evict) and oversized values."""
+    evicted = []
+    table = SharedMemoryCache(str(tmp_path / "small.cache"), maxsize=4, ttl=60, record_size=128,
+                              on_evict=lambda key, value: evicted.append(key))
+
+    for number in range(5):
+        table.set(f"key-{number}", number)
+    assert len(table) == 4 and table.evictions == 1
+    assert evicted == ["key-0"]  # ✅ Closest to expiry (the oldest with a single TTL)
+    assert [table.get(f"key-{number}") for number in range(5)] == [None, 1, 2, 3, 4]
+
+    table.set("large", "x" * 1000)
+    assert "large" not in table and table.oversize == 1
+
+    table.ttl = 0.05
+    table.set("short", 1)
+    time.sleep(0.1)
+    assert table.get("short") is None
+
+
+def test_shared_cache_ignores_torn_records(tmp_path):
+    """✅ A record whose payload no longer matches its signature (mid-write) is a miss, not garbage."""
+    table = SharedMemoryCache(str(tmp_path / "torn.cache"), maxsize=1, ttl=60, record_size=128)
+    table.set("key", "value")
+    offset = table._offset(0) + cache._RECORD.size + 5
+    table._map[offset] = table._map[offset] ^ 0xFF
+
+    assert table.get("key") is None
+
+
+class _Exploit:
+    """Pickles into a call that leaves a marker file: the kind of payload a planted record would carry"""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (open, (self.marker, "w"))
+
+
+def test_shared_files_must_be_private(tmp_path, monkeypatch):
+    """✅ Files live in a 0700 directory; planted, shared or symlinked files are refused."""
+    monkeypatch.setattr(cache, "CACHE_SHARED_DIR", str(tmp_path))
+    path = cache.shared_path("principals.cache")
+    assert os.path.dirname(path) == str(tmp_path / f"{cache.CACHE_NAMESPACE}-{os.geteuid()}")
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+    SharedMemoryCache(path, maxsize=4, ttl=60).set("alice", "admin")
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    planted = tmp_path / "planted.cache"
+    planted.write_bytes(b"")
+    planted.chmod(0o666)
+    with pytest.raises(RuntimeError):
+        SharedMemoryCache(str(planted), maxsize=4, ttl=60)
+
+    (tmp_path / "link.cache").symlink_to(path)
+    with pytest.raises(OSError):
+        SharedMemoryCache(str(tmp_path / "link.cache"), maxsize=4, ttl=60)
+
+    shared_dir = tmp_path / "shared"
+    shared_dir.mkdir()
+    shared_dir.chmod(0o777)
+    with pytest.raises(RuntimeError):
+        SharedMemoryCache(str(shared_dir / "answers.cache"), maxsize=4, ttl=60)
+
+
+def test_forged_records_are_never_unpickled(tmp_path):
+    """✅ A record or bus message not signed with this deployment's key is a miss, never loaded."""
+    marker = tmp_path / "exploited"
+    payload = pickle.dumps(("alice", _Exploit(str(marker))))
+    table = SharedMemoryCache(str(tmp_path / "principals.cache"), maxsize=1, ttl=60, record_size=256)
+    table.set("alice", "user")
+    offset = table._offset(0)
+    key_hash, generation, expires_at = cache._RECORD.unpack_from(table._map, offset)[:3]
+    cache._RECORD.pack_into(table._map, offset, key_hash, generation, expires_at, len(payload), b"\0" * 32)
+    table._map[offset + cache._RECORD.size:offset + cache._RECORD.size + len(payload)] = payload
+    assert table.get("alice") is None
+
+    path = str(tmp_path / "invalidations.bus")
+    publisher, subscriber = SharedInvalidationBus(path, capacity=4), SharedInvalidationBus(path, capacity=4)
+    received, resyncs = [], []
+    subscriber.subscribe("session_revoked", received.append, lambda: resyncs.append(True))
+    payload = pickle.dumps(("intruder", "session_revoked", _Exploit(str(marker))))
+    offset = publisher._offset(1)
+    cache._EVENT.pack_into(publisher._map, offset, 1, len(payload), b"\0" * 32)
+    publisher._map[offset + cache._EVENT.size:offset + cache._EVENT.size + len(payload)] = payload
+    publisher._set_counter(cache._GENERATION_OFFSET, 1)
+    subscriber.poll()
+    assert received == [] and resyncs == [True]  # ✅ Treated as lost messages: reload from the database
+
+    assert not marker.exists()
+
+
+def test_shared_cache_across_processes(tmp_path):
+    """✅ A value stored by another process is read back here."""
+    path = str(tmp_path / "answers.cache")
+    script = (
+        "from cache import SharedMemoryCache;"
+        f"SharedMemoryCache({path!r}, maxsize=16, ttl=60).set(('primary', 7), {{'bio': 'from another worker'}})"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, check=True)
+
+    assert SharedMemoryCache(path, maxsize=16, ttl=60).get(("primary", 7)) == {"bio": "from another worker"}
+
+
+def test_create_cache_selects_the_backend(shared_backend):
+    """✅ Local backend by default; the shared one stores ORM principals for other workers."""
+    assert isinstance(create_cache("disabled", maxsize=10, ttl=60, enabled=False), TTLCache)
+
+    writer, reader = (create_cache("principals", maxsize=10, ttl=60) for _ in range(2))
+    assert isinstance(writer, SharedMemoryCache)
+    writer.set("alice", User(id=1, username="alice", email="alice@example.com", hashed_password="x", role="admin"))
+    principal = reader.get("alice")
+    assert (principal.id, principal.role) == (1, "admin")
+
+    sized = create_cache("answers", maxsize=1000, ttl=60, record_size=1024, max_bytes=64 * 1024)
+    assert sized.maxsize == 64
+
+
+def test_invalidation_bus_broadcasts_and_reports_overflow(tmp_path):
+    """✅ Other processes receive each message once; a reader lapped by publishers resyncs."""
+    path = str(tmp_path / "invalidations.bus")
+    publisher, subscriber = SharedInvalidationBus(path, capacity=4), SharedInvalidationBus(path, capacity=4)
+    received, resyncs = {"publisher": [], "subscriber": []}, []
+    publisher.subscribe("session_revoked", received["publisher"].append)
+    subscriber.subscribe("session_revoked", received["subscriber"].append, lambda: resyncs.append(True))
+
+    publisher.publish("session_revoked", ("family-1", 60))
+    assert received["publisher"] == [("family-1", 60)]  # ✅ Delivered locally right away
+    assert publisher.poll() == 0  # ✅ Own messages are not delivered twice
+    assert subscriber.poll() == 1 and subscriber.poll() == 0
+    assert received["subscriber"] == [("family-1", 60)] and resyncs == []
+
+    for number in range(2, 9):
+        publisher.publish("session_revoked", (f"family-{number}", 60))
+    subscriber.poll()
+    assert resyncs == [True] and subscriber.overflows == 1
+    assert received["subscriber"][-1] == ("family-8", 60)
+
+
+def test_revocations_reach_other_workers(tmp_path):
+    """✅ A session revoked by one worker is rejected by another after its next poll."""
+    from auth import _apply_revocation, _reload_revocations, revoked_sessions
+
+    path = str(tmp_path / "invalidations.bus")
+    other_worker, this_worker = SharedInvalidationBus(path, capacity=2), SharedInvalidationBus(path, capacity=2)
+    this_worker.subscribe("session_revoked", _apply_revocation, _reload_revocations)
+    revoked_sessions.clear()
+    revoked_sessions.loaded = True
+
+    other_worker.publish("session_revoked", ("family-x", 60))
+    assert not revoked_sessions.is_revoked("family-x")
+    this_worker.poll()
+    assert revoked_sessions.is_revoked("family-x")
+
+    for number in range(3):
+        other_worker.publish("session_revoked", (f"family-{number}", 60))
+    this_worker.poll()
+    assert revoked_sessions.loaded is False  # ✅ Missed messages: reload from the database
+    revoked_sessions.clear()
+
+
+@pytest.mark.asyncio
+async def test_answer_cache_is_shared_between_workers(shared_backend):
+    """✅ An answer cached by one worker is a hit for another; document changes drop it for both."""
+    first, second = AnswerCache(max_entries=100), AnswerCache(max_entries=100)
+
+    await first.set("What is ML?", DOCUMENTS, "Learning from data.")
+    assert await second.get("what is ml", DOCUMENTS) == ("Learning from data.", CACHE_HIT)
+
+    first.apply_changes({1: "updated"})
+    assert await second.get("What is ML?", DOCUMENTS) == (None, CACHE_MISS)
+    assert first._indexed == {}
+    first.close()
+    second.close()
@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """✅ N identical concurrent calls run the work once."""
+    flights = SingleFlight()
+    calls = 0
+
+    async def _work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    results = await asyncio.gather(*[flights.do("key", _work) for _ in range(10)])
+
+    assert results == ["result"] * 10
+    assert calls == 1
+    assert flights.stats() == {"enabled": True, "in_flight": 0, "leaders": 1, "coalesced": 9}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    """✅ The shared work survives its first caller disconnecting."""
+    flights = SingleFlight()
+
+    async def _work():
+        await asyncio.sleep(0.05)
+        return 42
+
+    leader = asyncio.create_task(flights.do("key", _work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.do("key", _work))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == 42
+
+
+@pytest.mark.asyncio
+async def test_stream_subscribers_share_one_source():
+    """✅ Streaming callers receive every token from a single source stream."""
+    flights = SingleFlight()
+    sources = 0
+
+    async def _tokens():
+        nonlocal sources
+        sources += 1
+        for token in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def _collect(stream):
+        return [token async for token in stream]
+
+    first = flights.stream("key", _tokens)
+    await asyncio.sleep(0.015)  # the second subscriber joins mid-stream and replays
+    second = flights.stream("key", _tokens)
+
+    assert await asyncio.gather(_collect(first), _collect(second)) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert sources == 1
+    assert flights.coalesced == 1
+
+
+def test_concurrent_identical_rag_queries_coalesce(client, auth_headers, stub_documents, ai_backend):
+    """✅ Concurrent identical /rag/query requests trigger a single completion."""
+    import rag_pipeline
+
+    rag_pipeline.answer_cache.entries.enabled = False
+    fake_app = ai_backend(answer="Shared answer.", latency=0.3)
+    coalesced_before = rag_pipeline.rag_flights.coalesced
+
+    async def _burst():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*[
+                http.post("/rag/query", json={"query": "machine learning", "stream": i % 2 == 1}, headers=auth_headers)
+                for i in range(6)
+            ])
+
+    try:
+        responses = asyncio.run(_burst())
+    finally:
+        rag_pipeline.answer_cache.entries.enabled = True
+
+    assert all(response.status_code == 200 for response in responses)
+    assert responses[0].json()["answer"] == "Shared answer."
+    assert fake_app.state.requests == 2  # one non-streaming + one streaming completion
+    assert rag_pipeline.rag_flights.coalesced - coalesced_before >= 4  # at least the 4 completion followers
+
+
+@pytest.mark.asyncio
+async def test_coalesced_retrieval_outlives_the_leader_request(monkeypatch, session_factory):
+    """✅ Shared retrieval runs on its own session, so the leader's request ending doesn't empty it."""
+    import database
+    import rag_pipeline
+
+    sessions = []
+
+    async def _get_relevant_chunks(db, query, top_k=3):
+        sessions.append(db)
+        await asyncio.sleep(0.05)
+        assert db.is_active
+        return [{"id": 1, "content": "Shared chunk."}]
+
+    monkeypatch.setattr(rag_pipeline, "get_relevant_chunks", _get_relevant_chunks)
+    monkeypatch.setattr(database, "ReadSessionLocal", session_factory)
+    flights = SingleFlight()
+
+    async with session_factory() as request_db:
+        leader = asyncio.create_task(flights.do("retrieve", lambda: rag_pipeline._shared_retrieval("q", 3)))
+        await asyncio.sleep(0)
+    leader.cancel()  # ✅ Leader request is gone and its session closed
+    follower = await flights.do("retrieve", lambda: rag_pipeline._shared_retrieval("q", 3))
+
+    assert follower == [{"id": 1, "content": "Shared chunk."}]
+    assert len(sessions) == 1 and sessions[0] is not request_db
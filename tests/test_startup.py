@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+import database
+import main
+import oso_rbac
+import rag_pipeline
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_is_lazy_and_needs_no_ai_key(tmp_path):
+    """✅ Importing main loads neither openai nor the policies, and non-AI routes serve without a key."""
+    script = """
+import json, sys
+import main, oso_rbac, rag_pipeline
+from fastapi.testclient import TestClient
+lazy = {"openai": "openai" in sys.modules, "policies": oso_rbac.policies_loaded, "client": rag_pipeline.client is not None}
+with TestClient(main.app) as client:
+    status = client.get("/").status_code
+print(json.dumps({"lazy": lazy, "status": status, "startup": main.startup_stats}))
+"""
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    env.update(LOG_FILE=str(tmp_path / "app.log"), PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, env=env, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["lazy"] == {"openai": False, "policies": False, "client": False}
+    assert report["status"] == 200
+    assert report["startup"]["total_seconds"] >= report["startup"]["import_seconds"] > 0
+
+
+def test_ai_routes_return_503_without_key(client, auth_headers, stub_documents, monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(rag_pipeline, "client", None)
+
+    response = client.post("/rag/query", json={"query": "machine learning"}, headers=auth_headers)
+
+    assert response.status_code == 503
+    assert client.get("/profile", headers=auth_headers).status_code == 200  # ✅ Everything else still works
+
+
+def test_lifespan_warm_up(session_factory, monkeypatch):
+    """✅ STARTUP_WARMUP pre-loads policies, DB connections, the AI client and the retriever."""
+    monkeypatch.setattr(main, "STARTUP_WARMUP", True)
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    monkeypatch.setattr(database, "ReadSessionLocal", session_factory)
+    monkeypatch.setattr(oso_rbac, "policies_loaded", False)
+    monkeypatch.setattr(rag_pipeline, "client", None)
+    monkeypatch.setattr(rag_pipeline, "retriever", None)
+
+    with TestClient(main.app):
+        assert oso_rbac.policies_loaded
+        assert rag_pipeline.client is not None
+        assert rag_pipeline.retriever is not None
+        assert set(main.startup_stats["steps"]) == {"policies", "database", "ai"}
+        assert main.startup_stats["warmup_seconds"] > 0
+
+    assert rag_pipeline.client is None  # ✅ Pool closed on shutdown
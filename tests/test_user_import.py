@@ -0,0 +1,154 @@
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from fastapi import HTTPException
+
+from hashing import HashingExecutor
+from models import User
+from user_import import UserImporter
+
+
+class _FakeHasher:
+    """Counts hash calls instead of running bcrypt"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def hash(self, password: str) -> str:
+        self.calls += 1
+        return f"hashed:{password}"
+
+
+@pytest_asyncio.fixture
+async def session(session_factory):
+    async with session_factory() as db_session:
+        db_session.add(User(username="taken", email="taken@example.com", hashed_password="x"))
+        await db_session.commit()
+        yield db_session
+
+
+@pytest.mark.asyncio
+async def test_importer_reports_every_row_and_hashes_only_new_users(session):
+    lines = [
+        json.dumps({"username": "ann", "email": "ann@example.com", "password": "pw1"}),
+        json.dumps({"username": "taken", "email": "new@example.com", "password": "pw2"}),  # stored username
+        json.dumps({"username": "bob", "email": "taken@example.com", "password": "pw3"}),  # stored email
+        json.dumps({"username": "ann", "email": "ann2@example.com", "password": "pw4"}),  # repeated in upload
+        "{broken",
+        json.dumps({"username": "cy", "email": "no-at-sign", "password": "pw5"}),
+        json.dumps({"username": "dee", "email": "dee@example.com", "password": "pw6"}),
+    ]
+    hasher = _FakeHasher()
+    importer = UserImporter(session, hasher=hasher, batch_size=2)
+    await importer.add_lines(lines)
+    await importer.flush()
+
+    report = importer.report()
+    assert report["summary"] == {"rows": 7, "created": 2, "duplicates": 3, "invalid": 2, "failed": 0}
+    assert [(result["row"], result["status"]) for result in report["results"]] == [
+        (1, "created"), (2, "duplicate"), (3, "duplicate"), (4, "duplicate"), (5, "invalid"), (6, "invalid"), (7, "created"),
+    ]
+    assert hasher.calls == 2
+    created = {result["username"]: result["id"] for result in report["results"] if result["status"] == "created"}
+    stored = dict((await session.execute(select(User.username, User.id).where(User.username.in_(["ann", "dee"])))).all())
+    assert created == stored
+
+
+@pytest.mark.asyncio
+async def test_importer_parses_csv(session):
+    lines = ["username,email,password\r\n", "eve,eve@example.com,pw\r\n", "\n", "fay,fay@example.com\r\n"]
+    importer = UserImporter(session, hasher=_FakeHasher())
+    await importer.add_lines(lines, "csv")
+    await importer.flush()
+
+    assert importer.stats == {"rows": 2, "created": 1, "duplicates": 0, "invalid": 1, "failed": 0}
+    assert (await session.execute(select(func.count(User.id)))).scalar() == 2
+
+
+@pytest.mark.asyncio
+async def test_importer_parses_quoted_csv_fields_spanning_lines(session):
+    """✅ A quoted field with newlines, commas and quotes is one value, not broken rows."""
+    body = ('username,email,password\ngus,gus@example.com,"line one\nline, ""two"""\n'
+            'ivy,ivy@example.com,pa"ss\njon,jon@example.com,secret\n')
+    importer = UserImporter(session, hasher=_FakeHasher())
+    await importer.add_lines(body.split("\n"), "csv")
+    await importer.flush()
+
+    assert importer.stats == {"rows": 3, "created": 3, "duplicates": 0, "invalid": 0, "failed": 0}
+    stored = dict((await session.execute(select(User.username, User.hashed_password))).all())
+    assert stored["gus"] == 'hashed:line one\nline, "two"'
+    assert (stored["ivy"], stored["jon"]) == ('hashed:pa"ss', "hashed:secret")  # ✅ A stray quote stays literal
+
+
+@pytest.mark.asyncio
+async def test_importer_compares_names_case_insensitively(session):
+    """✅ "Bob"/"bob" in one upload, or "TAKEN" vs a stored "taken", are duplicates (MySQL collation)."""
+    lines = [
+        json.dumps({"username": "Bob", "email": "bob@example.com", "password": "pw1"}),
+        json.dumps({"username": "bob", "email": "bob2@example.com", "password": "pw2"}),
+        json.dumps({"username": "carl", "email": "BOB@example.com", "password": "pw3"}),
+    ]
+    importer = UserImporter(session, hasher=_FakeHasher())
+    await importer.add_lines(lines)
+    await importer.flush()
+
+    assert importer.stats == {"rows": 3, "created": 1, "duplicates": 2, "invalid": 0, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_importer_reports_rows_that_still_conflict_after_the_retry(session, monkeypatch):
+    """✅ A second IntegrityError is resolved row by row instead of failing the import."""
+    importer = UserImporter(session, hasher=_FakeHasher())
+
+    async def _blind_existing(batch):
+        return set(), set()  # ✅ Lookup misses what the unique index rejects
+
+    monkeypatch.setattr(importer, "_existing", _blind_existing)
+    await importer.add(1, {"username": "ann", "email": "ann@example.com", "password": "pw"})
+    await importer.add(2, {"username": "taken", "email": "other@example.com", "password": "pw"})
+    await importer.flush()
+
+    assert [(result["row"], result["status"]) for result in importer.report()["results"]] == [(1, "created"), (2, "duplicate")]
+
+
+@pytest.mark.asyncio
+async def test_importer_reports_rows_the_busy_hasher_rejected(session):
+    """✅ A saturated hashing pool (503) marks rows as failed; the rest are still imported."""
+    class _BusyHasher(_FakeHasher):
+        async def hash(self, password: str) -> str:
+            if password == "busy":
+                raise HTTPException(status_code=503, detail="busy")
+            return await super().hash(password)
+
+    importer = UserImporter(session, hasher=_BusyHasher())
+    await importer.add(1, {"username": "ann", "email": "ann@example.com", "password": "pw"})
+    await importer.add(2, {"username": "bea", "email": "bea@example.com", "password": "busy"})
+    await importer.flush()
+
+    assert importer.stats == {"rows": 2, "created": 1, "duplicates": 0, "invalid": 0, "failed": 1}
+    assert importer.report()["results"][1]["error"] == "Password hashing is busy, retry this row"
+
+
+def test_bulk_endpoint_requires_admin(client, auth_headers):
+    response = client.post("/admin/users/bulk", content=b"", headers=auth_headers)
+    assert response.status_code == 403
+
+
+def test_bulk_endpoint_imports_csv_with_process_pool(client, admin_headers, monkeypatch):
+    """✅ Imported users are hashed on the process pool and can log in."""
+    import user_import
+
+    monkeypatch.setattr(user_import, "bulk_hasher", HashingExecutor(backend="process", max_workers=2, max_queue=10))
+    body = "username,email,password\nimported1,imported1@example.com,secret-1\nimported2,imported2@example.com,secret-2\n"
+
+    response = client.post("/admin/users/bulk", content=body.encode(), headers={**admin_headers, "Content-Type": "text/csv"})
+    user_import.bulk_hasher.shutdown()
+
+    assert response.status_code == 200
+    assert response.json()["summary"] == {"rows": 2, "created": 2, "duplicates": 0, "invalid": 0, "failed": 0}
+    login = client.post("/login", json={"username": "imported2", "password": "secret-2"})
+    assert login.status_code == 200
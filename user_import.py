@@ -0,0 +1,301 @@
+import asyncio
+import csv
+import json
+import os
+from collections import deque
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import bindparam, or_, select
+from hashing import HashingExecutor, HASHER_MAX_WORKERS
+from ingestion import _aiter
+from models import User
+
+# ✅ Bulk Import Settings
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", "500"))  # Rows per uniqueness check / executemany / commit
+USER_IMPORT_HASHER_BACKEND = os.getenv("USER_IMPORT_HASHER_BACKEND", "process")  # "process" or "thread"
+USER_IMPORT_WORKERS = int(os.getenv("USER_IMPORT_WORKERS", str(HASHER_MAX_WORKERS)))  # Parallel bcrypt hashes
+
+# ✅ Separate pool from the login hasher, so an import never queues logins behind 50k hashes
+bulk_hasher = HashingExecutor(
+    backend=USER_IMPORT_HASHER_BACKEND,
+    max_workers=USER_IMPORT_WORKERS,
+    max_queue=USER_IMPORT_BATCH_SIZE,
+)
+
+
+def validate_record(record) -> str:
+    """Returns an error message, or None if the row can be imported"""
+    if not isinstance(record, dict):
+        return "Row must be an object with username, email and password"
+    for field, limit in (("username", 50), ("email", 100), ("password", None)):
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return f"Missing {field}"
+        if limit and len(value) > limit:
+            return f"{field} longer than {limit} characters"
+    if "@" not in record["email"]:
+        return "Invalid email"
+    return None
+
+
+class _CSVLines:
+    """
+    🔹 Line source for one csv.reader, refilled as the upload streams in.
+    - complete(): the buffered lines hold whole records (an even number of quote characters),
+      so the reader never runs dry inside a quoted field that spans lines
+    """
+
+    def __init__(self):
+        self.lines = deque()
+        self.quotes = 0
+
+    def push(self, line: str):
+        self.lines.append(line)
+        self.quotes += line.count('"')
+
+    def complete(self) -> bool:
+        return bool(self.lines) and self.quotes % 2 == 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        line = self.lines.popleft()
+        self.quotes -= line.count('"')
+        return line
+
+
+async def _iter_csv_rows(lines):
+    """Yields (parsed row or None, error or None) from one csv.reader; quoted fields may contain newlines"""
+    buffer = _CSVLines()
+    reader = csv.reader(buffer)
+
+    def _drain():
+        while buffer.complete() or (done and buffer.lines):
+            try:
+                yield next(reader), None
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield None, f"Malformed CSV: {e}"
+
+    done = False
+    async for line in _aiter(lines):
+        buffer.push(line.rstrip("\r\n") + "\n")
+        for row in _drain():
+            yield row
+    done = True  # ✅ End of upload: an unterminated quote is parsed (or rejected) as it stands
+    for row in _drain():
+        yield row
+
+
+async def iter_user_records(lines, fmt: str = "ndjson"):
+    """
+    🔹 Parses NDJSON ({"username", "email", "password"} per line) or CSV (header row first).
+    - Yields (row number, record dict or None, error message or None); blank lines are skipped
+    - Works line by line (CSV records through one csv.reader, so quoted fields may span
+      lines), so uploads of any size stream through
+    """
+    if fmt == "csv":
+        header = None
+        row_number = 0
+        async for values, error in _iter_csv_rows(lines):
+            if error is None and not any(value.strip() for value in values):
+                continue
+            if header is None and error is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            row_number += 1
+            if error is not None:
+                yield row_number, None, error
+            elif len(values) != len(header):
+                yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            else:
+                yield row_number, dict(zip(header, values)), None
+        return
+
+    row_number = 0
+    async for line in _aiter(lines):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line), None
+        except ValueError:
+            yield row_number, None, "Invalid JSON"
+
+
+class UserImporter:
+    """
+    🔹 Streams user rows into `users` in batches.
+    - Rows are validated, then de-duplicated within the upload and against stored
+      usernames/emails with one query per batch (case-insensitively, like MySQL's
+      default collation, so "Bob" and "bob" never reach the unique index together)
+    - Only rows that will be inserted are hashed, in parallel on the bulk hasher pool
+    - Each batch is one executemany + commit (bounded memory & lock time)
+    - `results` holds one entry per row: created (with id), duplicate, invalid, or
+      failed (hashing pool saturated: retry those rows); earlier batches stay committed
+    """
+
+    def __init__(self, db: AsyncSession, hasher: HashingExecutor = None, batch_size: int = USER_IMPORT_BATCH_SIZE):
+        self.db = db
+        self.hasher = hasher or bulk_hasher
+        self.batch_size = batch_size
+        self.results = []
+        self.stats = {"rows": 0, "created": 0, "duplicates": 0, "invalid": 0, "failed": 0}
+        self._pending = []  # (row number, username, email, password)
+        self._usernames = set()  # Seen in this upload (casefolded)
+        self._emails = set()
+
+    def _report(self, row_number: int, status: str, username: str = None, **details):
+        self.results.append({"row": row_number, "username": username, "status": status, **details})
+        if status == "created":
+            self.stats["created"] += 1
+        elif status == "duplicate":
+            self.stats["duplicates"] += 1
+        elif status == "failed":
+            self.stats["failed"] += 1
+        else:
+            self.stats["invalid"] += 1
+
+    def report(self) -> dict:
+        return {"summary": self.stats, "results": sorted(self.results, key=lambda result: result["row"])}
+
+    async def add_lines(self, lines, fmt: str = "ndjson"):
+        async for row_number, record, error in iter_user_records(lines, fmt):
+            await self.add(row_number, record, error)
+
+    async def add(self, row_number: int, record, error: str = None):
+        self.stats["rows"] += 1
+        error = error or validate_record(record)
+        if error:
+            self._report(row_number, "invalid", record.get("username") if isinstance(record, dict) else None, error=error)
+            return
+
+        username, email = record["username"].strip(), record["email"].strip()
+        if username.casefold() in self._usernames or email.casefold() in self._emails:
+            self._report(row_number, "duplicate", username, error="Duplicate username or email in upload")
+            return
+        self._usernames.add(username.casefold())
+        self._emails.add(email.casefold())
+        self._pending.append((row_number, username, email, record["password"]))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def _existing(self, batch) -> tuple:
+        """Stored usernames and emails colliding with the batch (one indexed query), casefolded"""
+        lookup = select(User.username, User.email).where(or_(
+            User.username.in_(bindparam("usernames", expanding=True)),
+            User.email.in_(bindparam("emails", expanding=True)),
+        ))
+        rows = (await self.db.execute(lookup, {
+            "usernames": [username for _, username, _, _ in batch],
+            "emails": [email for _, _, email, _ in batch],
+        })).all()
+        return {row[0].casefold() for row in rows}, {row[1].casefold() for row in rows}
+
+    async def _insertable(self, batch) -> list:
+        taken_usernames, taken_emails = await self._existing(batch)
+        rows = []
+        for row_number, username, email, password in batch:
+            if username.casefold() in taken_usernames:
+                self._report(row_number, "duplicate", username, error="Username already registered")
+            elif email.casefold() in taken_emails:
+                self._report(row_number, "duplicate", username, error="Email already registered")
+            else:
+                rows.append((row_number, username, email, password))
+        return rows
+
+    async def flush(self):
+        """Checks, hashes, inserts and commits the buffered batch"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+
+        rows = await self._insertable(batch)
+        if not rows:
+            return
+        hashes = await asyncio.gather(*(self.hasher.hash(password) for _, _, _, password in rows), return_exceptions=True)
+        hashed_rows = []
+        for row, hashed in zip(rows, hashes):
+            if isinstance(hashed, HTTPException) and hashed.status_code == 503:
+                self._report(row[0], "failed", row[1], error="Password hashing is busy, retry this row")
+            elif isinstance(hashed, BaseException):
+                raise hashed
+            else:
+                hashed_rows.append((row, hashed))
+        rows = [row for row, _ in hashed_rows]
+        values = [
+            {"username": username, "email": email, "hashed_password": hashed, "is_admin": False, "role": "user"}
+            for (_, username, email, _), hashed in hashed_rows
+        ]
+        if not values:
+            return
+
+        try:
+            await self.db.execute(User.__table__.insert(), values)  # ✅ executemany
+            await self.db.commit()
+        except IntegrityError:
+            # ✅ Lost a race with /register: re-check this batch and insert what is still free
+            await self.db.rollback()
+            still_free = {row[0] for row in await self._insertable(rows)}
+            values = [value for (row_number, *_), value in zip(rows, values) if row_number in still_free]
+            rows = [row for row in rows if row[0] in still_free]
+            try:
+                if values:
+                    await self.db.execute(User.__table__.insert(), values)
+                    await self.db.commit()
+            except IntegrityError:
+                await self.db.rollback()
+                rows = await self._insert_one_by_one(rows, values)
+
+        ids = dict((await self.db.execute(
+            select(User.username, User.id).where(User.username.in_(bindparam("usernames", expanding=True))),
+            {"usernames": [username for _, username, _, _ in rows]},
+        )).all())
+        for row_number, username, _, _ in rows:
+            self._report(row_number, "created", username, id=ids.get(username))
+
+    async def _insert_one_by_one(self, rows, values) -> list:
+        """Last resort after a second conflict (e.g. collation-equal names): rows that still fail are duplicates"""
+        inserted = []
+        for row, value in zip(rows, values):
+            try:
+                await self.db.execute(User.__table__.insert(), [value])
+                await self.db.commit()
+                inserted.append(row)
+            except IntegrityError:
+                await self.db.rollback()
+                self._report(row[0], "duplicate", row[1], error="Username or email already registered")
+        return inserted
+
+
+if __name__ == "__main__":
+    # ✅ CLI: python user_import.py users.ndjson customers.csv [--batch-size 500] [--report report.json]
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk-import users from NDJSON or CSV files")
+    parser.add_argument("paths", nargs="+", help="*.csv files need a username,email,password header; others are NDJSON")
+    parser.add_argument("--batch-size", type=int, default=USER_IMPORT_BATCH_SIZE)
+    parser.add_argument("--report", default=None, help="Write the per-row results to this JSON file")
+    args = parser.parse_args()
+
+    async def _import():
+        async with SessionLocal() as session:
+            importer = UserImporter(session, batch_size=args.batch_size)
+            for path in args.paths:
+                with open(path, encoding="utf-8", newline="") as handle:
+                    await importer.add_lines(handle, "csv" if path.endswith(".csv") else "ndjson")
+            await importer.flush()
+        bulk_hasher.shutdown()
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as report:
+                json.dump(importer.report(), report, indent=2)
+        print(f"✅ Import complete: {importer.stats}")
+
+    asyncio.run(_import())